@@ -1,21 +1,45 @@
+import time
 from typing import Any
 
-from agents import Agent, RunContextWrapper, RunHooks, Tool
+from agents import Agent, ModelResponse, RunContextWrapper, RunHooks, Tool
 
 from logger import logger
 
 
 class AgentLogger(RunHooks):
+    """
+    Logs the turns of an agent run and measures the time spent in LLM
+    requests and tool calls (read by agent_runner.AgentRun).
+    """
+
     def __init__(self):
         self.turn_idx = 0
+        self.llm_sec = 0.0
+        self.tool_calls = 0
+        self.tool_sec: dict[str, float] = {}  # per tool name
+        self._llm_start: float | None = None
+        self._tool_starts: dict[str, list[float]] = {}
 
     async def on_agent_start(self, context: RunContextWrapper, agent: Agent) -> None:
         self.turn_idx += 1
         logger.log("AGENT", f"[TURN {self.turn_idx}] agent_start: {agent.name}")
 
+    async def on_llm_start(
+        self, context: RunContextWrapper, agent: Agent, *args: Any
+    ) -> None:
+        self._llm_start = time.perf_counter()
+
+    async def on_llm_end(
+        self, context: RunContextWrapper, agent: Agent, response: ModelResponse
+    ) -> None:
+        if self._llm_start is not None:
+            self.llm_sec += time.perf_counter() - self._llm_start
+            self._llm_start = None
+
     async def on_tool_start(
         self, context: RunContextWrapper, agent: Agent, tool: Tool
     ) -> None:
+        self._tool_starts.setdefault(tool.name, []).append(time.perf_counter())
         logger.log(
             "AGENT", f"[TURN {self.turn_idx}] tool_start: {agent.name}.{tool.name}"
         )
@@ -29,8 +53,14 @@ class AgentLogger(RunHooks):
     async def on_tool_end(
         self, context: RunContextWrapper, agent: Agent, tool: Tool, result: str
     ) -> None:
+        starts = self._tool_starts.get(tool.name)
+        duration = time.perf_counter() - starts.pop(0) if starts else 0.0
+        self.tool_calls += 1
+        self.tool_sec[tool.name] = self.tool_sec.get(tool.name, 0.0) + duration
         logger.log(
-            "AGENT", f"[TURN {self.turn_idx}] tool_end: {agent.name}.{tool.name}"
+            "AGENT",
+            f"[TURN {self.turn_idx}] tool_end: {agent.name}.{tool.name} "
+            f"({duration:.3f}s)",
         )
         logger.trace(f"[TURN {self.turn_idx}] result: {result}")
 
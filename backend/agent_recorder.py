@@ -0,0 +1,226 @@
+"""
+Agent run recording and replay
+
+Recording (settings.agent_record): every model response of an agent run is
+appended to <stepid_dir>/agent_recording.jsonl, one JSON object per turn:
+
+    {"run": "<run id>", "agent_name": "CodeGenAgent", "turn": 0,
+     "system_instructions": "...", "input": [...], "output": [...],
+     "usage": {"input_tokens": 0, "output_tokens": 0}, "latency_sec": 0.0}
+
+The input of a turn holds the agent input and the tool calls and tool
+outputs of the previous turns, the output of the last turn of a run is its
+final output.
+
+Replay (settings.model_provider = "replay"): the runs recorded in
+settings.replay_path (a recording file or a StepID archive directory,
+also once compacted into a bundle) are fed back in place of the model.
+Each agent run takes the next recorded run of the same agent (cycling
+through them) and replays its turns in order.
+Tools (save_code, ESLint, build, Playwright) run for real, so wall-clock
+benchmarks only vary with the non-LLM parts. Latency and token rate are
+those of the stub model (stub_latency_sec, stub_tokens_per_sec).
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator
+from uuid import uuid4
+
+from agents.models.interface import Model
+from openai.types.responses import ResponseOutputItem
+from pydantic import TypeAdapter
+
+from archive_compactor import read_step_file
+from config import get_settings
+from logger import logger
+from stub_model import canned_response, stream_canned_response
+
+RECORDING_FILENAME = "agent_recording.jsonl"
+
+_output_item_adapter: TypeAdapter = TypeAdapter(ResponseOutputItem)
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    return value
+
+
+class AgentRecorder:
+    """
+    Appends the turns of one agent run to the recording of its step.
+    """
+
+    def __init__(self, stepid_dir: Path, agent_name: str):
+        self.path = Path(stepid_dir) / RECORDING_FILENAME
+        self.agent_name = agent_name
+        self.run_id = uuid4().hex[:12]
+        self._turn = 0
+
+    def record(
+        self,
+        system_instructions: str | None,
+        input: Any,
+        output: list[Any],
+        input_tokens: int,
+        output_tokens: int,
+        latency_sec: float,
+    ) -> None:
+        entry = {
+            "run": self.run_id,
+            "agent_name": self.agent_name,
+            "turn": self._turn,
+            "system_instructions": system_instructions,
+            "input": _jsonable(input),
+            "output": _jsonable(output),
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            "latency_sec": round(latency_sec, 3),
+        }
+        self._turn += 1
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+
+class RecordingModel(Model):
+    """
+    Model wrapper: records every complete response with AgentRecorder.
+    """
+
+    def __init__(self, model: Model, recorder: AgentRecorder):
+        self.model = model
+        self.recorder = recorder
+
+    async def close(self) -> None:
+        await self.model.close()
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        start = time.perf_counter()
+        response = await self.model.get_response(
+            system_instructions, input, *args, **kwargs
+        )
+        self.recorder.record(
+            system_instructions,
+            input,
+            response.output,
+            response.usage.input_tokens,
+            response.usage.output_tokens,
+            time.perf_counter() - start,
+        )
+        return response
+
+    async def stream_response(
+        self, system_instructions, input, *args, **kwargs
+    ) -> AsyncIterator[Any]:
+        start = time.perf_counter()
+        async for event in self.model.stream_response(
+            system_instructions, input, *args, **kwargs
+        ):
+            if event.type == "response.completed":
+                usage = event.response.usage
+                self.recorder.record(
+                    system_instructions,
+                    input,
+                    event.response.output,
+                    usage.input_tokens if usage else 0,
+                    usage.output_tokens if usage else 0,
+                    time.perf_counter() - start,
+                )
+            yield event
+
+
+class ReplayRun:
+    """
+    The recorded turns of one agent run (the last turn repeats).
+    """
+
+    def __init__(self, agent_name: str, turns: list[dict[str, Any]]):
+        self.agent_name = agent_name
+        self.turns = turns
+        self._index = 0
+
+    def next_turn(self) -> dict[str, Any]:
+        turn = self.turns[min(self._index, len(self.turns) - 1)]
+        self._index += 1
+        return turn
+
+
+class AgentReplayer:
+    def __init__(self, source: Path):
+        self.source = source
+        if source.is_file():
+            path = source
+            content = source.read_text(encoding="utf-8")
+        else:
+            # StepID directory, or its bundle once compacted
+            path = source / RECORDING_FILENAME
+            content = read_step_file(source, RECORDING_FILENAME).decode("utf-8")
+        self.path = path
+        runs: dict[str, dict[str, list[dict[str, Any]]]] = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            agent_runs = runs.setdefault(entry["agent_name"], {})
+            agent_runs.setdefault(entry["run"], []).append(entry)
+        self._runs = {
+            agent_name: [sorted(turns, key=lambda t: t["turn"]) for turns in r.values()]
+            for agent_name, r in runs.items()
+        }
+        self._cursors: dict[str, int] = {}
+        logger.info(
+            f"[replay] {path}: "
+            + ", ".join(f"{a}={len(r)} runs" for a, r in self._runs.items())
+        )
+
+    def next_run(self, agent_name: str) -> ReplayRun:
+        runs = self._runs.get(agent_name)
+        if not runs:
+            raise ValueError(f"No recorded run of {agent_name} in {self.path}")
+        cursor = self._cursors.get(agent_name, 0)
+        self._cursors[agent_name] = cursor + 1
+        return ReplayRun(agent_name, runs[cursor % len(runs)])
+
+
+_agent_replayer: AgentReplayer | None = None
+
+
+def get_agent_replayer() -> AgentReplayer:
+    global _agent_replayer
+    source = get_settings().replay_path
+    if source is None:
+        raise ValueError("replay_path is not set")
+    if _agent_replayer is None or _agent_replayer.source != source:
+        _agent_replayer = AgentReplayer(source)
+    return _agent_replayer
+
+
+class ReplayModel(Model):
+    def __init__(self, run: ReplayRun):
+        self.run = run
+
+    def _turn(self) -> tuple[list[Any], int, int]:
+        turn = self.run.next_turn()
+        logger.debug(f"[replay] {self.run.agent_name} turn {turn['turn']}")
+        items = [_output_item_adapter.validate_python(i) for i in turn["output"]]
+        usage = turn.get("usage", {})
+        return items, usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        items, input_tokens, output_tokens = self._turn()
+        return await canned_response(items, input_tokens, output_tokens)
+
+    async def stream_response(
+        self, system_instructions, input, *args, **kwargs
+    ) -> AsyncIterator[Any]:
+        items, input_tokens, output_tokens = self._turn()
+        async for event in stream_canned_response(
+            items, input_tokens, output_tokens, model=f"replay-{self.run.agent_name}"
+        ):
+            yield event
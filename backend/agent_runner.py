@@ -0,0 +1,210 @@
+"""
+Agent runner
+
+Runs an agent with its per-agent settings (Settings.agent_config):
+- max_turns (default: LocalContext.max_turns)
+- timeout_sec: the whole run is cancelled and AgentTimeoutError is raised
+  when it takes longer (0: no timeout)
+
+Model requests go through the process-wide LLM scheduler (llm_scheduler)
+with the session priority. Its waits are yielded by stream_events() as
+LLMQueueEvent (type "llm_queue_event") when they are reported: the agent
+events are pumped by a task into the queue the waits are put into.
+
+With settings.agent_record, the model responses are recorded into the
+StepID archive directory (agent_recorder).
+
+When the stream ends (or fails), the AgentRunMetrics of the run (usage,
+time to first token, latency, LLM and tool time) is appended to
+context.agent_runs.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Literal
+
+from agents import Agent, RunConfig, RunHooks, Runner
+from agents.exceptions import AgentsException
+from agents.stream_events import StreamEvent
+
+from agent_logger import AgentLogger
+from agent_recorder import AgentRecorder
+from base import (
+    AgentRunMetrics,
+    LLMQueuePayload,
+    LLMWaitReason,
+    LocalContext,
+    ModelProviderType,
+)
+from config import get_settings
+from llm_scheduler import LimitedModelProvider
+from logger import logger
+
+
+class AgentTimeoutError(AgentsException):
+    def __init__(self, agent_name: str, timeout_sec: float):
+        super().__init__(f"{agent_name} timed out after {timeout_sec}s")
+        self.agent_name = agent_name
+        self.timeout_sec = timeout_sec
+
+
+@dataclass
+class LLMQueueEvent:
+    payload: LLMQueuePayload
+    type: Literal["llm_queue_event"] = "llm_queue_event"
+
+
+class AgentRun:
+    """
+    Runner.run_streamed() with the agent's max_turns and timeout.
+    stream_events(), final_output and context_wrapper are those of the
+    underlying RunResultStreaming. hooks defaults to AgentLogger (LLM and
+    tool times are only measured with an AgentLogger).
+    """
+
+    def __init__(
+        self,
+        agent: Agent[LocalContext],
+        input: str,
+        context: LocalContext,
+        hooks: RunHooks | None = None,
+    ):
+        settings = get_settings()
+        config = settings.agent_config(agent.name)
+        self.agent_name = agent.name
+        self.timeout_sec = config.timeout_sec or 0
+        self.context = context
+        self.hooks = hooks if hooks is not None else AgentLogger()
+        self._model = str(agent.model or config.model)
+        if settings.model_provider != ModelProviderType.OPENAI:
+            self._model = f"{settings.model_provider}:{self._model}"
+        # Agent events and LLMQueueEvents, in the order they happen
+        self._events: asyncio.Queue[StreamEvent | LLMQueueEvent | None] = (
+            asyncio.Queue()
+        )
+        self._queue_wait_sec = 0.0
+        self._start = time.perf_counter()
+        self._ttft_sec: float | None = None
+        self._recorded = False
+        max_turns = config.max_turns or context.max_turns
+        logger.debug(
+            f"run {agent.name}: model={agent.model}, max_turns={max_turns}, "
+            f"timeout_sec={self.timeout_sec}"
+        )
+        self.result = Runner.run_streamed(
+            starting_agent=agent,
+            input=input,
+            context=context,
+            max_turns=max_turns,
+            hooks=self.hooks,
+            run_config=RunConfig(
+                model_provider=LimitedModelProvider(
+                    agent_name=agent.name,
+                    priority=context.priority,
+                    on_wait=self._on_llm_wait,
+                    recorder=(
+                        AgentRecorder(context.stepid_dir, agent.name)
+                        if settings.agent_record
+                        else None
+                    ),
+                )
+            ),
+        )
+
+    @property
+    def final_output(self) -> Any:
+        return self.result.final_output
+
+    @property
+    def context_wrapper(self):
+        return self.result.context_wrapper
+
+    def _on_llm_wait(self, payload: LLMQueuePayload) -> None:
+        self._events.put_nowait(LLMQueueEvent(payload=payload))
+        if payload.reason == LLMWaitReason.QUEUED:
+            self._queue_wait_sec += payload.wait_sec
+
+    async def _pump(self) -> None:
+        # None: end of the agent stream
+        try:
+            async for event in self._stream_events():
+                self._events.put_nowait(event)
+        finally:
+            self._events.put_nowait(None)
+
+    async def stream_events(self) -> AsyncIterator[StreamEvent | LLMQueueEvent]:
+        pump = asyncio.create_task(self._pump())
+        try:
+            while (event := await self._events.get()) is not None:
+                if (
+                    self._ttft_sec is None
+                    and event.type == "raw_response_event"
+                    and event.data.type.endswith(".delta")
+                ):
+                    self._ttft_sec = time.perf_counter() - self._start
+                yield event
+            # Errors of the agent stream (timeout, agent exceptions)
+            await pump
+        finally:
+            if not pump.done():
+                pump.cancel()
+            await asyncio.gather(pump, return_exceptions=True)
+            self._record_metrics()
+
+    def _record_metrics(self) -> None:
+        if self._recorded:
+            return
+        self._recorded = True
+        usage = self.result.context_wrapper.usage
+        cached_tokens = getattr(usage.input_tokens_details, "cached_tokens", 0)
+        hooks = self.hooks if isinstance(self.hooks, AgentLogger) else None
+        metrics = AgentRunMetrics(
+            agent_name=self.agent_name,
+            model=self._model,
+            requests=usage.requests,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cached_tokens=cached_tokens or 0,
+            total_tokens=usage.total_tokens,
+            ttft_sec=round(self._ttft_sec, 3) if self._ttft_sec is not None else None,
+            latency_sec=round(time.perf_counter() - self._start, 3),
+            queue_wait_sec=round(self._queue_wait_sec, 3),
+            llm_sec=round(hooks.llm_sec, 3) if hooks else 0.0,
+            tool_calls=hooks.tool_calls if hooks else 0,
+            tool_sec=(
+                {name: round(sec, 3) for name, sec in hooks.tool_sec.items()}
+                if hooks
+                else {}
+            ),
+        )
+        logger.info(
+            f"[metrics] {metrics.agent_name}: tokens={metrics.total_tokens} "
+            f"(in={metrics.input_tokens}, out={metrics.output_tokens}, "
+            f"cached={metrics.cached_tokens}), ttft={metrics.ttft_sec}s, "
+            f"latency={metrics.latency_sec}s, llm={metrics.llm_sec}s, "
+            f"tools={metrics.tool_calls}"
+        )
+        self.context.agent_runs.append(metrics)
+
+    async def _stream_events(self) -> AsyncIterator[StreamEvent]:
+        events = self.result.stream_events()
+        if self.timeout_sec <= 0:
+            async for event in events:
+                yield event
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout_sec
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    anext(events), timeout=max(deadline - loop.time(), 0)
+                )
+            except StopAsyncIteration:
+                return
+            except TimeoutError:
+                logger.warning(f"{self.agent_name} timed out ({self.timeout_sec}s)")
+                self.result.cancel()
+                raise AgentTimeoutError(self.agent_name, self.timeout_sec)
+            yield event
@@ -0,0 +1,355 @@
+"""
+Archive compaction and retention
+
+Finished StepID directories of settings.archive_dir (not used by a running
+session and unchanged for settings.archive_compact_after_sec) are packed
+into one zip bundle per step: <archive_dir>/bundles/<StepID>.zip. The zip
+central directory is the index, so a single artifact can be read without
+unpacking the bundle (read_archived). Already compressed files (images,
+archives) are stored, the others deflated. A step archived again after
+it was packed is merged into a new bundle (_unpack_bundle).
+
+After packing, blobs of archive_store that no step directory links to any
+more are removed (link count 1, older than BLOB_GRACE_SEC).
+
+Retention (0: no limit) deletes the oldest bundles beyond
+settings.archive_retention_days, archive_retention_max_steps and
+archive_retention_max_bytes.
+
+run_compactor() runs ArchiveCompactor.compact() every
+settings.archive_compact_interval_sec (0, the default: disabled).
+Compacted steps are read with list_archived/read_archived (read_step_file
+for a step directory outside settings.archive_dir).
+"""
+
+import asyncio
+import os
+import re
+import shutil
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from archive_store import (
+    BLOBS_DIR,
+    MANIFEST_FILENAME,
+    TMP_DIR,
+    next_version_path,
+    parse_manifest,
+)
+from base import ArchiveCompactorStats
+from config import Settings, get_settings
+from logger import logger
+
+BUNDLES_DIR = "bundles"
+BUNDLE_SUFFIX = ".zip"
+STEP_ID_RE = re.compile(r"^StepID-[0-9]{8}-[0-9]{6}(-[0-9]+)?$")
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".zip", ".gz", ".zst"}
+BLOB_GRACE_SEC = 60 * 60
+
+_active_steps: set[str] = set()
+_active_lock = threading.Lock()
+
+
+def mark_step_active(step_id: str) -> None:
+    with _active_lock:
+        _active_steps.add(step_id)
+
+
+def mark_step_finished(step_id: str) -> None:
+    with _active_lock:
+        _active_steps.discard(step_id)
+
+
+def _is_active(step_id: str) -> bool:
+    with _active_lock:
+        return step_id in _active_steps
+
+
+def bundle_path(archive_dir: Path, step_id: str) -> Path:
+    return archive_dir / BUNDLES_DIR / f"{step_id}{BUNDLE_SUFFIX}"
+
+
+def _last_modified(step_dir: Path) -> float:
+    mtimes = [step_dir.stat().st_mtime]
+    for root, dirs, files in os.walk(step_dir):
+        for name in dirs + files:
+            mtimes.append(os.lstat(os.path.join(root, name)).st_mtime)
+    return max(mtimes)
+
+
+def _pack_step(step_dir: Path, bundle: Path) -> int:
+    """
+    Pack step_dir into bundle (written atomically). Returns its size.
+    """
+    bundle.parent.mkdir(parents=True, exist_ok=True)
+    tmp = bundle.with_name(f".{bundle.name}.tmp")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(p for p in step_dir.rglob("*") if p.is_file()):
+            compress = (
+                zipfile.ZIP_STORED
+                if path.suffix.lower() in STORED_SUFFIXES
+                else zipfile.ZIP_DEFLATED
+            )
+            arcname = path.relative_to(step_dir).as_posix()
+            zf.write(path, arcname, compress_type=compress)
+    os.replace(tmp, bundle)
+    return bundle.stat().st_size
+
+
+def _unpack_bundle(bundle: Path, step_dir: Path) -> None:
+    """
+    Restore the files of bundle into step_dir (archived again). The
+    manifests are merged (bundled entries first); a bundled file whose
+    path was archived again with other content is kept as
+    <stem>_v<n><suffix> (n: its bundled version if free).
+    """
+    with zipfile.ZipFile(bundle) as zf:
+        names = [n for n in zf.namelist() if not n.endswith("/")]
+        bundled = b""
+        if MANIFEST_FILENAME in names:
+            bundled = zf.read(MANIFEST_FILENAME)
+            names.remove(MANIFEST_FILENAME)
+        versions = {
+            e["path"]: e["version"] for e in parse_manifest(bundled.decode("utf-8"))
+        }
+        for name in names:
+            content = zf.read(name)
+            target = step_dir / name
+            if target.exists():
+                if target.read_bytes() == content:
+                    continue
+                version = versions.get(name)
+                versioned = target.with_name(f"{target.stem}_v{version}{target.suffix}")
+                if version is None or versioned.exists():
+                    versioned, _ = next_version_path(target)
+                target = versioned
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+    if bundled:
+        manifest = step_dir / MANIFEST_FILENAME
+        current = manifest.read_bytes() if manifest.exists() else b""
+        if not bundled.endswith(b"\n"):
+            bundled += b"\n"
+        manifest.write_bytes(bundled + current)
+
+
+class ArchiveCompactor:
+    def __init__(self, archive_dir: Path):
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._compacted = 0
+        self._files_packed = 0
+        self._bundle_bytes_written = 0
+        self._blobs_removed = 0
+        self._bundles_expired = 0
+        self._errors = 0
+        self._last_run_sec = 0.0
+
+    def _finished_steps(self, compact_after_sec: float) -> list[Path]:
+        now = time.time()
+        steps = []
+        for step_dir in sorted(self.archive_dir.iterdir()):
+            if not step_dir.is_dir() or not STEP_ID_RE.match(step_dir.name):
+                continue
+            if _is_active(step_dir.name):
+                continue
+            if now - _last_modified(step_dir) < compact_after_sec:
+                continue
+            steps.append(step_dir)
+        return steps
+
+    def _compact_step(self, step_dir: Path) -> None:
+        bundle = bundle_path(self.archive_dir, step_dir.name)
+        if bundle.exists():
+            # Packed before and written again (late archive): keep both
+            # by merging the directory into a new bundle
+            _unpack_bundle(bundle, step_dir)
+        files = sum(1 for p in step_dir.rglob("*") if p.is_file())
+        size = _pack_step(step_dir, bundle)
+        shutil.rmtree(step_dir)
+        with self._lock:
+            self._compacted += 1
+            self._files_packed += files
+            self._bundle_bytes_written += size
+        logger.info(f"[archive] compacted {step_dir.name}: {files} files, {size} bytes")
+
+    def _collect_blobs(self) -> None:
+        """
+        Remove blobs no view links to (link count 1).
+        """
+        blobs_dir = self.archive_dir / BLOBS_DIR
+        if not blobs_dir.is_dir():
+            return
+        now = time.time()
+        removed = 0
+        for prefix_dir in blobs_dir.iterdir():
+            if not prefix_dir.is_dir() or prefix_dir.name == TMP_DIR:
+                continue
+            for blob in prefix_dir.iterdir():
+                st = blob.stat()
+                if st.st_nlink == 1 and now - st.st_ctime > BLOB_GRACE_SEC:
+                    blob.unlink()
+                    removed += 1
+        with self._lock:
+            self._blobs_removed += removed
+        if removed:
+            logger.info(f"[archive] removed {removed} unreferenced blobs")
+
+    def _enforce_retention(self, settings: Settings) -> None:
+        bundles_dir = self.archive_dir / BUNDLES_DIR
+        if not bundles_dir.is_dir():
+            return
+        # Oldest first (StepIDs sort by time)
+        bundles = sorted(bundles_dir.glob(f"StepID-*{BUNDLE_SUFFIX}"))
+        sizes = {b: b.stat().st_size for b in bundles}
+        total = sum(sizes.values())
+        max_age = settings.archive_retention_days * 24 * 60 * 60
+        now = time.time()
+        expired = []
+        for i, bundle in enumerate(bundles):
+            remaining = len(bundles) - i
+            too_old = max_age > 0 and now - bundle.stat().st_mtime > max_age
+            too_many = 0 < settings.archive_retention_max_steps < remaining
+            too_big = 0 < settings.archive_retention_max_bytes < total
+            if not (too_old or too_many or too_big):
+                break
+            bundle.unlink()
+            total -= sizes[bundle]
+            expired.append(bundle.stem)
+        with self._lock:
+            self._bundles_expired += len(expired)
+        if expired:
+            logger.info(f"[archive] retention removed bundles: {expired}")
+
+    def compact(self, settings: Settings) -> None:
+        start = time.monotonic()
+        if self.archive_dir.is_dir():
+            for step_dir in self._finished_steps(settings.archive_compact_after_sec):
+                try:
+                    self._compact_step(step_dir)
+                except Exception as e:
+                    logger.error(f"[archive] compaction failed: {step_dir}, {e}")
+                    with self._lock:
+                        self._errors += 1
+            self._collect_blobs()
+            self._enforce_retention(settings)
+        with self._lock:
+            self._runs += 1
+            self._last_run_sec = time.monotonic() - start
+
+    def stats(self) -> ArchiveCompactorStats:
+        bundles_dir = self.archive_dir / BUNDLES_DIR
+        bundles = (
+            list(bundles_dir.glob(f"*{BUNDLE_SUFFIX}")) if bundles_dir.is_dir() else []
+        )
+        with self._lock:
+            return ArchiveCompactorStats(
+                runs=self._runs,
+                compacted=self._compacted,
+                files_packed=self._files_packed,
+                bundle_bytes_written=self._bundle_bytes_written,
+                blobs_removed=self._blobs_removed,
+                bundles_expired=self._bundles_expired,
+                errors=self._errors,
+                last_run_sec=round(self._last_run_sec, 3),
+                bundles=len(bundles),
+                bundle_bytes=sum(b.stat().st_size for b in bundles),
+            )
+
+
+_archive_compactor: ArchiveCompactor | None = None
+
+
+def get_archive_compactor() -> ArchiveCompactor:
+    global _archive_compactor
+    if _archive_compactor is None:
+        _archive_compactor = ArchiveCompactor(get_settings().archive_dir.resolve())
+    return _archive_compactor
+
+
+async def run_compactor() -> None:
+    """
+    Background task (see main.lifespan).
+    """
+    settings = get_settings()
+    interval = settings.archive_compact_interval_sec
+    if interval <= 0:
+        return
+    compactor = get_archive_compactor()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(compactor.compact, settings)
+        except Exception as e:
+            logger.error(f"[archive] compactor error: {e}")
+
+
+def _step_dir(step_id: str) -> Path:
+    if not STEP_ID_RE.match(step_id):
+        raise ValueError(f"Invalid step_id: {step_id}")
+    return get_settings().archive_dir.resolve() / step_id
+
+
+def read_bundled_manifest(step_dir: Path) -> list[dict]:
+    """
+    Manifest entries of the bundle of step_dir ([] if not compacted).
+    """
+    bundle = bundle_path(step_dir.parent, step_dir.name)
+    if not bundle.is_file():
+        return []
+    with zipfile.ZipFile(bundle) as zf:
+        try:
+            return parse_manifest(zf.read(MANIFEST_FILENAME).decode("utf-8"))
+        except KeyError:
+            return []
+
+
+def list_archived(step_id: str) -> list[str]:
+    """
+    Paths of the archived files of a step (directory or bundle).
+    Raises FileNotFoundError if the step is unknown.
+    """
+    step_dir = _step_dir(step_id)
+    if step_dir.is_dir():
+        return sorted(
+            p.relative_to(step_dir).as_posix()
+            for p in step_dir.rglob("*")
+            if p.is_file()
+        )
+    bundle = bundle_path(step_dir.parent, step_id)
+    if bundle.is_file():
+        with zipfile.ZipFile(bundle) as zf:
+            return sorted(n for n in zf.namelist() if not n.endswith("/"))
+    raise FileNotFoundError(f"Step not found: {step_id}")
+
+
+def read_archived(step_id: str, path: str) -> bytes:
+    """
+    Content of an archived file of a step, from its directory or (compacted
+    steps) its bundle. Raises FileNotFoundError if not archived.
+    """
+    return read_step_file(_step_dir(step_id), path)
+
+
+def read_step_file(step_dir: Path, path: str) -> bytes:
+    """
+    read_archived for the step directory step_dir (<archive dir>/<StepID>).
+    """
+    step_dir = step_dir.resolve()
+    step_id = step_dir.name
+    if step_dir.is_dir():
+        target = (step_dir / path).resolve()
+        if not target.is_relative_to(step_dir) or not target.is_file():
+            raise FileNotFoundError(f"Not archived: {step_id}/{path}")
+        return target.read_bytes()
+    bundle = bundle_path(step_dir.parent, step_id)
+    if not bundle.is_file():
+        raise FileNotFoundError(f"Step not found: {step_id}")
+    with zipfile.ZipFile(bundle) as zf:
+        try:
+            return zf.read(path)
+        except KeyError:
+            raise FileNotFoundError(f"Not archived: {step_id}/{path}") from None
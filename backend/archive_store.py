@@ -0,0 +1,254 @@
+"""
+Content-addressed archive store (behind common.archive)
+
+- Blobs: <archive_dir>/blobs/<hash[:2]>/<sha256>, stored once per content
+  and read-only. A blob is written to blobs/.tmp and published with a
+  hardlink, so concurrent stores of the same content keep one inode.
+- Manifest: <stepid_dir>/manifest.jsonl, one line per archived file
+  (logical path, version, hash, size, source path, time).
+- View: <stepid_dir>/<dir>/<file> is a hardlink to the blob (a copy if the
+  link fails), so the step directory can be browsed as before. When a path
+  is archived again with other content, the previous view is renamed to
+  <stem>_v<n><suffix> (n: its version). Archiving the content of the
+  latest manifest entry of the path again is a no-op. A step archived
+  again after it was compacted continues the versions of its bundle.
+- Every stored version is also recorded in the step index (step_index).
+
+Archiving known content costs a hash and a link. put() is thread-safe
+(archive_writer runs it on worker threads).
+"""
+
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from base import ArchiveStats
+from common import clone_file, link_file, sha256_file
+from config import get_settings
+from logger import logger
+from step_index import index_archive
+
+BLOBS_DIR = "blobs"
+MANIFEST_FILENAME = "manifest.jsonl"
+TMP_DIR = ".tmp"
+VIEW_LOCKS = 64
+HEAD_CACHE_STEPS = 64
+
+
+class ArchiveStore:
+    def __init__(self, blobs_dir: Path):
+        self.blobs_dir = blobs_dir
+        self._lock = threading.Lock()
+        # Serializes the versioning of a view path (striped by path)
+        self._view_locks = [threading.Lock() for _ in range(VIEW_LOCKS)]
+        # stepid_dir -> {path: (hash, version)} of the latest manifest
+        # entries (LRU, loaded from the manifest)
+        self._heads: OrderedDict[Path, dict[str, tuple[str, int]]] = OrderedDict()
+        self._files = 0
+        self._unchanged = 0
+        self._dedup_hits = 0
+        self._blobs_stored = 0
+        self._bytes_stored = 0
+        self._bytes_deduplicated = 0
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def snapshot(self, src_path: Path) -> Path:
+        """
+        Copy of src_path (reflink where supported) in blobs/.tmp, to be
+        archived later with put_snapshot().
+        """
+        tmp_dir = self.blobs_dir / TMP_DIR
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp = tmp_dir / uuid.uuid4().hex
+        clone_file(str(src_path), str(tmp))
+        return tmp
+
+    def _publish(self, tmp: Path) -> tuple[str, Path, bool]:
+        """
+        Store the snapshot tmp as a blob (tmp is removed).
+        Returns (hash, blob path, True if newly stored).
+        """
+        try:
+            digest = sha256_file(tmp)
+            blob = self.blob_path(digest)
+            if blob.exists():
+                return digest, blob, False
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.chmod(tmp, 0o444)
+            try:
+                os.link(tmp, blob)
+            except FileExistsError:
+                # Stored by another thread meanwhile
+                return digest, blob, False
+            return digest, blob, True
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _store_blob(self, src_path: Path) -> tuple[str, Path, bool]:
+        """
+        Hash src_path and store it as a blob unless known.
+        Returns (hash, blob path, True if newly stored).
+        """
+        digest = sha256_file(src_path)
+        blob = self.blob_path(digest)
+        if blob.exists():
+            return digest, blob, False
+        # Copy first and name the blob after the copy (src may change)
+        return self._publish(self.snapshot(src_path))
+
+    def _head(self, stepid_dir: Path, path: str) -> tuple[str, int] | None:
+        """
+        (hash, version) of the latest manifest entry of path.
+        """
+        with self._lock:
+            heads = self._heads.get(stepid_dir)
+            if heads is None or not (stepid_dir / MANIFEST_FILENAME).exists():
+                heads = {}
+                for entry in read_manifest(stepid_dir):
+                    heads[entry["path"]] = (entry["hash"], entry["version"])
+                self._heads[stepid_dir] = heads
+            self._heads.move_to_end(stepid_dir)
+            while len(self._heads) > HEAD_CACHE_STEPS:
+                self._heads.popitem(last=False)
+            return heads.get(path)
+
+    def put(self, src_path: Path, stepid_dir: Path, rel_path: Path) -> Path:
+        """
+        Archive src_path as rel_path of the step. Returns the view path.
+        """
+        _, blob, stored = self._store_blob(src_path)
+        return self._put_blob(src_path, stepid_dir, rel_path, blob, stored)
+
+    def put_snapshot(
+        self, snapshot: Path, src_path: Path, stepid_dir: Path, rel_path: Path
+    ) -> Path:
+        """
+        Archive a snapshot() of src_path as rel_path of the step (the
+        snapshot is consumed). Returns the view path.
+        """
+        _, blob, stored = self._publish(snapshot)
+        return self._put_blob(src_path, stepid_dir, rel_path, blob, stored)
+
+    def _put_blob(
+        self, src_path: Path, stepid_dir: Path, rel_path: Path, blob: Path, stored: bool
+    ) -> Path:
+        view = stepid_dir / rel_path
+        view.parent.mkdir(parents=True, exist_ok=True)
+        with self._view_locks[hash(view) % VIEW_LOCKS]:
+            return self._put_view(src_path, stepid_dir, rel_path, view, blob, stored)
+
+    def _put_view(
+        self,
+        src_path: Path,
+        stepid_dir: Path,
+        rel_path: Path,
+        view: Path,
+        blob: Path,
+        stored: bool,
+    ) -> Path:
+        digest = blob.name
+        size = blob.stat().st_size
+        head = self._head(stepid_dir, rel_path.as_posix())
+        if head is not None and head[0] == digest:
+            if not view.exists():
+                link_file(str(blob), str(view))
+            with self._lock:
+                self._files += 1
+                self._unchanged += 1
+            logger.debug(f"archive unchanged: {rel_path} ({digest[:12]})")
+            return view
+        version = head[1] + 1 if head is not None else 1
+        if view.exists():
+            versioned = view.with_name(f"{view.stem}_v{version - 1}{view.suffix}")
+            if head is None or versioned.exists():
+                versioned, n = next_version_path(view)
+                version = max(version, n + 1)
+            os.replace(view, versioned)
+            logger.debug(f"Archived old version: {view} -> {versioned}")
+        link_file(str(blob), str(view))
+
+        entry = {
+            "path": rel_path.as_posix(),
+            "version": version,
+            "hash": digest,
+            "size": size,
+            "src": str(src_path),
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+        }
+        with self._lock:
+            with open(stepid_dir / MANIFEST_FILENAME, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            heads = self._heads.get(stepid_dir)
+            if heads is not None:
+                heads[entry["path"]] = (digest, version)
+            self._files += 1
+            if stored:
+                self._blobs_stored += 1
+                self._bytes_stored += size
+            else:
+                self._dedup_hits += 1
+                self._bytes_deduplicated += size
+        index_archive(stepid_dir, entry["path"], version, digest, size, entry["time"])
+        logger.debug(
+            f"archive: {src_path} -> {view} ({digest[:12]}, "
+            f"{'stored' if stored else 'deduplicated'})"
+        )
+        return view
+
+    def stats(self) -> ArchiveStats:
+        with self._lock:
+            return ArchiveStats(
+                files=self._files,
+                unchanged=self._unchanged,
+                dedup_hits=self._dedup_hits,
+                blobs_stored=self._blobs_stored,
+                bytes_stored=self._bytes_stored,
+                bytes_deduplicated=self._bytes_deduplicated,
+            )
+
+
+def next_version_path(view: Path) -> tuple[Path, int]:
+    """
+    First free <stem>_v<n><suffix> next to view, and n.
+    """
+    n = 1
+    while True:
+        versioned = view.with_name(f"{view.stem}_v{n}{view.suffix}")
+        if not versioned.exists():
+            return versioned, n
+        n += 1
+
+
+def parse_manifest(text: str) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def read_manifest(stepid_dir: Path) -> list[dict]:
+    """
+    Manifest entries of the step. A step archived again after it was
+    compacted has the entries of its bundle first.
+    """
+    from archive_compactor import read_bundled_manifest
+
+    entries = read_bundled_manifest(stepid_dir)
+    path = stepid_dir / MANIFEST_FILENAME
+    if path.is_file():
+        entries += parse_manifest(path.read_text(encoding="utf-8"))
+    return entries
+
+
+_archive_store: ArchiveStore | None = None
+
+
+def get_archive_store() -> ArchiveStore:
+    global _archive_store
+    if _archive_store is None:
+        settings = get_settings()
+        _archive_store = ArchiveStore(settings.archive_dir.resolve() / BLOBS_DIR)
+    return _archive_store
@@ -0,0 +1,209 @@
+"""
+Background archive writer (settings.archive_async)
+
+common.archive() only takes a snapshot of the file (a reflink or copy in
+blobs/.tmp, so later writes to the source do not change what is
+archived) and enqueues it; hashing, storing and versioning
+(ArchiveStore.put_snapshot) run on a bounded thread pool
+(settings.archive_workers).
+
+- Ordering: the jobs of one step path run one after the other in submit
+  order, so the versions follow the archive() calls.
+- Coalescing: a job whose content is identical to the last queued job of
+  the same path is dropped.
+- Backpressure: when settings.archive_queue_max jobs are pending, the
+  caller archives synchronously (unless jobs of the same path are queued,
+  which would then be overtaken).
+- Flush barrier: flush(stepid_dir) waits until the jobs of the step are
+  done (before DONE is sent, see main.py).
+- Failed jobs are logged and counted, they are not raised to the caller.
+"""
+
+import asyncio
+import filecmp
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from archive_store import get_archive_store
+from base import ArchiveQueueStats
+from config import get_settings
+from logger import logger
+
+
+@dataclass
+class _Job:
+    snapshot: Path
+    src_path: Path
+    enqueued: float
+    started: bool = False
+
+
+class ArchiveWriter:
+    def __init__(self, workers: int, queue_max: int):
+        self.workers = max(1, workers)
+        self.queue_max = queue_max
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="archive"
+        )
+        self._cond = threading.Condition()
+        # (stepid_dir, rel_path) -> queued jobs (in submit order), while a
+        # worker drains them
+        self._queued: dict[tuple[Path, Path], deque[_Job]] = {}
+        # stepid_dir -> queued or running jobs
+        self._outstanding: dict[Path, int] = {}
+        self._depth = 0
+        # stats
+        self._submitted = 0
+        self._coalesced = 0
+        self._completed = 0
+        self._errors = 0
+        self._sync_fallbacks = 0
+        self._max_depth = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._lag_last = 0.0
+
+    def submit(self, src_path: Path, stepid_dir: Path, rel_path: Path) -> None:
+        store = get_archive_store()
+        key = (stepid_dir, rel_path)
+        with self._cond:
+            self._submitted += 1
+            pending = key in self._queued
+            sync = not pending and 0 < self.queue_max <= self._depth
+            if sync:
+                self._sync_fallbacks += 1
+        if sync:
+            logger.debug(f"archive queue full ({self.queue_max}), archiving inline")
+            store.put(src_path, stepid_dir, rel_path)
+            return
+
+        snapshot = store.snapshot(src_path)
+        with self._cond:
+            jobs = self._queued.get(key)
+            last = jobs[-1] if jobs else None
+            if (
+                last is not None
+                and not last.started
+                and filecmp.cmp(last.snapshot, snapshot, shallow=False)
+            ):
+                self._coalesced += 1
+                coalesced = True
+            else:
+                coalesced = False
+                start = jobs is None
+                if start:
+                    jobs = self._queued[key] = deque()
+                jobs.append(_Job(snapshot, src_path, time.monotonic()))
+                self._outstanding[stepid_dir] = self._outstanding.get(stepid_dir, 0) + 1
+                self._depth += 1
+                self._max_depth = max(self._max_depth, self._depth)
+        if coalesced:
+            snapshot.unlink(missing_ok=True)
+            logger.trace(f"archive coalesced: {src_path} -> {rel_path}")
+            return
+        if start:
+            self._executor.submit(self._drain, key)
+
+    def _drain(self, key: tuple[Path, Path]) -> None:
+        """
+        Run the queued jobs of key in order until none is left.
+        """
+        stepid_dir, rel_path = key
+        while True:
+            with self._cond:
+                jobs = self._queued[key]
+                if not jobs:
+                    del self._queued[key]
+                    return
+                job = jobs[0]
+                job.started = True
+            try:
+                get_archive_store().put_snapshot(
+                    job.snapshot, job.src_path, stepid_dir, rel_path
+                )
+                failed = False
+            except Exception as e:
+                logger.error(f"Failed to backup file: {job.src_path}, {e}")
+                job.snapshot.unlink(missing_ok=True)
+                failed = True
+            lag = time.monotonic() - job.enqueued
+            with self._cond:
+                jobs.popleft()
+                self._depth -= 1
+                self._outstanding[stepid_dir] -= 1
+                if self._outstanding[stepid_dir] == 0:
+                    del self._outstanding[stepid_dir]
+                self._completed += 1
+                self._errors += failed
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+                self._lag_last = lag
+                self._cond.notify_all()
+
+    def _wait(self, stepid_dir: Path | None, timeout: float | None) -> bool:
+        def idle() -> bool:
+            if stepid_dir is None:
+                return self._depth == 0
+            return stepid_dir not in self._outstanding
+
+        with self._cond:
+            return self._cond.wait_for(idle, timeout=timeout)
+
+    async def flush(self, stepid_dir: Path | None = None) -> bool:
+        """
+        Wait until the queued archives of stepid_dir (None: all) are written.
+        Returns False on timeout (settings.archive_flush_timeout_sec).
+        """
+        with self._cond:
+            if stepid_dir is not None and stepid_dir not in self._outstanding:
+                return True
+        start = time.monotonic()
+        timeout = get_settings().archive_flush_timeout_sec or None
+        done = await asyncio.to_thread(self._wait, stepid_dir, timeout)
+        elapsed = time.monotonic() - start
+        if not done:
+            logger.warning(
+                f"archive flush timed out after {elapsed:.1f}s: {stepid_dir}"
+            )
+        else:
+            logger.debug(f"archive flushed in {elapsed:.3f}s: {stepid_dir}")
+        return done
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> ArchiveQueueStats:
+        with self._cond:
+            completed = self._completed
+            return ArchiveQueueStats(
+                workers=self.workers,
+                depth=self._depth,
+                max_depth=self._max_depth,
+                submitted=self._submitted,
+                coalesced=self._coalesced,
+                completed=completed,
+                errors=self._errors,
+                sync_fallbacks=self._sync_fallbacks,
+                lag_avg_sec=(
+                    round(self._lag_total / completed, 3) if completed else 0.0
+                ),
+                lag_max_sec=round(self._lag_max, 3),
+                lag_last_sec=round(self._lag_last, 3),
+            )
+
+
+_archive_writer: ArchiveWriter | None = None
+
+
+def get_archive_writer() -> ArchiveWriter:
+    global _archive_writer
+    if _archive_writer is None:
+        settings = get_settings()
+        _archive_writer = ArchiveWriter(
+            workers=settings.archive_workers, queue_max=settings.archive_queue_max
+        )
+    return _archive_writer
@@ -1,14 +1,16 @@
+import asyncio
 from enum import StrEnum
 from pathlib import Path
 from typing import Any, List, Literal, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # Enum Definitions
 class EventType(StrEnum):
     STARTED = "started"
     CODE = "code"
+    CODE_DELTA = "code_delta"
     AGENT_UPDATE = "agent_update"
     DONE = "done"
     CHECK_RESULT = "check_result"
@@ -18,6 +20,8 @@ class EventType(StrEnum):
     TEST_RESULT = "test_result"
     TEST_SCREENSHOT = "test_screenshot"
     ANALYZER_RESULT = "analyzer_result"
+    LLM_QUEUE = "llm_queue"
+    METRICS = "metrics"
 
 
 class StartedStatus(StrEnum):
@@ -29,6 +33,36 @@ class DoneStatus(StrEnum):
     FAILED = "Failed"
 
 
+class CodeCheckMode(StrEnum):
+    AGENT = "agent"  # CodeCheckAgent calls the check_code tool
+    DIRECT = "direct"  # call run_eslint directly
+
+
+class AgentName(StrEnum):
+    CODE_GEN = "CodeGenAgent"
+    CODE_CHECK = "CodeCheckAgent"
+    PLACE_FILES = "PlaceFilesAgent"
+    RUN_TESTS = "RunTestsAgent"
+    ANALYZER = "AnalyzerAgent"
+    FIXER = "FixerAgent"
+
+
+class ModelProviderType(StrEnum):
+    OPENAI = "openai"
+    STUB = "stub"  # offline canned outputs (stub_model)
+    REPLAY = "replay"  # recorded agent runs (agent_recorder)
+
+
+class SessionPriority(StrEnum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+class LLMWaitReason(StrEnum):
+    QUEUED = "queued"  # waited for the rate limit
+    RETRY = "retry"  # retryable error, backing off
+
+
 class PromptCategory(StrEnum):
     GEN_CODE = "GenCode"
     PLACE_FILES = "PlaceFiles"
@@ -38,6 +72,17 @@ class PromptCategory(StrEnum):
 class PromptHeaderKey(StrEnum):
     CATEGORY = "Category"
     BUILD_CHECK = "BuildCheck"
+    # RunTests
+    TEST_DIR = "TestDir"
+    TEST_FILE = "TestFile"
+    PROJECT = "Project"
+    SCREENSHOT_FILES = "ScreenshotFiles"
+    # PlaceFiles
+    FROM_DIR = "FromDir"
+    TO_DIR = "ToDir"
+    FILES = "Files"
+    # Session
+    PRIORITY = "Priority"
 
 
 class DebugMode(StrEnum):
@@ -59,6 +104,15 @@ class LoopAction(StrEnum):
     BREAK = "break"
 
 
+class TestRunStatus(StrEnum):
+    BEGIN = "begin"
+    STARTED = "started"
+    PASSED = "passed"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    END = "end"
+
+
 class Confidence(StrEnum):
     PROBABLE = "probable"
     LIKELY = "likely"
@@ -87,6 +141,12 @@ class CodeType(BaseModel):
     code: str
 
 
+class CodeDeltaPayload(BaseModel):
+    language: str
+    offset: int  # position of delta in the code (0: code restarted)
+    delta: str
+
+
 class CodeSaveData(BaseModel):
     code: str
     directory: str
@@ -109,9 +169,62 @@ class FunctionResult(BaseModel):
     result: bool
     abort_flg: bool = False
     detail: str | None = None
+    messages: list[str] | None = None  # run_build: stderr messages
+
+
+class AgentConfig(BaseModel):
+    """
+    Per-agent settings (None: use the default of Settings)
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    model: str | None = None
+    temperature: float | None = None
+    max_turns: int | None = None
+    timeout_sec: float | None = None  # 0: no timeout
+
+
+class AgentRunMetrics(BaseModel):
+    agent_name: str
+    model: str
+    requests: int
+    input_tokens: int
+    output_tokens: int
+    cached_tokens: int
+    total_tokens: int
+    ttft_sec: float | None  # first streamed delta (None: no delta)
+    latency_sec: float
+    queue_wait_sec: float  # LLM scheduler waits
+    llm_sec: float
+    tool_calls: int
+    tool_sec: dict[str, float]  # per tool name
+
+
+class MetricsTotals(BaseModel):
+    runs: int = 0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    total_tokens: int = 0
+    latency_sec: float = 0.0
+    queue_wait_sec: float = 0.0
+    llm_sec: float = 0.0
+    tool_calls: int = 0
+    tool_sec: float = 0.0
+
+
+class MetricsPayload(BaseModel):
+    step: str
+    runs: list[AgentRunMetrics]
+    step_totals: MetricsTotals
+    session_totals: MetricsTotals
 
 
 class LocalContext(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     category: str
     output_dir: Path
     max_turns: int
@@ -132,6 +245,29 @@ class LocalContext(BaseModel):
     screenshots: List[ScreenshotInfo] = []
     loop_action: LoopAction
     rebuild_result: FunctionResult
+    # SSE events emitted from inside tools (e.g. Playwright progress)
+    event_queue: asyncio.Queue | None = Field(default=None, exclude=True)
+    # Speculative code generation: generated code is saved with this suffix
+    # (e.g. page.candidate1.tsx) until it is promoted
+    scratch_suffix: str | None = None
+    # LLM tokens used by code generation in this session (and number of runs)
+    tokens_used: int = 0
+    code_gen_runs: int = 0
+    # LLM request priority (Priority header)
+    priority: SessionPriority = SessionPriority.INTERACTIVE
+    # Metrics of every agent run in the session (and how many were reported)
+    agent_runs: List[AgentRunMetrics] = []
+    agent_runs_reported: int = 0
+    # Check outcomes of the session (step_index): ESLint runs and errors
+    # (all runs and last run), build runs and last result, last test totals
+    eslint_runs: int = 0
+    eslint_errors: int = 0
+    eslint_errors_last: int | None = None
+    build_runs: int = 0
+    build_passed: bool | None = None
+    tests_total: int | None = None
+    tests_ok: int | None = None
+    tests_ng: int | None = None
 
 
 class ESLintInfo(BaseModel):
@@ -156,26 +292,61 @@ class SystemError(BaseModel):
 class StartedPayload(BaseModel):
     status: StartedStatus
     message: str
-    step_id: str
+    step_id: str | None = None  # None: the session failed before its context
 
 
 class DonePayload(BaseModel):
     status: DoneStatus
     message: str
+    metrics: MetricsTotals | None = None  # session totals
 
 
 class AgentUpdatePayload(BaseModel):
     agent_name: str
 
 
+class LLMQueuePayload(BaseModel):
+    agent_name: str
+    priority: SessionPriority
+    reason: LLMWaitReason
+    wait_sec: float
+    attempt: int  # 0: first request
+    detail: str = ""
+
+
+class SearchReplace(BaseModel):
+    search: str
+    replace: str
+
+
 class AgentResult(BaseModel):
     result: bool
     error_detail: str | None = None
 
 
+class PlaceMethod(StrEnum):
+    REFLINK = "reflink"
+    HARDLINK = "hardlink"
+    COPY = "copy"
+
+
+class PlacedFile(BaseModel):
+    file: str
+    method: PlaceMethod
+    duration_ms: float
+
+
 class AgentResultPayload(BaseModel):
     result: bool
     error_detail: str | None = None
+    files: list[PlacedFile] | None = None  # PlaceFiles (direct)
+    duration_ms: float | None = None
+
+
+class PlaceFilesHeader(BaseModel):
+    from_dir: str
+    to_dir: str
+    files: list[str]  # file names or glob patterns
 
 
 class PlaywrightSpecs(BaseModel):
@@ -213,6 +384,13 @@ class RunTestsResultPayload(BaseModel):
     specs: List[PlaywrightSpecs] | None = None
 
 
+class RunTestsHeader(BaseModel):
+    test_dir: str
+    test_file: str
+    project: str
+    screenshot_files: list[str]
+
+
 class RunPlaywrightFunctionResult(BaseModel):
     result: bool
     abort_flg: bool = False
@@ -220,6 +398,16 @@ class RunPlaywrightFunctionResult(BaseModel):
     screenshot_updated: bool = False
 
 
+class TestRunPayload(BaseModel):
+    status: TestRunStatus
+    title: str | None = None
+    project: str | None = None
+    file: str | None = None
+    duration: float | None = None  # msec
+    total: int | None = None
+    detail: str | None = None
+
+
 class TestScreenshotPayload(BaseModel):
     spec: str
     filename: str
@@ -257,6 +445,137 @@ class StepResult(BaseModel):
     final_payload: DonePayload | None = None
 
 
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+    stores: int
+    evictions: int
+    expirations: int
+    entries: int
+    size_bytes: int
+    max_bytes: int
+
+
+class ArchiveStats(BaseModel):
+    files: int  # archive() calls
+    unchanged: int  # same content as the current version
+    dedup_hits: int  # content already stored
+    blobs_stored: int
+    bytes_stored: int
+    bytes_deduplicated: int
+
+
+class ArchiveQueueStats(BaseModel):
+    workers: int
+    depth: int  # queued or running jobs
+    max_depth: int
+    submitted: int
+    coalesced: int
+    completed: int
+    errors: int
+    sync_fallbacks: int  # queue full, archived by the caller
+    lag_avg_sec: float  # submit -> written
+    lag_max_sec: float
+    lag_last_sec: float
+
+
+class ArchiveCompactorStats(BaseModel):
+    runs: int
+    compacted: int  # steps packed into bundles
+    files_packed: int
+    bundle_bytes_written: int
+    blobs_removed: int
+    bundles_expired: int  # removed by retention
+    errors: int
+    last_run_sec: float
+    bundles: int
+    bundle_bytes: int
+
+
+class StepIndexEntry(BaseModel):
+    step_id: str
+    category: str | None = None
+    prompt_hash: str | None = None  # sha256 of the prompt
+    priority: str | None = None
+    status: str | None = None  # DONE status, None: no DONE sent
+    message: str | None = None
+    started_at: str | None = None
+    ended_at: str | None = None
+    duration_sec: float | None = None
+    attempts: int = 0  # code generation runs
+    eslint_runs: int = 0
+    eslint_errors: int = 0
+    eslint_errors_last: int | None = None
+    build_runs: int = 0
+    build_passed: bool | None = None
+    tests_total: int | None = None
+    tests_ok: int | None = None
+    tests_ng: int | None = None
+    agent_runs: int = 0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    total_tokens: int = 0
+    llm_sec: float = 0.0
+    tool_sec: float = 0.0
+    archived_files: int = 0  # archive() calls that stored a new version
+    archived_bytes: int = 0
+    updated_at: str | None = None
+
+
+class StepIndexArtifact(BaseModel):
+    path: str
+    version: int
+    hash: str
+    size: int
+    time: str
+
+
+class StepIndexDetail(StepIndexEntry):
+    artifacts: List[StepIndexArtifact] = []
+
+
+class StepIndexPage(BaseModel):
+    total: int  # matching steps
+    limit: int
+    offset: int
+    items: List[StepIndexEntry]
+
+
+class WorkspacePoolStats(BaseModel):
+    pool_size: int
+    available: int
+    in_use: int
+    acquire_count: int
+    wait_avg_sec: float
+    wait_max_sec: float
+    wait_last_sec: float
+    reset_count: int
+    reset_avg_sec: float
+    reset_max_sec: float
+    reset_last_sec: float
+    reset_errors: int  # reset failed, recreated
+    prepare_errors: int  # reset and recreate failed, retried
+    acquire_timeouts: int  # pool empty, created on demand
+    acquire_errors: int
+    sync_back_errors: int
+
+
+class LLMSchedulerStats(BaseModel):
+    requests: int
+    waiting: int
+    wait_avg_sec: float
+    wait_max_sec: float
+    retries: int
+    rate_limited: int
+    failures: int
+    tokens: int
+    rpm_limit: int
+    tpm_limit: int
+
+
 class BuildErrorAnalyzerResult(BaseModel):
     summary: str
     root_cause: str
@@ -0,0 +1,67 @@
+"""
+Build result cache
+
+The key is a Merkle-style hash of the build inputs in the workspace
+(app/, public/, components/, lib/ and the config files). The entry holds
+the FunctionResult of run_build, build.log and the build report JSON.
+"""
+
+import hashlib
+from pathlib import Path
+
+from common import sha256_file
+from config import get_settings
+from result_cache import DiskCache
+
+BUILD_CACHE_DIR = "build"
+BUILD_RESULT_FILE = "result.json"
+BUILD_INPUT_DIRS = ["app", "public", "components", "lib"]
+BUILD_INPUT_FILES = [
+    "package.json",
+    "package-lock.json",
+    "next.config.ts",
+    "next.config.mjs",
+    "next.config.js",
+    "tsconfig.json",
+    "postcss.config.mjs",
+    "components.json",
+    "build.mjs",
+    "build.customconfig.json",
+]
+
+_build_cache: DiskCache | None = None
+
+
+def get_build_cache() -> DiskCache:
+    global _build_cache
+    if _build_cache is None:
+        settings = get_settings()
+        _build_cache = DiskCache(
+            name="build",
+            cache_dir=settings.cache_dir / BUILD_CACHE_DIR,
+            max_bytes=settings.build_cache_max_bytes,
+        )
+    return _build_cache
+
+
+def _tree_hash(path: Path) -> str:
+    """
+    Hash of a file (contents) or a directory (names and hashes of children).
+    """
+    if path.is_file():
+        return sha256_file(path)
+    h = hashlib.sha256()
+    for child in sorted(path.iterdir(), key=lambda p: p.name):
+        kind = "d" if child.is_dir() else "f"
+        h.update(f"{kind}:{child.name}:{_tree_hash(child)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_tree_hash(output_dir: Path) -> str:
+    h = hashlib.sha256()
+    for name in BUILD_INPUT_DIRS + BUILD_INPUT_FILES:
+        path = output_dir / name
+        if not path.exists():
+            continue
+        h.update(f"{name}:{_tree_hash(path)}\n".encode("utf-8"))
+    return h.hexdigest()
@@ -1,7 +1,9 @@
-from agents import Runner
+import asyncio
+
 from agents.exceptions import AgentsException, ModelBehaviorError
 
 from agent_logger import AgentLogger
+from agent_runner import AgentRun
 from base import (
     BuildErrorAnalyzerResult,
     EventType,
@@ -9,6 +11,8 @@ from base import (
     LocalContext,
     StreamResponse,
 )
+from build_error_fingerprint import lookup_analyzer_result, store_analyzer_result
+from config import get_settings
 from custom_agents import get_build_error_analyzer_agent
 from logger import logger
 from prompt_parser import load_agents_prompt, require_str
@@ -21,6 +25,21 @@ async def analyze_build_error(context: LocalContext, build_result: FunctionResul
     builderror_detail = build_result.detail
     if builderror_detail is None:
         raise ValueError("build_result.detail must not be None")
+
+    # Known build error (fingerprint hit): skip AnalyzerAgent
+    use_cache = get_settings().build_error_cache
+    if use_cache:
+        cached = await asyncio.to_thread(
+            lookup_analyzer_result, builderror_detail, context.output_dir
+        )
+        if cached is not None:
+            logger.info("Build error fingerprint hit: skip AnalyzerAgent")
+            logger.trace(f"cached: {cached}")
+            yield StreamResponse(
+                event=EventType.ANALYZER_RESULT, payload=cached.model_dump()
+            ).to_json_line()
+            return
+
     agents_prompt = load_agents_prompt()
     build_error_analyzer_template_prompt = require_str(
         data=agents_prompt, key="prompt_build_error_analyzer"
@@ -31,11 +50,10 @@ async def analyze_build_error(context: LocalContext, build_result: FunctionResul
     logger.debug(f"filled_prompt: {filled_prompt}")
     try:
         build_error_ayalyzer_agent = get_build_error_analyzer_agent()
-        result = Runner.run_streamed(
-            starting_agent=build_error_ayalyzer_agent,
+        result = AgentRun(
+            agent=build_error_ayalyzer_agent,
             input=filled_prompt,
             context=context,
-            max_turns=context.max_turns,
             hooks=AgentLogger(),
         )
         async for event in result.stream_events():
@@ -47,6 +65,10 @@ async def analyze_build_error(context: LocalContext, build_result: FunctionResul
                 yield StreamResponse(
                     event=EventType.AGENT_UPDATE, payload={"agent_name": agent_name}
                 ).to_json_line()
+            elif event.type == "llm_queue_event":
+                yield StreamResponse(
+                    event=EventType.LLM_QUEUE, payload=event.payload.model_dump()
+                ).to_json_line()
             elif event.type == "run_item_stream_event":
                 if event.item.type == "tool_call_item":
                     logger.debug("Event: tool_call_item")
@@ -59,6 +81,10 @@ async def analyze_build_error(context: LocalContext, build_result: FunctionResul
 
         final: BuildErrorAnalyzerResult = result.final_output
         logger.trace(f"final: {final}")
+        if use_cache:
+            await asyncio.to_thread(
+                store_analyzer_result, builderror_detail, final, context.output_dir
+            )
         yield StreamResponse(
             event=EventType.ANALYZER_RESULT, payload=final.model_dump()
         ).to_json_line()
@@ -0,0 +1,128 @@
+"""
+Build error fingerprint cache
+
+The build stderr messages are normalized (project root, line/column
+numbers and unquoted numbers removed) and hashed into a fingerprint.
+Quoted identifiers (module specifiers, property and type names) and
+relative paths are kept, since the cached summary and fix policy name
+them. AnalyzerAgent results with confidence probable/likely are stored by
+fingerprint, so that a recurring build error is analyzed without calling
+the model. files_to_fix is always recomputed from the current log.
+"""
+
+import hashlib
+import re
+from pathlib import Path
+
+from base import BuildErrorAnalyzerResult, Confidence
+from config import get_settings
+from result_cache import DiskCache
+
+BUILD_ERROR_CACHE_DIR = "build_error"
+ANALYZER_RESULT_FILE = "analyzer_result.json"
+FINGERPRINT_VERSION = "2"  # 2: identifiers kept
+ROOT_PLACEHOLDER = "<root>"
+CACHEABLE_CONFIDENCE = {Confidence.PROBABLE, Confidence.LIKELY}
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# <path>:<line>:<column> location line (e.g. ./app/components/Sample.tsx:2:8)
+LOCATION_LINE_RE = re.compile(r"^\s*(\S+?):(\d+):(\d+)\s*$")
+# Code frame lines (e.g. "> 12 |     <Card />", "     |     ^")
+CODE_FRAME_RE = re.compile(r"^\s*>?\s*\d*\s*\|")
+LINE_COL_RE = re.compile(r":\d+(?::\d+)?")
+# A quote does not start inside a word (e.g. "Can't")
+QUOTED_RE = re.compile(r"(?<!\w)(?:'[^'\n]*'|\"[^\"\n]*\"|`[^`\n]*`)")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+SPACES_RE = re.compile(r"\s+")
+
+_build_error_cache: DiskCache | None = None
+
+
+def get_build_error_cache() -> DiskCache:
+    global _build_error_cache
+    if _build_error_cache is None:
+        settings = get_settings()
+        _build_error_cache = DiskCache(
+            name="build_error",
+            cache_dir=settings.cache_dir / BUILD_ERROR_CACHE_DIR,
+            max_bytes=settings.build_error_cache_max_bytes,
+            ttl_sec=settings.build_error_cache_ttl_sec,
+        )
+    return _build_error_cache
+
+
+def _normalize_unquoted(text: str) -> str:
+    text = LINE_COL_RE.sub(":<n>", text)
+    return NUMBER_RE.sub("<n>", text)
+
+
+def normalize_build_error(log: str, root: Path | None = None) -> list[str]:
+    """
+    Returns the sorted set of normalized, non-empty lines of the build log
+    (code frame lines are skipped). root (the project directory, differs
+    between workspaces) is replaced by ROOT_PLACEHOLDER.
+    """
+    log = ANSI_RE.sub("", log)
+    if root is not None:
+        log = log.replace(str(root.resolve()), ROOT_PLACEHOLDER)
+    lines: set[str] = set()
+    for line in log.splitlines():
+        if CODE_FRAME_RE.match(line):
+            continue
+        parts, pos = [], 0
+        for m in QUOTED_RE.finditer(line):
+            parts.append(_normalize_unquoted(line[pos : m.start()]))
+            parts.append(m.group(0))
+            pos = m.end()
+        parts.append(_normalize_unquoted(line[pos:]))
+        line = SPACES_RE.sub(" ", "".join(parts)).strip()
+        if line:
+            lines.add(line)
+    return sorted(lines)
+
+
+def build_error_fingerprint(log: str, root: Path | None = None) -> str:
+    normalized = "\n".join(normalize_build_error(log, root))
+    h = hashlib.sha256(FINGERPRINT_VERSION.encode("utf-8"))
+    h.update(normalized.encode("utf-8"))
+    return h.hexdigest()
+
+
+def extract_files_to_fix(log: str) -> list[str]:
+    """
+    <path> of every "<path>:<line>:<column>" location line, deduplicated
+    in first-seen order (same rule as prompt_build_error_analyzer).
+    """
+    files: list[str] = []
+    for line in ANSI_RE.sub("", log).splitlines():
+        m = LOCATION_LINE_RE.match(line)
+        if m and m.group(1) not in files:
+            files.append(m.group(1))
+    return files
+
+
+def lookup_analyzer_result(
+    log: str, root: Path | None = None
+) -> BuildErrorAnalyzerResult | None:
+    entry = get_build_error_cache().get(build_error_fingerprint(log, root))
+    if entry is None:
+        return None
+    cached = BuildErrorAnalyzerResult.model_validate_json(
+        (entry / ANALYZER_RESULT_FILE).read_text(encoding="utf-8")
+    )
+    return cached.model_copy(update={"files_to_fix": extract_files_to_fix(log)})
+
+
+def store_analyzer_result(
+    log: str, result: BuildErrorAnalyzerResult, root: Path | None = None
+) -> bool:
+    """
+    Stores result if its confidence is probable/likely.
+    """
+    if result.confidence not in CACHEABLE_CONFIDENCE:
+        return False
+    get_build_error_cache().put(
+        build_error_fingerprint(log, root),
+        {ANALYZER_RESULT_FILE: result.model_dump_json().encode("utf-8")},
+    )
+    return True
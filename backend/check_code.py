@@ -1,6 +1,8 @@
-from agents import ItemHelpers, Runner
+from agents import ItemHelpers, RunContextWrapper
 
+from agent_runner import AgentRun
 from base import (
+    CodeCheckMode,
     CodeCheckResult,
     EventType,
     IsCodeCheckError,
@@ -8,19 +10,86 @@ from base import (
     PromptRequest,
     StreamResponse,
 )
+from config import get_settings
 from custom_agents import get_code_check_agent
+from eslint_checker import run_eslint
 from logger import logger
 
 
+def check_result_lines(output: CodeCheckResult, context: LocalContext):
+    """
+    CHECK_RESULT events for a check_code result.
+    Updates context.is_code_check_error and context.add_prompts.
+    """
+    item_result = output.result
+    logger.debug(f"result: {item_result}")
+    if not item_result:
+        raise Exception(f"code check failed: {output.error_detail}")
+
+    eslint_result = output.eslint_result
+    logger.debug(f"eslint_result: {eslint_result}")
+    if eslint_result:
+        context.is_code_check_error = IsCodeCheckError.NO_ERROR
+        response = StreamResponse(
+            event=EventType.CHECK_RESULT,
+            payload={
+                "checker": "ESLint",
+                "result": eslint_result,
+                "rule_id": "",
+                "detail": "",
+            },
+        )
+        yield response.to_json_line()
+    else:
+        context.is_code_check_error = IsCodeCheckError.ESLINT_ERROR
+        eslint_infos = output.eslint_info or []
+        for eslint_info in eslint_infos:
+            desc = (eslint_info.description or "").strip()
+            if desc and desc not in context.add_prompts:
+                context.add_prompts.append(desc)
+            response = StreamResponse(
+                event=EventType.CHECK_RESULT,
+                payload={
+                    "checker": "ESLint",
+                    "result": eslint_result,
+                    "rule_id": eslint_info.rule_id,
+                    "detail": eslint_info.message,
+                },
+            )
+            yield response.to_json_line()
+
+
 async def check_gen_code(request: PromptRequest, context: LocalContext):
     logger.debug("check_gen_code called")
+    if get_settings().code_check_mode == CodeCheckMode.DIRECT:
+        generator = check_gen_code_direct(request, context)
+    else:
+        generator = check_gen_code_agent(request, context)
+    async for line in generator:
+        yield line
+
+
+async def check_gen_code_direct(request: PromptRequest, context: LocalContext):
+    """
+    Run ESLint directly (without CodeCheckAgent).
+    """
+    logger.debug("check_gen_code_direct called")
+    output = await run_eslint(
+        ctx=RunContextWrapper(context=context), filename=context.gen_code_filepath
+    )
+    logger.debug(f"check_code output: {output}")
+    for line in check_result_lines(output, context):
+        yield line
+
+
+async def check_gen_code_agent(request: PromptRequest, context: LocalContext):
+    logger.debug("check_gen_code_agent called")
     file_path = context.gen_code_filepath
     code_check_agent = get_code_check_agent()
-    result = Runner.run_streamed(
-        starting_agent=code_check_agent,
+    result = AgentRun(
+        agent=code_check_agent,
         input=file_path,
         context=context,
-        max_turns=context.max_turns,
     )
 
     async for event in result.stream_events():
@@ -30,6 +99,10 @@ async def check_gen_code(request: PromptRequest, context: LocalContext):
             yield StreamResponse(
                 event=EventType.AGENT_UPDATE, payload={"agent_name": agent_name}
             ).to_json_line()
+        elif event.type == "llm_queue_event":
+            yield StreamResponse(
+                event=EventType.LLM_QUEUE, payload=event.payload.model_dump()
+            ).to_json_line()
         elif event.type == "run_item_stream_event":
             if event.item.type == "tool_call_item":
                 logger.debug("Event: tool_call_item")
@@ -38,42 +111,8 @@ async def check_gen_code(request: PromptRequest, context: LocalContext):
 
                 output = event.item.output
                 if isinstance(output, CodeCheckResult):
-                    item_result = output.result
-                    logger.debug(f"result: {item_result}")
-                    if not item_result:
-                        raise Exception(f"code check failed: {output.error_detail}")
-
-                    eslint_result = output.eslint_result
-                    logger.debug(f"eslint_result: {eslint_result}")
-                    if eslint_result:
-                        context.is_code_check_error = IsCodeCheckError.NO_ERROR
-                        response = StreamResponse(
-                            event=EventType.CHECK_RESULT,
-                            payload={
-                                "checker": "ESLint",
-                                "result": eslint_result,
-                                "rule_id": "",
-                                "detail": "",
-                            },
-                        )
-                        yield response.to_json_line()
-                    else:
-                        context.is_code_check_error = IsCodeCheckError.ESLINT_ERROR
-                        eslint_infos = output.eslint_info or []
-                        for eslint_info in eslint_infos:
-                            desc = (eslint_info.description or "").strip()
-                            if desc and desc not in context.add_prompts:
-                                context.add_prompts.append(desc)
-                            response = StreamResponse(
-                                event=EventType.CHECK_RESULT,
-                                payload={
-                                    "checker": "ESLint",
-                                    "result": eslint_result,
-                                    "rule_id": eslint_info.rule_id,
-                                    "detail": eslint_info.message,
-                                },
-                            )
-                            yield response.to_json_line()
+                    for line in check_result_lines(output, context):
+                        yield line
                 else:
                     logger.warning(f"Unexpected output type: {type(output)}")
 
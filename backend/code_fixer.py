@@ -1,9 +1,9 @@
 import json
 
-from agents import Runner
 from agents.exceptions import AgentsException, ModelBehaviorError
 
 from agent_logger import AgentLogger
+from agent_runner import AgentRun
 from base import (
     AgentResult,
     BuildErrorAnalyzerResult,
@@ -33,11 +33,10 @@ async def fix_code(context: LocalContext, analyzer_result: BuildErrorAnalyzerRes
         )
         logger.debug(f"filled_prompt: {filled_prompt}")
         fixer_agent = get_build_error_fixer_agent()
-        result = Runner.run_streamed(
-            starting_agent=fixer_agent,
+        result = AgentRun(
+            agent=fixer_agent,
             input=filled_prompt,
             context=context,
-            max_turns=context.max_turns,
             hooks=AgentLogger(),
         )
         async for event in result.stream_events():
@@ -49,6 +48,10 @@ async def fix_code(context: LocalContext, analyzer_result: BuildErrorAnalyzerRes
                 yield StreamResponse(
                     event=EventType.AGENT_UPDATE, payload={"agent_name": agent_name}
                 ).to_json_line()
+            elif event.type == "llm_queue_event":
+                yield StreamResponse(
+                    event=EventType.LLM_QUEUE, payload=event.payload.model_dump()
+                ).to_json_line()
             elif event.type == "run_item_stream_event":
                 if event.item.type == "tool_call_item":
                     logger.debug("Event: tool_call_item")
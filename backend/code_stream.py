@@ -0,0 +1,197 @@
+"""
+Token-level code streaming
+
+The code generation agent produces its code as JSON, either as the final
+output ({"code": "..."}) or as the arguments of the save_code handoff
+({"code": "...", "directory": "...", "filename": "..."}). Both arrive as
+deltas of raw JSON text. CodeFieldExtractor decodes the "code" string
+value incrementally, and DeltaBatcher groups the decoded text into
+CODE_DELTA events (flushed every N seconds or N bytes).
+
+The CODE event sent after the agent finishes stays authoritative; the
+deltas are only a preview.
+"""
+
+import asyncio
+import re
+import time
+from typing import AsyncIterator, Callable, TypeVar
+
+T = TypeVar("T")
+
+CODE_FIELD_RE = re.compile(r'"code"\s*:\s*"')
+
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class CodeFieldExtractor:
+    """
+    Incrementally extracts the "code" string value from streamed JSON text.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_value = False
+        self._done = False
+        self.length = 0  # number of decoded characters so far
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add raw JSON text and return newly decoded code text.
+        """
+        if self._done:
+            return ""
+        self._buffer += chunk
+        if not self._in_value:
+            m = CODE_FIELD_RE.search(self._buffer)
+            if not m:
+                return ""
+            self._buffer = self._buffer[m.end() :]
+            self._in_value = True
+        decoded = self._decode()
+        self.length += len(decoded)
+        return decoded
+
+    def _decode(self) -> str:
+        out: list[str] = []
+        buf = self._buffer
+        i = 0
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Escape sequence (wait for the rest if incomplete)
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc != "u":
+                out.append(_ESCAPES.get(esc, esc))
+                i += 2
+                continue
+            if i + 6 > len(buf):
+                break
+            code_point = int(buf[i + 2 : i + 6], 16)
+            if 0xD800 <= code_point < 0xDC00:
+                # High surrogate: needs the following low surrogate
+                if i + 12 > len(buf):
+                    break
+                if buf[i + 6 : i + 8] == "\\u":
+                    low = int(buf[i + 8 : i + 12], 16)
+                    if 0xDC00 <= low < 0xE000:
+                        code_point = (
+                            0x10000 + ((code_point - 0xD800) << 10) + (low - 0xDC00)
+                        )
+                        out.append(chr(code_point))
+                        i += 12
+                        continue
+                out.append("\ufffd")
+                i += 6
+                continue
+            if 0xDC00 <= code_point < 0xE000:
+                out.append("\ufffd")
+            else:
+                out.append(chr(code_point))
+            i += 6
+        self._buffer = buf[i:]
+        return "".join(out)
+
+
+class DeltaBatcher:
+    """
+    Groups small deltas; add() returns the pending text once flush_interval
+    seconds have passed since the last flush, flush_bytes are pending or
+    force is set. wait_time() is the time left until pending text is due
+    (for a flush when no delta arrives, see with_ticks()).
+    """
+
+    def __init__(self, flush_interval: float, flush_bytes: int):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._pending: list[str] = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, text: str, force: bool = False) -> str | None:
+        if text:
+            self._pending.append(text)
+            self._pending_bytes += len(text.encode("utf-8"))
+        if not self._pending:
+            return None
+        elapsed = time.monotonic() - self._last_flush
+        if (
+            force
+            or self._pending_bytes >= self.flush_bytes
+            or elapsed >= self.flush_interval
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> str | None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return None
+        text = "".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        return text
+
+    def wait_time(self) -> float | None:
+        """
+        Seconds until the pending text is due, None if nothing is pending.
+        """
+        if not self._pending:
+            return None
+        elapsed = time.monotonic() - self._last_flush
+        return max(0.0, self.flush_interval - elapsed)
+
+
+async def with_ticks(
+    events: AsyncIterator[T], timeout: Callable[[], float | None]
+) -> AsyncIterator[T | None]:
+    """
+    Yields the items of events, and None whenever timeout() seconds pass
+    without one (timeout() None: wait for the next item). The pending
+    __anext__ is kept across ticks, so events is never cancelled mid-item.
+    """
+
+    async def next_item() -> T:
+        return await anext(events)
+
+    pending: asyncio.Task[T] | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(next_item())
+            done, _ = await asyncio.wait({pending}, timeout=timeout())
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                item = task.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
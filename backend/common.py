@@ -1,5 +1,8 @@
+import errno
+import hashlib
+import os
 import shutil
-from datetime import datetime
+import socket
 from pathlib import Path
 
 from logger import logger
@@ -26,9 +29,96 @@ def resolve_path(dir_name: Path) -> Path:
     return abs_path
 
 
+def sha256_file(path: Path) -> str:
+    """
+    Returns the SHA-256 hex digest of the file contents.
+    """
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ioctl request code for reflink (copy-on-write) copies on Linux
+FICLONE = 0x40049409
+# errno of FICLONE when the filesystem (or platform) cannot reflink
+REFLINK_UNSUPPORTED_ERRNOS = {
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.ENOSYS,
+}
+_reflink_supported = True
+
+
+def reflink_file(src: str, dst: str) -> bool:
+    """
+    Copies src to dst as a reflink (copy-on-write).
+    Returns False when the filesystem does not support it (reflinks are
+    then disabled for the process). Other errors (missing source, ENOSPC
+    ...) are raised.
+    """
+    global _reflink_supported
+    if not _reflink_supported:
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        _reflink_supported = False
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError as e:
+        if e.errno not in REFLINK_UNSUPPORTED_ERRNOS:
+            raise
+        logger.debug(f"reflink not available, fallback to copy: {e}")
+        _reflink_supported = False
+        return False
+
+
+def clone_file(src: str, dst: str) -> str:
+    """
+    Copies src to dst as a reflink (copy-on-write) when the filesystem
+    supports it, otherwise falls back to shutil.copy2.
+    Usable as copy_function of shutil.copytree.
+    """
+    if reflink_file(src, dst):
+        return dst
+    return shutil.copy2(src, dst)
+
+
+def link_file(src: str, dst: str) -> str:
+    """
+    Creates a hardlink dst -> src, falls back to clone_file (e.g. across
+    filesystems). Usable as copy_function of shutil.copytree.
+    """
+    try:
+        os.link(src, dst)
+        return dst
+    except OSError:
+        return clone_file(src, dst)
+
+
+def find_free_port() -> int:
+    """
+    A TCP port free on localhost (chosen by the OS).
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
 def archive(src_dir: Path, src_file: str, stepid_dir: Path, dir: Path):
     """
     archive: back up the generated source files, test report files, etc.
+    Files are stored once per content (archive_store), the step directory
+    holds a manifest and hardlinked views. With settings.archive_async the
+    file is archived in the background (archive_writer).
 
     Args:
         src_dir: directory of source file
@@ -36,37 +126,19 @@ def archive(src_dir: Path, src_file: str, stepid_dir: Path, dir: Path):
         stepid_dir: stepid directory (contained in the local context)
         dir: relative directory from stepid_dir
     """
+    from archive_store import get_archive_store
+    from archive_writer import get_archive_writer
+    from config import get_settings
+
     logger.debug("archive called")
     src_path = src_dir / src_file
     logger.debug(f"src_path : {src_path}")
-
-    backup_dir = stepid_dir / dir
-    logger.debug(f"backup_dir : {backup_dir}")
-    backup_dir.mkdir(parents=True, exist_ok=True)
-    backup_path = backup_dir / src_file
-    logger.debug(f"backup_path : {backup_path}")
-
-    if backup_path.exists():
-        try:
-            mtime = backup_path.stat().st_mtime
-            dt = datetime.fromtimestamp(mtime)
-            timestamp = dt.strftime("%Y%m%d_%H%M%S")
-
-            stem = backup_path.stem
-            suffix = backup_path.suffix
-            archived_name = f"{stem}_{timestamp}{suffix}"
-            archived_path = backup_dir / archived_name
-
-            # Rename
-            backup_path.rename(archived_path)
-            logger.debug(f"Archived old backup: {backup_path} -> {archived_path}")
-
-        except Exception as e:
-            logger.error(f"Failed to archive existing file: {backup_path}, {e}")
-            raise e
+    rel_path = Path(dir) / src_file
     try:
-        shutil.copy2(str(src_path), str(backup_path))
-        logger.debug(f"backup: {src_path} -> {backup_path}")
+        if get_settings().archive_async:
+            get_archive_writer().submit(src_path, stepid_dir, rel_path)
+        else:
+            get_archive_store().put(src_path, stepid_dir, rel_path)
     except Exception as e:
-        logger.error(f"Failed to backup file: {backup_path}, {e}")
+        logger.error(f"Failed to backup file: {src_path}, {e}")
         raise e
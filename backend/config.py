@@ -7,29 +7,118 @@ from pydantic_settings import (
     SettingsConfigDict,
 )
 
+from base import AgentConfig, CodeCheckMode, ModelProviderType
+
 
 class Settings(BaseSettings):
     openai_api_key: str
     openai_model: str = "gpt-4o-mini"
     openai_max_turns: int = 6
+    openai_temperature: float | None = None
+    agent_timeout_sec: float = 0  # 0: no timeout
+    # per agent name, e.g. AGENT_CONFIGS='{"AnalyzerAgent": {"model": "gpt-4o-mini"}}'
+    agent_configs: dict[str, AgentConfig] = {}
+    model_provider: ModelProviderType = ModelProviderType.OPENAI
+    stub_dir: Path = Path("stub")  # <AgentName>.json scripts (see stub_model)
+    stub_latency_sec: float = 0.2
+    stub_tokens_per_sec: float = 0  # 0: whole output at once
+    agent_record: bool = False  # <stepid_dir>/agent_recording.jsonl
+    replay_path: Path | None = None  # recording file or StepID archive dir
+    llm_rpm: int = 0  # requests per minute, 0: unlimited
+    llm_tpm: int = 0  # tokens per minute, 0: unlimited
+    llm_max_retries: int = 3
+    llm_backoff_base_sec: float = 1.0
+    llm_backoff_max_sec: float = 30.0
     log_dir: str = "log"
     output_dir: Path = Path("output")
     test_results_dir: Path = Path("results")
     playwright_customconfig_file: str = "playwright.customconfig.json"
     debug: bool = False
     code_gen_retry: int = 3
+    rebuild_max_rounds: int = 3
+    code_gen_speculative: int = 1  # K concurrent CodeGenAgent runs (1: serial)
+    code_gen_token_budget: int = 0  # per session, 0: unlimited
     log_filename: str = "yoriai.log"
     log_level: str = "AGENT"
     archive_dir: Path = Path("archive")
+    archive_async: bool = True
+    archive_workers: int = 2
+    archive_queue_max: int = 256  # pending jobs, 0: unbounded
+    archive_flush_timeout_sec: float = 30.0  # 0: no timeout
+    archive_compact_interval_sec: float = 0  # 0: no compaction (opt-in)
+    archive_compact_after_sec: float = 600.0  # unchanged for, before packing
+    archive_retention_days: float = 0  # bundles, 0: no limit
+    archive_retention_max_steps: int = 0
+    archive_retention_max_bytes: int = 0
+    step_index: bool = True  # SQLite step history index
+    step_index_path: Path | None = None  # None: <archive_dir>/steps.db
     build_customconfig_file: str = "build.customconfig.json"
     agents_prompt_file: str = "agents.yml"
     prompts_dir: Path = Path("prompts")
+    eslint_daemon: bool = True
+    eslint_daemon_workers: int = 2
+    eslint_daemon_timeout: float = 60.0
+    cache_dir: Path = Path("cache")
+    eslint_cache: bool = True
+    eslint_cache_max_bytes: int = 64 * 1024 * 1024
+    build_cache: bool = True
+    build_cache_max_bytes: int = 256 * 1024 * 1024
+    build_error_cache: bool = True
+    build_error_cache_max_bytes: int = 16 * 1024 * 1024
+    build_error_cache_ttl_sec: float = 7 * 24 * 60 * 60
+    workspace_isolation: bool = False
+    workspaces_dir: Path = Path("workspaces")
+    workspace_sync_back: bool = True
+    workspace_pool_size: int = 0  # 0: create workspaces on demand
+    workspace_acquire_timeout_sec: float = 30.0  # pool wait, then on demand
+    code_stream: bool = True
+    code_stream_flush_interval: float = 0.05  # sec
+    code_stream_flush_bytes: int = 512
+    code_check_mode: CodeCheckMode = CodeCheckMode.AGENT
+    place_files_hardlink: bool = False  # shares the inode with the source
+    place_files_copy_workers: int = 8
+    source_patch_fuzzy_threshold: float = 0.85
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(__file__), ".env")
     )
 
+    def agent_config(self, agent_name: str) -> AgentConfig:
+        """
+        Settings of agent_name with the defaults filled in
+        (max_turns stays None unless overridden: LocalContext.max_turns).
+        """
+        override = self.agent_configs.get(agent_name, AgentConfig())
+        return AgentConfig(
+            model=override.model or self.openai_model,
+            temperature=(
+                override.temperature
+                if override.temperature is not None
+                else self.openai_temperature
+            ),
+            max_turns=override.max_turns,
+            timeout_sec=(
+                override.timeout_sec
+                if override.timeout_sec is not None
+                else self.agent_timeout_sec
+            ),
+        )
+
 
 @lru_cache
 def get_settings():
     return Settings()
+
+
+def reload_settings() -> Settings:
+    """
+    Re-read the settings (.env / environment), see POST
+    /admin/reload-settings. Sessions started afterwards use the new values
+    and agents are rebuilt on their next get_*_agent() call if their
+    agent_config changed. Process-wide services created at startup or on
+    first use (logger, ESLint and workspace pools, caches, LLM scheduler,
+    archive writer) keep their settings until restart.
+    """
+    Settings()  # raises on invalid values, the current settings are kept
+    get_settings.cache_clear()
+    return get_settings()
@@ -1,20 +1,64 @@
 import json
 from datetime import datetime
+from pathlib import Path
 
-from base import FunctionResult, IsCodeCheckError, LocalContext, LoopAction
+from archive_compactor import bundle_path, mark_step_active, mark_step_finished
+from base import (
+    FunctionResult,
+    IsCodeCheckError,
+    LocalContext,
+    LoopAction,
+    SessionPriority,
+)
 from common import resolve_path
 from config import Settings
 from logger import logger
+from workspace import get_workspace_manager
 
+MAX_STEPID_SUFFIX = 1000
 
-def create_local_context(
+
+def _create_stepid_dir(abs_archive_dir: Path) -> tuple[str, Path]:
+    """
+    Create a unique StepID directory.
+    (sessions started in the same second get a numbered suffix)
+    """
+    now = datetime.now()
+    formatted_time = now.strftime("%Y%m%d-%H%M%S")
+    base_step_id = f"StepID-{formatted_time}"
+    step_id = base_step_id
+    for i in range(2, MAX_STEPID_SUFFIX):
+        stepid_dir = abs_archive_dir / step_id
+        if bundle_path(abs_archive_dir, step_id).exists():
+            step_id = f"{base_step_id}-{i}"
+            continue
+        try:
+            stepid_dir.mkdir(exist_ok=False)
+            return step_id, stepid_dir
+        except FileExistsError:
+            step_id = f"{base_step_id}-{i}"
+    raise FileExistsError(f"Failed to create StepID directory: {base_step_id}")
+
+
+async def create_local_context(
     category: str,
     build_check: bool,
     settings: Settings,
+    priority: SessionPriority = SessionPriority.INTERACTIVE,
 ) -> LocalContext:
     """
     Load config files, prepare directories, and create LocalContext.
     """
+    # stepid_dir
+    archive_dir = settings.archive_dir
+    logger.debug(f"archive_dir: {archive_dir}")
+    archive_dir.mkdir(exist_ok=True)
+    abs_archive_dir = resolve_path(archive_dir)
+    logger.debug(f"abs_archive_dir: {abs_archive_dir}")
+    step_id, stepid_dir = _create_stepid_dir(abs_archive_dir)
+    logger.debug(f"step_id: {step_id}")
+    logger.debug(f"stepid_dir: {stepid_dir}")
+
     # output_dir
     output_dir = resolve_path(settings.output_dir)
 
@@ -40,21 +84,12 @@ def create_local_context(
     screenshot_dir = custom_config["screenshot_dir"]
     logger.debug(f"screenshot_dir: {screenshot_dir}")
 
-    now = datetime.now()
-    formatted_time = now.strftime("%Y%m%d-%H%M%S")
-    step_id = f"StepID-{formatted_time}"
-    logger.debug(f"step_id: {step_id}")
-
-    archive_dir = settings.archive_dir
-    logger.debug(f"archive_dir: {archive_dir}")
-    archive_dir.mkdir(exist_ok=True)
-    abs_archive_dir = resolve_path(archive_dir)
-    logger.debug(f"abs_archive_dir: {abs_archive_dir}")
-    stepid_dir = abs_archive_dir / step_id
-    logger.debug(f"stepid_dir: {stepid_dir}")
-    stepid_dir.mkdir(exist_ok=False)
+    # per-session workspace (copy of output_dir)
+    if settings.workspace_isolation:
+        output_dir = await get_workspace_manager(settings).acquire(step_id)
+        logger.debug(f"workspace output_dir: {output_dir}")
 
-    return LocalContext(
+    context = LocalContext(
         category=category,
         output_dir=output_dir,
         max_turns=settings.openai_max_turns,
@@ -71,6 +106,18 @@ def create_local_context(
         step_id=step_id,
         stepid_dir=stepid_dir,
         build_check=build_check,
+        priority=priority,
         loop_action=LoopAction.NORMAL,
         rebuild_result=FunctionResult(result=True),
     )
+    mark_step_active(step_id)  # not compacted until released
+    return context
+
+
+async def release_local_context(context: LocalContext, settings: Settings) -> None:
+    """
+    Clean up session resources (per-session workspace) at session end.
+    """
+    mark_step_finished(context.step_id)
+    if settings.workspace_isolation:
+        await get_workspace_manager(settings).release(context.step_id)
@@ -1,18 +1,28 @@
 import re
 
-from agents import Runner
 from agents.exceptions import AgentsException, ModelBehaviorError
-from openai.types.responses import ResponseTextDeltaEvent
+from openai.types.responses import (
+    ResponseFunctionCallArgumentsDeltaEvent,
+    ResponseOutputItemAddedEvent,
+    ResponseTextDeltaEvent,
+)
 
 from agent_logger import AgentLogger
-from base import EventType, LocalContext, PromptRequest, StreamResponse
+from agent_runner import AgentRun
+from base import (
+    CodeDeltaPayload,
+    EventType,
+    LocalContext,
+    PromptRequest,
+    StreamResponse,
+)
+from code_stream import CodeFieldExtractor, DeltaBatcher, with_ticks
 from config import get_settings
 from custom_agents import get_code_gen_agent
 from logger import logger
 
 # for fault injection
 FAULT_RE = re.compile(r"^\s*\[!FAULT\s+([A-Za-z0-9_]+)\s*\]\s*", re.I)
-settings = get_settings()
 
 
 def _extract_fault(prompt: str) -> str | None:
@@ -21,7 +31,7 @@ def _extract_fault(prompt: str) -> str | None:
 
 
 def _maybe_inject_fault(prompt: str) -> None:
-    if not settings.debug:
+    if not get_settings().debug:
         return
     fault = _extract_fault(prompt)
     if not fault:
@@ -35,32 +45,71 @@ def _maybe_inject_fault(prompt: str) -> None:
         raise Exception("debug: Exception fault injection")
 
 
+def _code_delta_line(offset: int, delta: str) -> str:
+    payload = CodeDeltaPayload(language="tsx", offset=offset, delta=delta)
+    return StreamResponse(
+        event=EventType.CODE_DELTA, payload=payload.model_dump()
+    ).to_json_line()
+
+
 # function gen_code
 async def gen_code(request: PromptRequest, context: LocalContext):
     logger.debug("gen_code called")
+    settings = get_settings()
+    extractor = CodeFieldExtractor()
+    batcher = DeltaBatcher(
+        flush_interval=settings.code_stream_flush_interval,
+        flush_bytes=settings.code_stream_flush_bytes,
+    )
     try:
         _maybe_inject_fault(request.prompt)
         code_gen_agent = get_code_gen_agent()
-        result = Runner.run_streamed(
-            starting_agent=code_gen_agent,
+        result = AgentRun(
+            agent=code_gen_agent,
             input=request.prompt,
             context=context,
-            max_turns=context.max_turns,
             hooks=AgentLogger(),
         )
-        async for event in result.stream_events():
-            if event.type == "raw_response_event":
-                if isinstance(event.data, ResponseTextDeltaEvent):
-                    # print(f"token: {event.data.delta}")
-                    # delta_text = event.data.delta
-                    # yield delta_text
-                    pass
+        # With code streaming, the pending deltas are flushed on time even
+        # if the model stalls (None: flush interval passed without an event)
+        events = result.stream_events()
+        if settings.code_stream:
+            events = with_ticks(events, batcher.wait_time)
+        async for event in events:
+            if event is None:
+                delta = batcher.flush()
+                if delta:
+                    offset = extractor.length - len(delta)
+                    yield _code_delta_line(offset, delta)
+            elif event.type == "raw_response_event":
+                if not settings.code_stream:
+                    continue
+                if isinstance(event.data, ResponseOutputItemAddedEvent):
+                    # New message / function call: the code starts over
+                    pending = batcher.flush()
+                    if pending:
+                        offset = extractor.length - len(pending)
+                        yield _code_delta_line(offset, pending)
+                    extractor = CodeFieldExtractor()
+                elif isinstance(
+                    event.data,
+                    (ResponseTextDeltaEvent, ResponseFunctionCallArgumentsDeltaEvent),
+                ):
+                    text = extractor.feed(event.data.delta)
+                    delta = batcher.add(text, force=extractor.done)
+                    if delta:
+                        offset = extractor.length - len(delta)
+                        yield _code_delta_line(offset, delta)
             elif event.type == "agent_updated_stream_event":
                 logger.debug(f"Agent updated: {event.new_agent.name}")
                 agent_name = event.new_agent.name
                 yield StreamResponse(
                     event=EventType.AGENT_UPDATE, payload={"agent_name": agent_name}
                 ).to_json_line()
+            elif event.type == "llm_queue_event":
+                yield StreamResponse(
+                    event=EventType.LLM_QUEUE, payload=event.payload.model_dump()
+                ).to_json_line()
             elif event.type == "run_item_stream_event":
                 if event.item.type == "tool_call_item":
                     logger.debug("Event: tool_call_item")
@@ -81,6 +130,9 @@ async def gen_code(request: PromptRequest, context: LocalContext):
                 else:
                     pass
 
+        context.tokens_used += result.context_wrapper.usage.total_tokens
+        context.code_gen_runs += 1
+
     except ModelBehaviorError as e:
         logger.error(f"ModelBehaviorError: {e}")
         raise
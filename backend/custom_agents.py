@@ -1,19 +1,24 @@
+import asyncio
 import os
 import shutil
 import sys
 from pathlib import Path
-from typing import List, Union
+from typing import Callable, List, Optional, Union
 
 from agents import (
     Agent,
+    ModelSettings,
     RunContextWrapper,
     function_tool,
     handoff,
     set_default_openai_key,
+    set_tracing_disabled,
 )
 from pydantic import ValidationError
 
 from base import (
+    AgentConfig,
+    AgentName,
     AgentResult,
     BuildErrorAnalyzerResult,
     CodeCheckResult,
@@ -21,14 +26,23 @@ from base import (
     CodeSaveData,
     CodeType,
     LocalContext,
+    ModelProviderType,
     RunPlaywrightFunctionResult,
+    SearchReplace,
 )
 from common import archive
 from config import get_settings
 from eslint_checker import run_eslint
+from file_placer import place_files_bulk, resolve_place_files
 from logger import logger
 from playwright_runner import run_playwright
 from prompt_parser import load_agents_prompt, require_str
+from source_patch import (
+    PatchError,
+    apply_search_replace,
+    apply_unified_diff,
+    read_line_range,
+)
 
 SNAPSHOT_ERROR_MESSAGE_PREF = "Error: A snapshot doesn't exist at"
 
@@ -41,8 +55,12 @@ async def on_save(ctx: RunContextWrapper[LocalContext], input_data: CodeSaveData
     logger.debug(f"target_dir: {str(target_dir)}")
     target_dir.mkdir(parents=True, exist_ok=True)
 
-    # Save file
-    file_path = os.path.join(target_dir, input_data.filename)
+    # Save file (speculative candidates are saved as scratch files)
+    filename = input_data.filename
+    if ctx.context.scratch_suffix:
+        stem, ext = os.path.splitext(filename)
+        filename = f"{stem}{ctx.context.scratch_suffix}{ext}"
+    file_path = os.path.join(target_dir, filename)
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(input_data.code)
     logger.debug(f"Saved file at {file_path}")
@@ -54,9 +72,7 @@ async def on_save(ctx: RunContextWrapper[LocalContext], input_data: CodeSaveData
     src_dir: Path = target_dir
     stepid_dir = ctx.context.stepid_dir
     dir = Path(input_data.directory)
-    archive(
-        src_dir=src_dir, src_file=input_data.filename, stepid_dir=stepid_dir, dir=dir
-    )
+    archive(src_dir=src_dir, src_file=filename, stepid_dir=stepid_dir, dir=dir)
 
     # Return
     ctx.context.response = response
@@ -73,8 +89,10 @@ except ValidationError as e:
     sys.exit(1)
 
 set_default_openai_key(key=settings.openai_api_key, use_for_tracing=True)
-model = settings.openai_model
-logger.debug(f"model: {model}")
+if settings.model_provider != ModelProviderType.OPENAI:
+    # Offline: no traces are exported
+    set_tracing_disabled(True)
+logger.debug(f"model: {settings.openai_model}")
 
 
 # Function Tools
@@ -86,7 +104,7 @@ async def check_code(ctx: RunContextWrapper, filename: str) -> CodeCheckResult:
         filename: check target file
 
     """
-    result = run_eslint(ctx=ctx, filename=filename)
+    result = await run_eslint(ctx=ctx, filename=filename)
     return result
 
 
@@ -105,45 +123,15 @@ async def place_files(
     logger.debug(
         f"place_files called : from_dir: {from_dir}, to_dir: {to_dir}, files: {files}"
     )
-    result = AgentResult(result=True, error_detail="")
     try:
-        abs_from = os.path.abspath(from_dir)
-        abs_to = os.path.abspath(to_dir)
-        logger.debug(f"abs_from: {abs_from}, abs_to: {abs_to}")
-
-        if not os.path.isdir(abs_from):
-            return AgentResult(
-                result=False, error_detail=f"Cannot find source directory: {abs_from}"
-            )
-        if not os.path.isdir(abs_to):
-            return AgentResult(
-                result=False,
-                error_detail=f"Cannot find destination directory: {abs_from}",
-            )
-
-        for f in files:
-            src = os.path.normpath(os.path.join(abs_from, f))
-            logger.debug(f"src: {src}")
-            if os.path.commonpath([abs_from, src]) != abs_from:
-                return AgentResult(
-                    result=False,
-                    error_detail="Invalid file path (outside source dir)",
-                )
-            if not os.path.isfile(src):
-                return AgentResult(
-                    result=False,
-                    error_detail=f"Cannot find file: {src}",
-                )
-            dst = os.path.join(abs_to, os.path.basename(src))
-
-            logger.debug(f"dst: {dst}")
-            shutil.copy2(src, dst)
-            logger.debug(f"Copied {src} -> {dst}")
-
-        return result
-
-    except (OSError, PermissionError, shutil.Error, ValueError) as e:
+        pairs = resolve_place_files(ctx.context, from_dir, to_dir, files)
+    except ValueError as e:
+        return AgentResult(result=False, error_detail=str(e))
+    try:
+        await asyncio.to_thread(place_files_bulk, pairs)
+    except (OSError, PermissionError, shutil.Error) as e:
         return AgentResult(result=False, error_detail=f"Unexpected error: {e}")
+    return AgentResult(result=True, error_detail="")
 
 
 # Function Tools
@@ -176,7 +164,7 @@ async def run_tests(
     logger.debug(f"screenshot_files: {screenshot_files}")
 
     # Run Tests
-    result = run_playwright(
+    result = await run_playwright(
         ctx=ctx,
         test_dir=test_dir,
         test_file=test_file,
@@ -243,12 +231,24 @@ def save_source_file(
             error_detail (str | None): Error message if the operation failed.
     """
     logger.debug("save_source_file called")
+    return _write_source_file(ctx, file_path, updated_content)
+
+
+def _source_path(ctx: RunContextWrapper, file_path: str) -> Path:
     output_dir: Path = ctx.context.output_dir
     logger.debug(f"output_dir: {output_dir}")
-
     src_path = output_dir / file_path
     logger.debug(f"src_path: {src_path}")
+    return src_path
+
 
+def _write_source_file(
+    ctx: RunContextWrapper, file_path: str, updated_content: str
+) -> AgentResult:
+    """
+    Archive the original file, then overwrite it with updated_content.
+    """
+    src_path = _source_path(ctx, file_path)
     src_dir: Path = src_path.parent
     src_file: str = src_path.name
     logger.debug(f"src_dir: {src_dir}")
@@ -284,6 +284,135 @@ def save_source_file(
         )
 
 
+def _patched_content(
+    ctx: RunContextWrapper,
+    file_path: str,
+    patch: str | None,
+    edits: List[SearchReplace] | None,
+) -> str:
+    """
+    Contents of file_path with the unified diff (patch) or the search/replace
+    edits applied. Raises PatchError / FileNotFoundError.
+    """
+    src_path = _source_path(ctx, file_path)
+    if not src_path.exists():
+        raise FileNotFoundError(f"File not found: {src_path}")
+    content = src_path.read_text(encoding="utf-8")
+    threshold = get_settings().source_patch_fuzzy_threshold
+    if patch:
+        content = apply_unified_diff(content, patch, threshold)
+    if edits:
+        content = apply_search_replace(content, edits, threshold)
+    if not patch and not edits:
+        raise PatchError("Either patch or edits must be specified")
+    return content
+
+
+@function_tool
+def read_source_lines(
+    ctx: RunContextWrapper, file_path: str, start_line: int, end_line: int
+) -> str:
+    """
+    Load a range of lines of a source file, prefixed with line numbers.
+
+    Args:
+        file_path (str): Relative path to the source file to load.
+        start_line (int): First line to load (1-based).
+        end_line (int): Last line to load (inclusive). 0 means the last line.
+
+    Returns:
+        str: "[lines <start>-<end> of <total>]" followed by "<n>| <line>" lines.
+    """
+    logger.debug("read_source_lines called")
+    src_path = _source_path(ctx, file_path)
+    if not src_path.exists():
+        raise FileNotFoundError(f"File not found: {src_path}")
+    return read_line_range(src_path.read_text(encoding="utf-8"), start_line, end_line)
+
+
+@function_tool
+def replace_in_source(
+    ctx: RunContextWrapper, file_path: str, edits: List[SearchReplace]
+) -> AgentResult:
+    """
+    Edit a source file by replacing blocks of lines, creating a backup beforehand.
+
+    Each search block must match whole lines of the file once (whitespace
+    differences and small differences are tolerated).
+
+    Args:
+        file_path (str): Relative path to the source file to edit.
+        edits (List[SearchReplace]): search: lines to be replaced,
+            replace: new lines. Applied in order.
+
+    Returns:
+        AgentResult:
+            result (bool): True if all edits were applied and saved.
+            error_detail (str | None): Error message if the operation failed.
+    """
+    logger.debug(f"replace_in_source called: {file_path}, edits={len(edits)}")
+    try:
+        content = _patched_content(ctx, file_path, None, edits)
+    except (PatchError, FileNotFoundError) as e:
+        return AgentResult(result=False, error_detail=str(e))
+    return _write_source_file(ctx, file_path, content)
+
+
+@function_tool
+def apply_source_patch(
+    ctx: RunContextWrapper, file_path: str, patch: str
+) -> AgentResult:
+    """
+    Edit a source file by applying a unified diff, creating a backup beforehand.
+
+    Args:
+        file_path (str): Relative path to the source file to edit.
+        patch (str): Unified diff with "@@ -l,s +l,s @@" hunks and
+            " ", "-", "+" prefixed lines. Context lines are matched
+            near the hunk position (whitespace differences are tolerated).
+
+    Returns:
+        AgentResult:
+            result (bool): True if the patch was applied and saved.
+            error_detail (str | None): Error message if the operation failed.
+    """
+    logger.debug(f"apply_source_patch called: {file_path}")
+    try:
+        content = _patched_content(ctx, file_path, patch, None)
+    except (PatchError, FileNotFoundError) as e:
+        return AgentResult(result=False, error_detail=str(e))
+    return _write_source_file(ctx, file_path, content)
+
+
+@function_tool
+def validate_source_patch(
+    ctx: RunContextWrapper,
+    file_path: str,
+    patch: Optional[str] = None,
+    edits: Optional[List[SearchReplace]] = None,
+) -> AgentResult:
+    """
+    Check that a unified diff or search/replace edits apply to a source file,
+    without modifying it.
+
+    Args:
+        file_path (str): Relative path to the source file.
+        patch (str | None): Unified diff (see apply_source_patch).
+        edits (List[SearchReplace] | None): Edits (see replace_in_source).
+
+    Returns:
+        AgentResult:
+            result (bool): True if the patch / edits apply.
+            error_detail (str | None): Why they do not apply.
+    """
+    logger.debug(f"validate_source_patch called: {file_path}")
+    try:
+        _patched_content(ctx, file_path, patch, edits)
+    except (PatchError, FileNotFoundError) as e:
+        return AgentResult(result=False, error_detail=str(e))
+    return AgentResult(result=True)
+
+
 # Agents
 file_save_agent = Agent(
     name="FileSaveAgent", instructions="ファイル保存を行うエージェント"
@@ -298,112 +427,114 @@ save_handoff = handoff(
 )
 
 # Get Agentes
-_code_gen_agent: Agent[LocalContext] | None = None
-_code_check_agent: Agent[LocalContext] | None = None
-_place_files_agent: Agent[LocalContext] | None = None
-_run_tests_agent: Agent[LocalContext] | None = None
-_build_error_analyzer_agent: Agent[LocalContext] | None = None
-_build_error_fixer_agent: Agent[LocalContext] | None = None
+# Cached per agent name and AgentConfig: an agent is rebuilt when its
+# settings change (see config.reload_settings)
+_agent_cache: dict[str, tuple[AgentConfig, Agent[LocalContext]]] = {}
+
+
+def _cached_agent(
+    agent_name: AgentName, build: Callable[[AgentConfig], Agent[LocalContext]]
+) -> Agent[LocalContext]:
+    config = get_settings().agent_config(agent_name)
+    cached = _agent_cache.get(agent_name)
+    if cached is not None and cached[0] == config:
+        return cached[1]
+    logger.debug(f"build {agent_name}: {config}")
+    agent = build(config)
+    _agent_cache[agent_name] = (config, agent)
+    return agent
+
+
+def _model_settings(config: AgentConfig) -> ModelSettings:
+    return ModelSettings(temperature=config.temperature)
 
 
 def get_code_gen_agent() -> Agent[LocalContext]:
     logger.debug("get_code_gen_agent called")
-    global _code_gen_agent
-    if _code_gen_agent is not None:
-        logger.debug("get_code_gen_agent return")
-        return _code_gen_agent
+    return _cached_agent(AgentName.CODE_GEN, _build_code_gen_agent)
+
 
+def _build_code_gen_agent(config: AgentConfig) -> Agent[LocalContext]:
     agents_prompt = load_agents_prompt()
     logger.debug(f"agents_prompt: {agents_prompt}")
     prompt_code_gen = require_str(data=agents_prompt, key="code_gen")
     logger.debug(f"prompt_code_gen: {prompt_code_gen}")
-    _code_gen_agent = Agent[LocalContext](
-        name="CodeGenAgent",
+    return Agent[LocalContext](
+        name=AgentName.CODE_GEN,
         instructions=prompt_code_gen,
-        model=model,
+        model=config.model,
+        model_settings=_model_settings(config),
         output_type=CodeType,
         handoffs=[save_handoff],
     )
-    logger.debug("get_code_gen_agent return")
-    return _code_gen_agent
 
 
 def get_code_check_agent() -> Agent[LocalContext]:
     logger.debug("get_code_check_agent called")
-    global _code_check_agent
-    if _code_check_agent is not None:
-        logger.debug("get_code_check_agent return")
-        return _code_check_agent
+    return _cached_agent(AgentName.CODE_CHECK, _build_code_check_agent)
+
 
+def _build_code_check_agent(config: AgentConfig) -> Agent[LocalContext]:
     agents_prompt = load_agents_prompt()
     logger.debug(f"agents_prompt: {agents_prompt}")
     prompt_code_check = require_str(data=agents_prompt, key="code_check")
     logger.debug(f"prompt_code_check: {prompt_code_check}")
-    _code_check_agent = Agent[LocalContext](
-        name="CodeCheckAgent",
+    return Agent[LocalContext](
+        name=AgentName.CODE_CHECK,
         instructions=prompt_code_check,
-        model=model,
+        model=config.model,
+        model_settings=_model_settings(config),
         tools=[check_code],
         output_type=CodeCheckResult,
     )
-    logger.debug("get_code_check_agent return")
-    return _code_check_agent
 
 
 def get_place_files_agent() -> Agent[LocalContext]:
     logger.debug("get_place_files_agent called")
-    global _place_files_agent
-    if _place_files_agent is not None:
-        logger.debug("get_place_files_agent return")
-        return _place_files_agent
+    return _cached_agent(AgentName.PLACE_FILES, _build_place_files_agent)
 
+
+def _build_place_files_agent(config: AgentConfig) -> Agent[LocalContext]:
     agents_prompt = load_agents_prompt()
     logger.debug(f"agents_prompt: {agents_prompt}")
     prompt_place_files = require_str(data=agents_prompt, key="place_files")
     logger.debug(f"prompt_place_files: {prompt_place_files}")
-
-    _place_files_agent = Agent[LocalContext](
-        name="PlaceFilesAgent",
+    return Agent[LocalContext](
+        name=AgentName.PLACE_FILES,
         instructions=prompt_place_files,
-        model=model,
+        model=config.model,
+        model_settings=_model_settings(config),
         output_type=AgentResult,
         tools=[place_files],
     )
-    logger.debug("get_place_files_agent return")
-    return _place_files_agent
 
 
 def get_run_tests_agent() -> Agent[LocalContext]:
     logger.debug("get_run_tests_agent called")
-    global _run_tests_agent
-    if _run_tests_agent is not None:
-        logger.debug("get_run_tests_agent return")
-        return _run_tests_agent
+    return _cached_agent(AgentName.RUN_TESTS, _build_run_tests_agent)
+
 
+def _build_run_tests_agent(config: AgentConfig) -> Agent[LocalContext]:
     agents_prompt = load_agents_prompt()
     logger.debug(f"agents_prompt: {agents_prompt}")
     prompt_run_tests = require_str(data=agents_prompt, key="run_tests")
     logger.debug(f"prompt_run_tests: {prompt_run_tests}")
-
-    _run_tests_agent = Agent[LocalContext](
-        name="RunTestsAgent",
+    return Agent[LocalContext](
+        name=AgentName.RUN_TESTS,
         instructions=prompt_run_tests,
-        model=model,
+        model=config.model,
+        model_settings=_model_settings(config),
         tools=[run_tests],
         output_type=RunPlaywrightFunctionResult,
     )
-    logger.debug("get_run_tests_agent return")
-    return _run_tests_agent
 
 
 def get_build_error_analyzer_agent() -> Agent[LocalContext]:
     logger.debug("get_build_error_analyzer_agent called")
+    return _cached_agent(AgentName.ANALYZER, _build_build_error_analyzer_agent)
 
-    global _build_error_analyzer_agent
-    if _build_error_analyzer_agent is not None:
-        logger.debug("get_build_error_analyzer_agent return")
-        return _build_error_analyzer_agent
 
+def _build_build_error_analyzer_agent(config: AgentConfig) -> Agent[LocalContext]:
     agents_prompt = load_agents_prompt()
     instructions_build_error_analyzer = require_str(
         data=agents_prompt, key="instructions_build_error_analyzer"
@@ -411,40 +542,39 @@ def get_build_error_analyzer_agent() -> Agent[LocalContext]:
     logger.debug(
         f"instructions_build_error_analyzer: {instructions_build_error_analyzer}"
     )
-
-    _build_error_analyzer_agent = Agent[LocalContext](
-        name="AnalyzerAgent",
+    return Agent[LocalContext](
+        name=AgentName.ANALYZER,
         instructions=instructions_build_error_analyzer,
-        model=model,
+        model=config.model,
+        model_settings=_model_settings(config),
         output_type=BuildErrorAnalyzerResult,
     )
-    logger.debug("get_build_error_analyzer_agent return")
-    return _build_error_analyzer_agent
 
 
 def get_build_error_fixer_agent() -> Agent[LocalContext]:
     logger.debug("get_build_error_fixer_agent called")
+    return _cached_agent(AgentName.FIXER, _build_build_error_fixer_agent)
 
-    global _build_error_fixer_agent
-    if _build_error_fixer_agent is not None:
-        logger.debug("get_build_error_fixer_agent return cached")
-        return _build_error_fixer_agent
 
+def _build_build_error_fixer_agent(config: AgentConfig) -> Agent[LocalContext]:
     agents_prompt = load_agents_prompt()
     instructions_build_error_fixer = require_str(
         data=agents_prompt,
         key="instructions_build_error_fixer",
     )
-
     logger.debug(f"instructions_build_error_fixer: {instructions_build_error_fixer}")
-
-    _build_error_fixer_agent = Agent[LocalContext](
-        name="FixerAgent",
+    return Agent[LocalContext](
+        name=AgentName.FIXER,
         instructions=instructions_build_error_fixer,
-        model=model,
-        tools=[load_source_file, save_source_file],
+        model=config.model,
+        model_settings=_model_settings(config),
+        tools=[
+            load_source_file,
+            read_source_lines,
+            validate_source_patch,
+            replace_in_source,
+            apply_source_patch,
+            save_source_file,
+        ],
         output_type=AgentResult,
     )
-
-    logger.debug("get_build_error_fixer_agent initialized")
-    return _build_error_fixer_agent
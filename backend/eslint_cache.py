@@ -0,0 +1,64 @@
+"""
+Content-addressed ESLint result cache
+
+The key is the SHA-256 of the target file path (relative to the project),
+the target file contents and the lint config hash (eslint config,
+formatter, custom rules, package.json and its lockfile). The cached value
+is the formatted eslint_result.json with the lint root (absolute filePath,
+cwd) replaced by ROOT_PLACEHOLDER, so a hit from another workspace is
+rewritten to the current root (localize_result).
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+from common import sha256_file
+from config import get_settings
+from eslint_service import eslint_config_hash
+from result_cache import DiskCache
+
+ESLINT_CACHE_DIR = "eslint"
+ESLINT_CACHE_FILE = "eslint_result.json"
+ESLINT_CACHE_VERSION = "2"  # 2: root relative results
+ROOT_PLACEHOLDER = "<ESLINT_ROOT>"
+
+_eslint_cache: DiskCache | None = None
+
+
+def get_eslint_cache() -> DiskCache:
+    global _eslint_cache
+    if _eslint_cache is None:
+        settings = get_settings()
+        _eslint_cache = DiskCache(
+            name="eslint",
+            cache_dir=settings.cache_dir / ESLINT_CACHE_DIR,
+            max_bytes=settings.eslint_cache_max_bytes,
+        )
+    return _eslint_cache
+
+
+def eslint_cache_key(eslint_dir: Path, file_path: Path) -> str:
+    try:
+        rel_path = file_path.resolve().relative_to(eslint_dir.resolve())
+    except ValueError:
+        rel_path = file_path
+    h = hashlib.sha256()
+    h.update(ESLINT_CACHE_VERSION.encode("utf-8"))
+    h.update(str(rel_path).encode("utf-8"))
+    h.update(sha256_file(file_path).encode("utf-8"))
+    h.update(eslint_config_hash(eslint_dir).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _json_root(eslint_dir: Path) -> str:
+    # The root as it appears inside JSON strings
+    return json.dumps(str(eslint_dir.resolve()), ensure_ascii=False)[1:-1]
+
+
+def relativize_result(content: str, eslint_dir: Path) -> str:
+    return content.replace(_json_root(eslint_dir), ROOT_PLACEHOLDER)
+
+
+def localize_result(content: str, eslint_dir: Path) -> str:
+    return content.replace(ROOT_PLACEHOLDER, _json_root(eslint_dir))
@@ -1,9 +1,20 @@
+import asyncio
 import json
 from pathlib import Path
 
 from agents import RunContextWrapper
 
 from base import CodeCheckResult, ESLintInfo
+from common import archive
+from config import get_settings
+from eslint_cache import (
+    ESLINT_CACHE_FILE,
+    eslint_cache_key,
+    get_eslint_cache,
+    localize_result,
+    relativize_result,
+)
+from eslint_service import ESLintDaemonError, get_eslint_pool
 from logger import logger
 from run_command import run_cmd
 
@@ -13,13 +24,33 @@ ESLINT_OUTPUT_FILENAME = "eslint_result.json"
 PACKAGE_JSON = "package.json"
 
 
-def run_eslint(ctx: RunContextWrapper, filename: str) -> CodeCheckResult:
+def _load_cached_result(cache_key: str, eslint_dir: Path, output_path: Path) -> bool:
+    files = get_eslint_cache().read(cache_key)
+    if files is None or ESLINT_CACHE_FILE not in files:
+        return False
+    logger.debug(f"ESLint cache hit: {cache_key}")
+    content = files[ESLINT_CACHE_FILE].decode("utf-8")
+    output_path.write_text(localize_result(content, eslint_dir), encoding="utf-8")
+    return True
+
+
+def _store_cached_result(cache_key: str, eslint_dir: Path, formatted_json: str) -> None:
+    content = relativize_result(formatted_json, eslint_dir)
+    get_eslint_cache().put(cache_key, {ESLINT_CACHE_FILE: content.encode("utf-8")})
+
+
+async def run_eslint(
+    ctx: RunContextWrapper,
+    filename: str,
+    output_filename: str = ESLINT_OUTPUT_FILENAME,
+) -> CodeCheckResult:
     logger.debug("run_eslint called")
+    settings = get_settings()
 
     eslint_dir: Path = ctx.context.output_dir
     file_path = eslint_dir / APP_DIR / filename
     results_dir = eslint_dir / RESULTS_DIR
-    output_path = results_dir / ESLINT_OUTPUT_FILENAME
+    output_path = results_dir / output_filename
     logger.debug(f"eslint_dir: {eslint_dir}")
     logger.debug(f"file_path: {file_path}")
     logger.debug(f"results_dir: {results_dir}")
@@ -51,27 +82,66 @@ def run_eslint(ctx: RunContextWrapper, filename: str) -> CodeCheckResult:
         with output_path.open("w", encoding="utf-8") as f:
             f.write("[]")
 
-    command = ["npx", "eslint", str(file_path), "--format", "./eslint.formatter.mjs"]
-    try:
-        result = run_cmd(
-            stepid_dir=ctx.context.stepid_dir,
-            command=command,
-            output_path=output_path,
-            cwd=str(eslint_dir),
-        )
-    except FileNotFoundError as e:
-        eslint_result = CodeCheckResult(
-            result=False, output_filename=None, error_detail=str(e)
-        )
-        return eslint_result
-
-    # Check Return Code
-    logger.debug(f"npx eslint returncode: {result.returncode}")
-    if result.returncode not in (0, 1):
-        eslint_result = CodeCheckResult(
-            result=False, output_filename=None, error_detail=result.stderr
-        )
-        return eslint_result
+    # Lookup the ESLint result cache
+    linted = False
+    cache_key: str | None = None
+    if settings.eslint_cache and file_path.is_file():
+        cache_key = await asyncio.to_thread(eslint_cache_key, eslint_dir, file_path)
+        if await asyncio.to_thread(
+            _load_cached_result, cache_key, eslint_dir, output_path
+        ):
+            archive(
+                src_dir=results_dir,
+                src_file=output_filename,
+                stepid_dir=ctx.context.stepid_dir,
+                dir=Path("eslint"),
+            )
+            cache_key = None
+            linted = True
+
+    # Lint with the ESLint daemon (fallback: npx eslint)
+    if not linted and settings.eslint_daemon:
+        try:
+            output = await get_eslint_pool().lint(eslint_dir, file_path)
+            output_path.write_text(output, encoding="utf-8")
+            archive(
+                src_dir=results_dir,
+                src_file=output_filename,
+                stepid_dir=ctx.context.stepid_dir,
+                dir=Path("eslint"),
+            )
+            linted = True
+        except ESLintDaemonError as e:
+            logger.warning(f"ESLint daemon failed, fallback to npx eslint: {e}")
+
+    if not linted:
+        command = [
+            "npx",
+            "eslint",
+            str(file_path),
+            "--format",
+            "./eslint.formatter.mjs",
+        ]
+        try:
+            result = await run_cmd(
+                stepid_dir=ctx.context.stepid_dir,
+                command=command,
+                output_path=output_path,
+                cwd=str(eslint_dir),
+            )
+        except FileNotFoundError as e:
+            eslint_result = CodeCheckResult(
+                result=False, output_filename=None, error_detail=str(e)
+            )
+            return eslint_result
+
+        # Check Return Code
+        logger.debug(f"npx eslint returncode: {result.returncode}")
+        if result.returncode not in (0, 1):
+            eslint_result = CodeCheckResult(
+                result=False, output_filename=None, error_detail=result.stderr
+            )
+            return eslint_result
 
     try:
         with output_path.open("r", encoding="utf-8") as f:
@@ -125,6 +195,12 @@ def run_eslint(ctx: RunContextWrapper, filename: str) -> CodeCheckResult:
         with output_path.open("w", encoding="utf-8") as f:
             f.write(formatted_json)
 
+        # Store the ESLint result cache
+        if cache_key is not None:
+            await asyncio.to_thread(
+                _store_cached_result, cache_key, eslint_dir, formatted_json
+            )
+
     except json.JSONDecodeError as e:
         error_msg = f"Failed to parse JSON from {output_path} : {e}"
         eslint_result = CodeCheckResult(
@@ -132,6 +208,9 @@ def run_eslint(ctx: RunContextWrapper, filename: str) -> CodeCheckResult:
         )
         return eslint_result
 
+    ctx.context.eslint_runs += 1
+    ctx.context.eslint_errors += len(eslint_info_list)
+    ctx.context.eslint_errors_last = len(eslint_info_list)
     eslint_result = CodeCheckResult(
         result=True,
         output_filename=str(output_path),
@@ -0,0 +1,249 @@
+"""
+Persistent ESLint service
+
+A pool of long-lived Node workers (output/eslint.server.mjs) that keep
+ESLint, its config and plugins loaded between checks. Requests are sent
+over stdin/stdout as JSON lines.
+
+Notes:
+- The lint config hash (eslint config, formatter, custom rules, package
+  files) is sent with each request. When it changes, all workers are
+  restarted so that no stale module is used.
+- Callers should fall back to the one-shot `npx eslint` path on
+  ESLintDaemonError.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from pathlib import Path
+
+from common import sha256_file
+from config import get_settings
+from logger import logger
+
+SERVER_SCRIPT = "eslint.server.mjs"
+ESLINT_CONFIG_FILES = [
+    "eslint.config.mjs",
+    "eslint.formatter.mjs",
+    "package.json",
+    "package-lock.json",
+    "tsconfig.json",
+]
+ESLINT_CUSTOM_RULES_DIR = "eslint-custom-rules"
+STDOUT_LINE_LIMIT = 16 * 1024 * 1024
+START_TIMEOUT_SEC = 30.0
+RETRY_START_INTERVAL_SEC = 60.0
+
+
+class ESLintDaemonError(Exception):
+    pass
+
+
+def eslint_config_hash(eslint_dir: Path) -> str:
+    """
+    Hash of all files that affect the ESLint result (except the target file).
+    """
+    h = hashlib.sha256()
+    targets = [eslint_dir / name for name in ESLINT_CONFIG_FILES]
+    rules_dir = eslint_dir / ESLINT_CUSTOM_RULES_DIR
+    if rules_dir.is_dir():
+        targets.extend(sorted(rules_dir.glob("*.mjs")))
+    for path in targets:
+        if not path.is_file():
+            continue
+        h.update(path.name.encode("utf-8"))
+        h.update(sha256_file(path).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ESLintWorker:
+    def __init__(self, script_path: Path):
+        self.script_path = script_path
+        self.process: asyncio.subprocess.Process | None = None
+        self.request_id = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self) -> None:
+        logger.debug(f"ESLintWorker start: {self.script_path}")
+        self.process = await asyncio.create_subprocess_exec(
+            "node",
+            str(self.script_path),
+            cwd=str(self.script_path.parent),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=STDOUT_LINE_LIMIT,
+        )
+        message = await asyncio.wait_for(self._read(), timeout=START_TIMEOUT_SEC)
+        if not message.get("ready"):
+            await self.stop()
+            raise ESLintDaemonError(f"Unexpected start message: {message}")
+        logger.debug(f"ESLintWorker ready: pid={self.process.pid}")
+
+    async def _read(self) -> dict:
+        if self.process is None or self.process.stdout is None:
+            raise ESLintDaemonError("ESLint worker is not running")
+        line = await self.process.stdout.readline()
+        if not line:
+            raise ESLintDaemonError("ESLint worker exited")
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ESLintDaemonError(f"Invalid response from ESLint worker: {e}")
+
+    async def lint(
+        self, cwd: Path, file_path: Path, config_hash: str, timeout: float
+    ) -> str:
+        if self.process is None or self.process.stdin is None or not self.alive:
+            raise ESLintDaemonError("ESLint worker is not running")
+        self.request_id += 1
+        request = {
+            "id": self.request_id,
+            "cwd": str(cwd),
+            "file": str(file_path),
+            "config_hash": config_hash,
+        }
+        self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        response = await asyncio.wait_for(self._read(), timeout=timeout)
+        if response.get("id") != self.request_id:
+            raise ESLintDaemonError(f"Unexpected response id: {response.get('id')}")
+        if not response.get("ok"):
+            raise ESLintDaemonError(response.get("error") or "ESLint worker error")
+        return response.get("output", "")
+
+    async def stop(self) -> None:
+        if self.process is None:
+            return
+        process = self.process
+        self.process = None
+        if process.returncode is not None:
+            return
+        logger.debug(f"ESLintWorker stop: pid={process.pid}")
+        if process.stdin is not None:
+            process.stdin.close()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    def kill(self) -> None:
+        """
+        Stop without waiting for the process (lint cancelled or failed).
+        """
+        process = self.process
+        self.process = None
+        if process is not None and process.returncode is None:
+            logger.debug(f"ESLintWorker kill: pid={process.pid}")
+            process.kill()
+
+
+class ESLintDaemonPool:
+    def __init__(self, script_path: Path, size: int, timeout: float):
+        self.script_path = script_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: asyncio.Queue[ESLintWorker] | None = None
+        self._workers: list[ESLintWorker] = []
+        self._config_hashes: dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._disabled_until = 0.0
+
+    async def _ensure_started(self) -> asyncio.Queue[ESLintWorker]:
+        async with self._lock:
+            if self._idle is not None:
+                return self._idle
+            if time.monotonic() < self._disabled_until:
+                raise ESLintDaemonError("ESLint daemon is temporarily disabled")
+            if not self.script_path.is_file():
+                raise ESLintDaemonError(f"{self.script_path} not found")
+            idle: asyncio.Queue[ESLintWorker] = asyncio.Queue()
+            try:
+                for _ in range(self.size):
+                    worker = ESLintWorker(self.script_path)
+                    await worker.start()
+                    self._workers.append(worker)
+                    idle.put_nowait(worker)
+            except (OSError, asyncio.TimeoutError, ESLintDaemonError) as e:
+                logger.warning(f"ESLint daemon start failed: {e}")
+                self._disabled_until = time.monotonic() + RETRY_START_INTERVAL_SEC
+                await self._stop_workers()
+                raise ESLintDaemonError(f"ESLint daemon start failed: {e}") from e
+            logger.info(f"ESLint daemon started: workers={self.size}")
+            self._idle = idle
+            return idle
+
+    async def _stop_workers(self) -> None:
+        workers = self._workers
+        self._workers = []
+        self._idle = None
+        for worker in workers:
+            await worker.stop()
+
+    async def _check_config(self, eslint_dir: Path) -> str:
+        config_hash = await asyncio.to_thread(eslint_config_hash, eslint_dir)
+        key = str(eslint_dir)
+        previous = self._config_hashes.get(key)
+        self._config_hashes[key] = config_hash
+        if previous is not None and previous != config_hash:
+            logger.info(f"ESLint config changed, restart workers: {eslint_dir}")
+            async with self._lock:
+                await self._stop_workers()
+        return config_hash
+
+    async def lint(self, eslint_dir: Path, file_path: Path) -> str:
+        """
+        Lint file_path with the project in eslint_dir.
+
+        Returns:
+            str: the output of eslint.formatter.mjs (same as the CLI output)
+        """
+        config_hash = await self._check_config(eslint_dir)
+        idle = await self._ensure_started()
+        worker = await idle.get()
+        try:
+            if not worker.alive:
+                await worker.start()
+            return await worker.lint(eslint_dir, file_path, config_hash, self.timeout)
+        except (OSError, asyncio.TimeoutError, ESLintDaemonError) as e:
+            # The worker state is unknown; restart it on next use
+            await worker.stop()
+            raise ESLintDaemonError(str(e) or e.__class__.__name__) from e
+        except BaseException:
+            # Cancelled (e.g. a losing speculative candidate) or unexpected
+            # error: the request may still be in flight in Node
+            worker.kill()
+            raise
+        finally:
+            idle.put_nowait(worker)
+
+    async def shutdown(self) -> None:
+        async with self._lock:
+            await self._stop_workers()
+
+
+_eslint_pool: ESLintDaemonPool | None = None
+
+
+def get_eslint_pool() -> ESLintDaemonPool:
+    global _eslint_pool
+    if _eslint_pool is None:
+        settings = get_settings()
+        script_path = settings.output_dir.resolve() / SERVER_SCRIPT
+        _eslint_pool = ESLintDaemonPool(
+            script_path=script_path,
+            size=settings.eslint_daemon_workers,
+            timeout=settings.eslint_daemon_timeout,
+        )
+    return _eslint_pool
+
+
+async def shutdown_eslint_pool() -> None:
+    if _eslint_pool is not None:
+        await _eslint_pool.shutdown()
@@ -0,0 +1,137 @@
+"""
+PlaceFiles executor
+
+Places files from from_dir into to_dir (flat, by file name). File names
+may be glob patterns. Every file is placed as a reflink, then a hardlink
+(settings.place_files_hardlink), and the remaining files are copied with
+a thread pool.
+
+A hardlinked file shares its inode with the source: an in-place write to
+the placed file (save, patch, workspace sync back) also changes the source
+asset. It is off by default and only safe for files that are never edited.
+"""
+
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from base import LocalContext, PlacedFile, PlaceMethod
+from common import reflink_file
+from config import get_settings
+from logger import logger
+from workspace import map_to_workspace
+
+GLOB_CHARS = set("*?[")
+
+
+def resolve_place_files(
+    context: LocalContext, from_dir: str, to_dir: str, files: list[str]
+) -> list[tuple[str, str]]:
+    """
+    Returns (src, dst) pairs.
+    Raises ValueError if a directory or file is not found or a file is
+    outside from_dir.
+    """
+    settings = get_settings()
+    if settings.workspace_isolation:
+        # paths under settings.output_dir point to the session workspace
+        from_dir = map_to_workspace(from_dir, settings.output_dir, context.output_dir)
+        to_dir = map_to_workspace(to_dir, settings.output_dir, context.output_dir)
+    abs_from = os.path.abspath(from_dir)
+    abs_to = os.path.abspath(to_dir)
+    logger.debug(f"abs_from: {abs_from}, abs_to: {abs_to}")
+
+    if not os.path.isdir(abs_from):
+        raise ValueError(f"Cannot find source directory: {abs_from}")
+    if not os.path.isdir(abs_to):
+        raise ValueError(f"Cannot find destination directory: {abs_to}")
+    if os.path.samefile(abs_from, abs_to):
+        raise ValueError("Source and destination directories are the same")
+
+    sources: list[str] = []
+    for f in files:
+        if GLOB_CHARS & set(f):
+            matches = sorted(
+                m for m in glob.glob(os.path.join(abs_from, f)) if os.path.isfile(m)
+            )
+            if not matches:
+                raise ValueError(f"No files match: {f}")
+            sources.extend(os.path.normpath(m) for m in matches)
+        else:
+            sources.append(os.path.normpath(os.path.join(abs_from, f)))
+
+    pairs: list[tuple[str, str]] = []
+    for src in sources:
+        logger.debug(f"src: {src}")
+        if os.path.commonpath([abs_from, src]) != abs_from:
+            raise ValueError("Invalid file path (outside source dir)")
+        if not os.path.isfile(src):
+            raise ValueError(f"Cannot find file: {src}")
+        pair = (src, os.path.join(abs_to, os.path.basename(src)))
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+def _link(src: str, dst: str, hardlink: bool) -> PlaceMethod | None:
+    """
+    Place dst as a reflink or hardlink. Returns None if neither is possible.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if reflink_file(src, dst):
+        return PlaceMethod.REFLINK
+    if hardlink:
+        try:
+            if os.path.lexists(dst):
+                # left by a failed reflink
+                os.unlink(dst)
+            os.link(src, dst)
+            return PlaceMethod.HARDLINK
+        except OSError as e:
+            logger.debug(f"hardlink failed, fallback to copy: {e}")
+    return None
+
+
+def _copy(src: str, dst: str) -> tuple[PlaceMethod, float]:
+    start = time.perf_counter()
+    shutil.copy2(src, dst)
+    return PlaceMethod.COPY, (time.perf_counter() - start) * 1000
+
+
+def place_files_bulk(pairs: list[tuple[str, str]]) -> list[PlacedFile]:
+    """
+    Place all (src, dst) pairs. Returns per-file method and duration.
+    """
+    settings = get_settings()
+    results: dict[str, tuple[PlaceMethod, float]] = {}
+    to_copy: list[tuple[str, str]] = []
+    for src, dst in pairs:
+        start = time.perf_counter()
+        method = _link(src, dst, settings.place_files_hardlink)
+        if method is None:
+            to_copy.append((src, dst))
+            continue
+        results[dst] = (method, (time.perf_counter() - start) * 1000)
+
+    if to_copy:
+        workers = max(1, min(settings.place_files_copy_workers, len(to_copy)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            copied = executor.map(lambda pair: _copy(*pair), to_copy)
+            for (_, dst), result in zip(to_copy, copied):
+                results[dst] = result
+
+    placed = []
+    for _, dst in pairs:
+        method, duration_ms = results[dst]
+        logger.debug(f"Placed {dst} ({method}, {duration_ms:.3f}ms)")
+        placed.append(
+            PlacedFile(
+                file=os.path.basename(dst),
+                method=method,
+                duration_ms=round(duration_ms, 3),
+            )
+        )
+    return placed
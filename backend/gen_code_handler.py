@@ -17,20 +17,31 @@ from base import (
     DoneStatus,
     EventType,
     FunctionResult,
+    IsCodeCheckError,
     LocalContext,
     LoopAction,
 )
 from checkpoint import debug_checkpoint
 from config import Settings
 from logger import logger
+from run_metrics import code_gen_budget_remaining, step_metrics
 from step_check_code import check_code_step
 from step_gen_code import gen_code_step
 from step_run_build import run_build_step
 from step_run_rebuild import run_rebuild_step
+from step_speculative_gen_code import speculative_gen_code_step
 
 SSEEventCallable = Callable[[str, dict], Awaitable[str]]
 
 
+async def _step_metrics_events(
+    context: LocalContext, step: str, sse_event: SSEEventCallable
+) -> AsyncIterator[str]:
+    metrics = step_metrics(context, step)
+    if metrics is not None:
+        yield await sse_event(EventType.METRICS, metrics.model_dump())
+
+
 async def handle_gen_code(
     prompt: str,
     context: LocalContext,
@@ -56,6 +67,22 @@ async def handle_gen_code(
         for i in range(settings.code_gen_retry):
             logger.debug(f"Code Gen Loop [{i}]")
 
+            # Token budget (settings.code_gen_token_budget)
+            remaining = code_gen_budget_remaining(
+                context, settings.code_gen_token_budget
+            )
+            if remaining is not None and remaining <= 0:
+                logger.warning(
+                    f"[{category}] code generation token budget exhausted "
+                    f"({settings.code_gen_token_budget})"
+                )
+                final_payload = DonePayload(
+                    status=DoneStatus.FAILED,
+                    message="Token budget exhausted",
+                )
+                yield await sse_event(EventType.DONE, final_payload.model_dump())
+                return
+
             # -------------------------------
             # 1. Create Code (prepare prompt)
             # -------------------------------
@@ -90,13 +117,35 @@ async def handle_gen_code(
             # ------------------
             # 3. Call gen_code()
             # ------------------
-            if debug_mode != DebugMode.SKIP_AGENT:
+            if debug_mode != DebugMode.SKIP_AGENT and settings.code_gen_speculative > 1:
+                # Generated and linted in one step (CP2 is not applicable)
+                logger.debug("speculative_gen_code_step called")
+                async for ev in speculative_gen_code_step(
+                    final_prompt=final_prompt,
+                    context=context,
+                    settings=settings,
+                ):
+                    yield await sse_event(ev.event, ev.payload)
+                async for ev in _step_metrics_events(context, "gen_code", sse_event):
+                    yield ev
+
+                if context.loop_action == LoopAction.CONTINUE:
+                    continue
+                if context.loop_action == LoopAction.BREAK:
+                    break
+                if context.is_code_check_error == IsCodeCheckError.ESLINT_ERROR:
+                    continue
+                success = True
+                break
+            elif debug_mode != DebugMode.SKIP_AGENT:
                 logger.debug("gen_code_step called")
                 async for ev in gen_code_step(
                     final_prompt=final_prompt,
                     context=context,
                 ):
                     yield await sse_event(ev.event, ev.payload)
+                async for ev in _step_metrics_events(context, "gen_code", sse_event):
+                    yield ev
 
                 if context.loop_action == LoopAction.CONTINUE:
                     continue
@@ -128,6 +177,8 @@ async def handle_gen_code(
                     context=context,
                 ):
                     yield await sse_event(ev.event, ev.payload)
+                async for ev in _step_metrics_events(context, "check_code", sse_event):
+                    yield ev
 
                 if context.loop_action == LoopAction.CONTINUE:
                     continue
@@ -0,0 +1,377 @@
+"""
+Process-wide LLM request scheduler
+
+Every model request of an agent run goes through LimitedModel
+(see agent_runner.AgentRun):
+- LLMScheduler limits requests per minute (settings.llm_rpm) and tokens
+  per minute (settings.llm_tpm) with token buckets. Waiting requests are
+  served by priority (interactive before batch, FIFO within a priority).
+- The tokens of a request are estimated from its input and corrected with
+  the actual usage when the response is complete.
+- Retryable errors (rate limit, timeout, connection, 5xx) are retried with
+  jittered exponential backoff (Retry-After is honored). A rate limit error
+  also pauses the scheduler for every session.
+  A streamed response is only retried if no event has been received yet.
+
+With settings.model_provider = "stub" / "replay", models are
+stub_model.StubModel / agent_recorder.ReplayModel (offline) instead of the
+OpenAI models, still scheduled the same way. With a recorder, responses are
+recorded by agent_recorder.RecordingModel.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from typing import Any, AsyncIterator, Callable
+
+import openai
+from agents import MultiProvider
+from agents.models.interface import Model, ModelProvider
+
+from agent_recorder import (
+    AgentRecorder,
+    RecordingModel,
+    ReplayModel,
+    ReplayRun,
+    get_agent_replayer,
+)
+from base import (
+    LLMQueuePayload,
+    LLMSchedulerStats,
+    LLMWaitReason,
+    ModelProviderType,
+    SessionPriority,
+)
+from config import get_settings
+from logger import logger
+from stub_model import StubModel
+
+PRIORITY_RANK = {SessionPriority.INTERACTIVE: 0, SessionPriority.BATCH: 1}
+CHARS_PER_TOKEN = 4
+REPORT_MIN_WAIT_SEC = 0.05
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """
+    Holds up to per_minute tokens, refilled at per_minute tokens per minute.
+    per_minute <= 0: unlimited.
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.per_minute,
+            self._tokens + (now - self._updated) * self.per_minute / 60,
+        )
+        self._updated = now
+
+    def delay(self, amount: int) -> float:
+        """
+        Seconds until amount tokens are available (a request larger than
+        the bucket waits for a full bucket).
+        """
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.per_minute)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) * 60 / self.per_minute
+
+    def consume(self, amount: int) -> None:
+        """
+        Take amount tokens (may go below zero), negative amount refunds.
+        """
+        if self.per_minute <= 0:
+            return
+        self._refill()
+        self._tokens = min(self.per_minute, self._tokens - amount)
+
+
+class LLMScheduler:
+    def __init__(self, rpm: int, tpm: int):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._paused_until = 0.0
+        # stats
+        self._request_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._retries = 0
+        self._rate_limited = 0
+        self._failures = 0
+        self._token_count = 0
+
+    async def acquire(self, priority: SessionPriority, tokens: int) -> float:
+        """
+        Wait until the request may be sent. Returns the wait in seconds.
+        """
+        start = time.monotonic()
+        entry = (PRIORITY_RANK[priority], next(self._seq))
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiters[0] == entry:
+                        timeout = max(
+                            self._paused_until - time.monotonic(),
+                            self._requests.delay(1),
+                            self._tokens.delay(tokens),
+                        )
+                        if timeout <= 0:
+                            break
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+
+        wait = time.monotonic() - start
+        self._request_count += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        return wait
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """
+        Correct the token bucket with the actual usage of a request.
+        """
+        self._tokens.consume(actual - estimated)
+        self._token_count += actual
+
+    def pause(self, sec: float) -> None:
+        """
+        Hold back every request for sec (provider rate limit).
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + sec)
+        self._rate_limited += 1
+
+    def record_retry(self) -> None:
+        self._retries += 1
+
+    def record_failure(self) -> None:
+        self._failures += 1
+
+    def stats(self) -> LLMSchedulerStats:
+        count = self._request_count
+        return LLMSchedulerStats(
+            requests=count,
+            waiting=len(self._waiters),
+            wait_avg_sec=round(self._wait_total / count, 3) if count else 0.0,
+            wait_max_sec=round(self._wait_max, 3),
+            retries=self._retries,
+            rate_limited=self._rate_limited,
+            failures=self._failures,
+            tokens=self._token_count,
+            rpm_limit=self._requests.per_minute,
+            tpm_limit=self._tokens.per_minute,
+        )
+
+
+_llm_scheduler: LLMScheduler | None = None
+_base_provider: MultiProvider | None = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        settings = get_settings()
+        _llm_scheduler = LLMScheduler(rpm=settings.llm_rpm, tpm=settings.llm_tpm)
+    return _llm_scheduler
+
+
+def _get_base_provider() -> MultiProvider:
+    global _base_provider
+    if _base_provider is None:
+        _base_provider = MultiProvider()
+    return _base_provider
+
+
+def _retry_after(e: Exception) -> float:
+    response = getattr(e, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+class LimitedModel(Model):
+    """
+    Model wrapper: scheduling, token accounting and retries.
+    on_wait is called with an LLMQueuePayload for every noticeable wait.
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        agent_name: str,
+        priority: SessionPriority,
+        on_wait: Callable[[LLMQueuePayload], None] | None = None,
+    ):
+        self.model = model
+        self.agent_name = agent_name
+        self.priority = priority
+        self.on_wait = on_wait
+
+    async def close(self) -> None:
+        await self.model.close()
+
+    def _estimate(self, system_instructions: str | None, input: Any) -> int:
+        return (len(system_instructions or "") + len(str(input))) // CHARS_PER_TOKEN + 1
+
+    def _report(
+        self, reason: LLMWaitReason, wait: float, attempt: int, detail: str = ""
+    ) -> None:
+        if reason == LLMWaitReason.QUEUED and wait < REPORT_MIN_WAIT_SEC:
+            return
+        payload = LLMQueuePayload(
+            agent_name=self.agent_name,
+            priority=self.priority,
+            reason=reason,
+            wait_sec=round(wait, 3),
+            attempt=attempt,
+            detail=detail,
+        )
+        logger.info(
+            f"[llm] {self.agent_name} ({self.priority}) {reason} "
+            f"{payload.wait_sec}s attempt={attempt} {detail}"
+        )
+        if self.on_wait is not None:
+            self.on_wait(payload)
+
+    async def _backoff(self, e: Exception, attempt: int) -> None:
+        """
+        Sleep before the next attempt, re-raise e if retries are exhausted.
+        """
+        scheduler = get_llm_scheduler()
+        settings = get_settings()
+        if attempt >= settings.llm_max_retries:
+            scheduler.record_failure()
+            raise e
+        cap = min(
+            settings.llm_backoff_max_sec, settings.llm_backoff_base_sec * 2**attempt
+        )
+        delay = max(random.uniform(0, cap), _retry_after(e))
+        if isinstance(e, openai.RateLimitError):
+            scheduler.pause(delay)
+        scheduler.record_retry()
+        self._report(
+            LLMWaitReason.RETRY, delay, attempt + 1, f"{e.__class__.__name__}: {e}"
+        )
+        await asyncio.sleep(delay)
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        scheduler = get_llm_scheduler()
+        estimate = self._estimate(system_instructions, input)
+        attempt = 0
+        while True:
+            wait = await scheduler.acquire(self.priority, estimate)
+            self._report(LLMWaitReason.QUEUED, wait, attempt)
+            try:
+                response = await self.model.get_response(
+                    system_instructions, input, *args, **kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                scheduler.settle(estimate, 0)
+                await self._backoff(e, attempt)
+                attempt += 1
+                continue
+            scheduler.settle(estimate, response.usage.total_tokens)
+            return response
+
+    async def stream_response(
+        self, system_instructions, input, *args, **kwargs
+    ) -> AsyncIterator[Any]:
+        scheduler = get_llm_scheduler()
+        estimate = self._estimate(system_instructions, input)
+        attempt = 0
+        while True:
+            wait = await scheduler.acquire(self.priority, estimate)
+            self._report(LLMWaitReason.QUEUED, wait, attempt)
+            started = False
+            actual = estimate
+            try:
+                async for event in self.model.stream_response(
+                    system_instructions, input, *args, **kwargs
+                ):
+                    started = True
+                    if event.type == "response.completed" and event.response.usage:
+                        actual = event.response.usage.total_tokens
+                    yield event
+            except RETRYABLE_ERRORS as e:
+                scheduler.settle(estimate, 0)
+                if started:
+                    scheduler.record_failure()
+                    raise
+                await self._backoff(e, attempt)
+                attempt += 1
+                continue
+            scheduler.settle(estimate, actual)
+            return
+
+
+class LimitedModelProvider(ModelProvider):
+    """
+    Resolves model names like the default provider (or to the stub / replay
+    model) and wraps them in LimitedModel. One provider per agent run: the
+    turns of the run (handoffs included) replay the same recorded run.
+    """
+
+    def __init__(
+        self,
+        agent_name: str,
+        priority: SessionPriority,
+        on_wait: Callable[[LLMQueuePayload], None] | None = None,
+        recorder: AgentRecorder | None = None,
+    ):
+        self.agent_name = agent_name
+        self.priority = priority
+        self.on_wait = on_wait
+        self.recorder = recorder
+        self._replay_run: ReplayRun | None = None
+
+    def _resolve_model(self, model_name: str | None) -> Model:
+        provider = get_settings().model_provider
+        model: Model
+        if provider == ModelProviderType.STUB:
+            model = StubModel(self.agent_name)
+        elif provider == ModelProviderType.REPLAY:
+            if self._replay_run is None:
+                self._replay_run = get_agent_replayer().next_run(self.agent_name)
+            model = ReplayModel(self._replay_run)
+        else:
+            model = _get_base_provider().get_model(model_name)
+        if self.recorder is not None:
+            model = RecordingModel(model, self.recorder)
+        return model
+
+    def get_model(self, model_name: str | None) -> Model:
+        return LimitedModel(
+            self._resolve_model(model_name),
+            agent_name=self.agent_name,
+            priority=self.priority,
+            on_wait=self.on_wait,
+        )
@@ -1,15 +1,30 @@
 import asyncio
 import json
-from datetime import datetime
+import mimetypes
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Dict, List
 from uuid import uuid4
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 
+from archive_compactor import (
+    get_archive_compactor,
+    list_archived,
+    read_archived,
+    run_compactor,
+)
+from archive_store import get_archive_store
+from archive_writer import get_archive_writer
 from base import (
+    AgentName,
     DonePayload,
     DoneStatus,
     EventType,
@@ -19,17 +34,32 @@ from base import (
     PromptResponse,
     StartedPayload,
     StartedStatus,
+    StepIndexDetail,
+    StepIndexPage,
     SystemError,
     TreeNode,
 )
+from build_cache import get_build_cache
+from build_error_fingerprint import get_build_error_cache
 from build_tree import build_tree
-from config import get_settings
-from context_factory import create_local_context
+from config import get_settings, reload_settings
+from context_factory import create_local_context, release_local_context
+from eslint_cache import get_eslint_cache
+from eslint_service import shutdown_eslint_pool
 from gen_code_handler import handle_gen_code
+from llm_scheduler import get_llm_scheduler
 from logger import logger
 from place_files_handler import handle_place_files
-from prompt_parser import extract_from_prompt, parse_build_check, resolve_placeholders
+from prompt_parser import (
+    extract_from_prompt,
+    parse_build_check,
+    parse_priority,
+    resolve_placeholders,
+)
+from run_metrics import session_totals
 from run_tests_handler import handler_run_tests
+from step_index import get_step_index, index_session_end, index_session_start
+from workspace import get_workspace_manager
 
 DIR_USER = "user"
 
@@ -48,15 +78,30 @@ async def sse_failed_done(message: str, sse_event):
     return await sse_event(EventType.DONE, fainal_payload.model_dump())
 
 
-# Settings
-settings = get_settings()
-
 # Session Store
 sessions: Dict[str, str] = {}
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    settings = get_settings()
+    if settings.workspace_isolation and settings.workspace_pool_size > 0:
+        get_workspace_manager().start_pool(settings.workspace_pool_size)
+    compactor_task = asyncio.create_task(run_compactor())
+    yield
+    # Shutdown
+    compactor_task.cancel()
+    await get_archive_writer().flush()
+    get_archive_writer().shutdown()
+    await shutdown_eslint_pool()
+    if settings.workspace_isolation:
+        await get_workspace_manager().stop_pool()
+
+
 # FastAPI Main
 logger.info("===== Robin start =====")
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -96,6 +141,8 @@ async def stream_service_get(session_id: str):
     logger.debug("stream_service_get called")
     if session_id not in sessions:
         raise HTTPException(status_code=404, detail="session not found")
+    # Settings of this session (see /admin/reload-settings)
+    settings = get_settings()
 
     prompt = sessions.pop(session_id)
     category = extract_from_prompt(prompt, PromptHeaderKey.CATEGORY)
@@ -104,6 +151,8 @@ async def stream_service_get(session_id: str):
     logger.debug(f"build_check_value: {build_check_value}")
     build_check = parse_build_check(build_check_value)
     logger.debug(f"build_check: {build_check}")
+    priority = parse_priority(extract_from_prompt(prompt, PromptHeaderKey.PRIORITY))
+    logger.debug(f"priority: {priority}")
 
     async def generator(prompt: str):
         # Heartbeat
@@ -115,18 +164,19 @@ async def stream_service_get(session_id: str):
         hb = heartbeat()
         yield await hb.__anext__()
 
-        # Start
+        # Start (the StepID is sent once the context and its StepID directory
+        # exist, sessions started in the same second get a suffixed StepID)
         logger.debug("Agents starting ...")
-        now = datetime.now()
-        formatted_time = now.strftime("%Y%m%d-%H%M%S")
-        step_id = f"StepID-{formatted_time}"
-        started_payload = StartedPayload(
-            status=StartedStatus.STARTED, message="Started Tasks", step_id=step_id
-        )
-        yield await sse_event(EventType.STARTED, started_payload.model_dump())
+
+        async def sse_started(step_id: str | None = None) -> str:
+            started_payload = StartedPayload(
+                status=StartedStatus.STARTED, message="Started Tasks", step_id=step_id
+            )
+            return await sse_event(EventType.STARTED, started_payload.model_dump())
 
         if not category:
             logger.error("Category not found")
+            yield await sse_started()
             yield await sse_system_error(
                 error="InvalidPrompt", detail="Category not found", sse_event=sse_event
             )
@@ -136,6 +186,7 @@ async def stream_service_get(session_id: str):
         if category == PromptCategory.GEN_CODE:
             if build_check is None:
                 logger.error("Invalid or not specified BuildCheck value")
+                yield await sse_started()
                 yield await sse_system_error(
                     error="InvalidPrompt",
                     detail="Invalid or not specified BuildCheck value (expected: - BuildCheck: On/Off)",
@@ -145,11 +196,15 @@ async def stream_service_get(session_id: str):
                 return
 
         try:
-            context = create_local_context(
-                category=category, build_check=build_check, settings=settings
+            context = await create_local_context(
+                category=category,
+                build_check=build_check,
+                settings=settings,
+                priority=priority,
             )
         except Exception as e:
             logger.error(f"create_local_context error: {e}")
+            yield await sse_started()
             yield await sse_system_error(
                 error="ContextError",
                 detail=str(e),
@@ -158,11 +213,17 @@ async def stream_service_get(session_id: str):
             yield await sse_failed_done("Context error", sse_event=sse_event)
             return
         logger.debug(f"context: {context}")
+        yield await sse_started(context.step_id)
+        await asyncio.to_thread(index_session_start, context, prompt)
 
         try:
             resolved_prompt = resolve_placeholders(prompt=prompt, context=context)
         except Exception as e:
             logger.error("_resolve_placeholders failed")
+            await asyncio.to_thread(
+                index_session_end, context, DoneStatus.FAILED, "Invalid prompt"
+            )
+            await release_local_context(context, settings)
             yield await sse_system_error(
                 error="InvalidPrompt",
                 detail=str(e),
@@ -180,6 +241,10 @@ async def stream_service_get(session_id: str):
         handler = handler_map.get(category)  # type: ignore
         if not handler:
             logger.error("InvalidCategory")
+            await asyncio.to_thread(
+                index_session_end, context, DoneStatus.FAILED, "Invalid category"
+            )
+            await release_local_context(context, settings)
             yield await sse_system_error(
                 error="InvalidCategory",
                 detail="Unknown category: {category}",
@@ -188,9 +253,34 @@ async def stream_service_get(session_id: str):
             yield await sse_failed_done("Invalid category", sse_event=sse_event)
             return
 
+        # DONE payload of the handler gets the session metrics totals, and
+        # is sent once the archive of the step is complete and indexed
+        done_sent = False
+
+        async def session_sse_event(event_name: str, payload: dict) -> str:
+            nonlocal done_sent
+            if event_name == EventType.DONE:
+                await get_archive_writer().flush(context.stepid_dir)
+                await asyncio.to_thread(
+                    index_session_end,
+                    context,
+                    payload.get("status"),
+                    payload.get("message"),
+                )
+                done_sent = True
+                payload = {**payload, "metrics": session_totals(context).model_dump()}
+            return await sse_event(event_name, payload)
+
         logger.trace(f"handler call: resolved_prompt: {resolved_prompt}")
-        async for event in handler(resolved_prompt, context, settings, sse_event):
-            yield event
+        try:
+            async for event in handler(
+                resolved_prompt, context, settings, session_sse_event
+            ):
+                yield event
+        finally:
+            if not done_sent:
+                await asyncio.to_thread(index_session_end, context)
+            await release_local_context(context, settings)
 
     headers = {
         "Cache-Control": "no-cache, no-transform",
@@ -204,10 +294,50 @@ async def stream_service_get(session_id: str):
     )
 
 
+# Settings reload (.env / environment), used by the sessions started after it
+@app.post("/admin/reload-settings")
+def post_reload_settings():
+    logger.info("[admin] reload settings")
+    try:
+        settings = reload_settings()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    return {
+        "agents": {
+            name.value: settings.agent_config(name).model_dump() for name in AgentName
+        }
+    }
+
+
+# Metrics
+@app.get("/metrics")
+def get_metrics():
+    logger.debug("get_metrics called")
+    metrics = {
+        "eslint_cache": get_eslint_cache().stats().model_dump(),
+        "build_cache": get_build_cache().stats().model_dump(),
+        "build_error_cache": get_build_error_cache().stats().model_dump(),
+        "llm_scheduler": get_llm_scheduler().stats().model_dump(),
+        "archive": get_archive_store().stats().model_dump(),
+        "archive_queue": get_archive_writer().stats().model_dump(),
+        "archive_compactor": get_archive_compactor().stats().model_dump(),
+    }
+    if get_settings().workspace_isolation:
+        metrics["workspace_pool"] = get_workspace_manager().stats().model_dump()
+    return metrics
+
+
 @app.get("/artifacts/results/screenshot/{filename}")
-def get_screenshot(filename: str):
+def get_screenshot(filename: str, step_id: str | None = None):
     logger.debug("get_screenshot called")
-    path = settings.output_dir / "results" / "screenshot" / filename
+    settings = get_settings()
+    output_dir = settings.output_dir
+    if step_id:
+        # screenshot in a per-session workspace (while the session is running)
+        workspace_dir = get_workspace_manager(settings).lookup(step_id)
+        if workspace_dir is not None:
+            output_dir = workspace_dir
+    path = output_dir / "results" / "screenshot" / filename
     logger.debug(f"path: {path}")
     if not path.exists():
         raise HTTPException(404)
@@ -216,6 +346,81 @@ def get_screenshot(filename: str):
     )
 
 
+# Archive (step directories and compacted bundles)
+@app.get("/archive/{step_id}", response_model=List[str])
+def get_archive_filelist(step_id: str):
+    logger.debug(f"get_archive_filelist step_id: {step_id}")
+    try:
+        return list_archived(step_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+
+@app.get("/archive/{step_id}/{path:path}")
+def get_archived_file(step_id: str, path: str):
+    logger.debug(f"get_archived_file step_id: {step_id}, path: {path}")
+    try:
+        content = read_archived(step_id, path)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return Response(content=content, media_type=media_type)
+
+
+# Step history index
+@app.get("/steps", response_model=StepIndexPage)
+def get_steps(
+    category: str | None = None,
+    status: str | None = None,
+    prompt_hash: str | None = None,
+    build_passed: bool | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    min_eslint_errors: int | None = None,
+    min_tests_ng: int | None = None,
+    sort: str = "started_at",
+    desc: bool = True,
+    limit: int = 50,
+    offset: int = 0,
+):
+    logger.debug("get_steps called")
+    index = get_step_index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="step index is disabled")
+    filters = {
+        "category": category,
+        "status": status,
+        "prompt_hash": prompt_hash,
+        "build_passed": build_passed,
+        "since": since,
+        "until": until,
+        "min_eslint_errors": min_eslint_errors,
+        "min_tests_ng": min_tests_ng,
+    }
+    try:
+        return index.query(
+            filters, sort=sort, descending=desc, limit=limit, offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+
+@app.get("/steps/{step_id}", response_model=StepIndexDetail)
+def get_step(step_id: str):
+    logger.debug(f"get_step step_id: {step_id}")
+    index = get_step_index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="step index is disabled")
+    entry = index.get(step_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Step not found: {step_id}")
+    return entry
+
+
 @app.get(
     "/autorun/filelist", response_model=List[TreeNode], summary="Get AutoRun file list"
 )
@@ -223,7 +428,7 @@ def get_autorun_filelist(autorun_id: str):
     logger.debug(f"get_autorun_filelist autorun_id: {autorun_id}")
 
     project_root = Path.cwd()
-    target_dir = project_root / settings.prompts_dir / DIR_USER / autorun_id
+    target_dir = project_root / get_settings().prompts_dir / DIR_USER / autorun_id
 
     if not target_dir.exists() or not target_dir.is_dir():
         not_found_message = (
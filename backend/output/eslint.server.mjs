@@ -0,0 +1,81 @@
+import path from "node:path";
+import process from "node:process";
+import readline from "node:readline";
+import { ESLint } from "eslint";
+
+/**
+ * Long-lived ESLint worker for the backend.
+ *
+ * Protocol (one JSON object per line):
+ *   stdin  : {"id": 1, "cwd": "/path/to/project", "file": "/path/to/app/page.tsx",
+ *             "config_hash": "..."}
+ *   stdout : {"id": 1, "ok": true, "output": "<eslint.formatter.mjs output>"}
+ *            {"id": 1, "ok": false, "error": "..."}
+ *
+ * ESLint instances are cached per cwd (per-session workspace) and re-created
+ * when config_hash changes. Least recently used instances are dropped.
+ */
+const FORMATTER_FILE = "eslint.formatter.mjs";
+const MAX_INSTANCES = 8;
+
+const instances = new Map();
+
+function send(message) {
+  process.stdout.write(`${JSON.stringify(message)}\n`);
+}
+
+async function getInstance(cwd, configHash) {
+  const cached = instances.get(cwd);
+  instances.delete(cwd);
+  if (cached && cached.configHash === configHash) {
+    instances.set(cwd, cached);
+    return cached;
+  }
+  const eslint = new ESLint({ cwd });
+  const formatter = await eslint.loadFormatter(path.join(cwd, FORMATTER_FILE));
+  const instance = { configHash, eslint, formatter };
+  instances.set(cwd, instance);
+  if (instances.size > MAX_INSTANCES) {
+    instances.delete(instances.keys().next().value);
+  }
+  return instance;
+}
+
+async function handle(request) {
+  const { eslint, formatter } = await getInstance(
+    request.cwd,
+    request.config_hash,
+  );
+  const results = await eslint.lintFiles([request.file]);
+  const output = await formatter.format(results);
+  return output;
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+let chain = Promise.resolve();
+
+rl.on("line", (line) => {
+  if (!line.trim()) return;
+  // Requests are processed one by one in arrival order
+  chain = chain.then(async () => {
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (err) {
+      send({ id: null, ok: false, error: `Invalid request: ${err.message}` });
+      return;
+    }
+    try {
+      const output = await handle(request);
+      send({ id: request.id, ok: true, output });
+    } catch (err) {
+      send({ id: request.id, ok: false, error: String(err?.stack ?? err) });
+    }
+  });
+});
+
+rl.on("close", () => {
+  chain.then(() => process.exit(0));
+});
+
+send({ ready: true });
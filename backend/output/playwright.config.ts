@@ -1,7 +1,9 @@
 import { defineConfig, devices } from "@playwright/test";
 import path from "path";
 import customConfig from "./playwright.customconfig.json";
-const base_url = customConfig.base_url;
+// PLAYWRIGHT_PORT: set by the backend for per-session workspaces
+const port = process.env.PLAYWRIGHT_PORT;
+const base_url = port ? `http://localhost:${port}` : customConfig.base_url;
 const screenshot_dir = customConfig.screenshot_dir;
 const results = path.join(__dirname, customConfig.results);
 const playwright_report_file = customConfig.playwright_report_file;
@@ -44,7 +46,7 @@ export default defineConfig({
   ],
 
   webServer: {
-    command: "npm run dev",
+    command: port ? `npx next dev --turbopack -p ${port}` : "npm run dev",
     url: base_url,
     reuseExistingServer: false,
   },
@@ -56,5 +58,6 @@ export default defineConfig({
         outputFile: path.join(results, playwright_report_file),
       },
     ],
+    ["./playwright.progress-reporter.mjs"],
   ],
 });
@@ -0,0 +1,56 @@
+import path from "node:path";
+import stripAnsi from "strip-ansi";
+
+/**
+ * Progress reporter for the backend.
+ * Writes one line per test event to stdout in the form:
+ *   @@progress {"status": "...", ...}
+ * The backend parses these lines while the run is in progress.
+ */
+const PROGRESS_PREFIX = "@@progress ";
+
+function emit(event) {
+  process.stdout.write(`${PROGRESS_PREFIX}${JSON.stringify(event)}\n`);
+}
+
+function testInfo(test) {
+  return {
+    title: test.title,
+    project: test.parent.project()?.name ?? null,
+    file: path.basename(test.location.file),
+  };
+}
+
+export default class ProgressReporter {
+  onBegin(config, suite) {
+    emit({ status: "begin", total: suite.allTests().length });
+  }
+
+  onTestBegin(test) {
+    emit({ status: "started", ...testInfo(test) });
+  }
+
+  onTestEnd(test, result) {
+    let status = "failed";
+    if (result.status === "skipped") {
+      status = "skipped";
+    } else if (test.ok()) {
+      status = "passed";
+    }
+    const message = result.error?.message;
+    emit({
+      status,
+      ...testInfo(test),
+      duration: result.duration,
+      detail: message ? stripAnsi(message).split("\n")[0] : null,
+    });
+  }
+
+  onEnd(result) {
+    emit({ status: "end", duration: result.duration, detail: result.status });
+  }
+
+  printsToStdio() {
+    return true;
+  }
+}
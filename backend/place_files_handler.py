@@ -1,8 +1,12 @@
-from typing import Awaitable, Callable
+import asyncio
+import shutil
+import time
+from typing import AsyncIterator, Awaitable, Callable
 
-from agents import ItemHelpers, Runner
+from agents import ItemHelpers
 
 from agent_logger import AgentLogger
+from agent_runner import AgentRun
 from base import (
     AgentResult,
     AgentResultPayload,
@@ -11,15 +15,104 @@ from base import (
     DoneStatus,
     EventType,
     LocalContext,
+    PlaceFilesHeader,
+    SSEPayload,
     SystemError,
 )
 from config import Settings
 from custom_agents import get_place_files_agent
+from file_placer import place_files_bulk, resolve_place_files
 from logger import logger
+from prompt_parser import parse_place_files_header
+from run_metrics import step_metrics
 
 SSEEventCallable = Callable[[str, dict], Awaitable[str]]
 
 
+async def _place_files_direct(
+    header: PlaceFilesHeader,
+    context: LocalContext,
+) -> AgentResultPayload:
+    """
+    Place files with the values of the PlaceFiles header (no agent).
+    """
+    logger.debug(f"place files direct: {header}")
+    start = time.perf_counter()
+    try:
+        pairs = resolve_place_files(
+            context, header.from_dir, header.to_dir, header.files
+        )
+        placed = await asyncio.to_thread(place_files_bulk, pairs)
+    except (OSError, shutil.Error, ValueError) as e:
+        return AgentResultPayload(result=False, error_detail=str(e))
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Placed {len(placed)} files in {duration_ms:.3f}ms")
+    return AgentResultPayload(
+        result=True,
+        error_detail="",
+        files=placed,
+        duration_ms=round(duration_ms, 3),
+    )
+
+
+async def _place_files_agent(
+    prompt: str,
+    context: LocalContext,
+) -> AsyncIterator[SSEPayload]:
+    """
+    Run PlaceFilesAgent, yields AGENT_UPDATE / AGENT_RESULT events.
+    """
+    place_files_agent = get_place_files_agent()
+    result = AgentRun(
+        agent=place_files_agent,
+        input=prompt,
+        context=context,
+        hooks=AgentLogger(),
+    )
+    async for event in result.stream_events():
+        if event.type == "agent_updated_stream_event":
+            logger.debug(f"Agent updated: {event.new_agent.name}")
+            agent_name = event.new_agent.name
+            agent_update_payload = AgentUpdatePayload(agent_name=agent_name)
+            yield SSEPayload(
+                event=EventType.AGENT_UPDATE, payload=agent_update_payload.model_dump()
+            )
+        elif event.type == "llm_queue_event":
+            yield SSEPayload(
+                event=EventType.LLM_QUEUE, payload=event.payload.model_dump()
+            )
+        elif event.type == "run_item_stream_event":
+            if event.item.type == "tool_call_item":
+                logger.debug("Event: tool_call_item")
+            elif event.item.type == "tool_call_output_item":
+                logger.debug(f"Event: tool_call_output_item : {event.item.output}")
+                output = event.item.output
+                if isinstance(output, AgentResult):
+                    place_files_result = output.result
+                    place_files_error_detail = output.error_detail
+                    logger.debug(
+                        f"place_files_result: {place_files_result}, place_files_error_detail: {place_files_error_detail}"
+                    )
+                    if place_files_result:
+                        agent_result_payload = AgentResultPayload(
+                            result=True, error_detail=""
+                        )
+                    else:
+                        agent_result_payload = AgentResultPayload(
+                            result=False, error_detail=place_files_error_detail
+                        )
+                    yield SSEPayload(
+                        event=EventType.AGENT_RESULT,
+                        payload=agent_result_payload.model_dump(),
+                    )
+
+            elif event.item.type == "message_output_item":
+                logger.debug("Event: message_output_item")
+                logger.debug(
+                    f"Message Output:\n {ItemHelpers.text_message_output(event.item)}"
+                )
+
+
 async def handle_place_files(
     prompt: str,
     context: LocalContext,
@@ -33,59 +126,24 @@ async def handle_place_files(
         final_payload = DonePayload(
             status=DoneStatus.COMPLETED, message="PlaceFiles completed"
         )
-        place_files_agent = get_place_files_agent()
-        result = Runner.run_streamed(
-            starting_agent=place_files_agent,
-            input=prompt,
-            context=context,
-            max_turns=context.max_turns,
-            hooks=AgentLogger(),
-        )
-        async for event in result.stream_events():
-            if event.type == "agent_updated_stream_event":
-                logger.debug(f"Agent updated: {event.new_agent.name}")
-                agent_name = event.new_agent.name
-                agent_update_payload = AgentUpdatePayload(agent_name=agent_name)
-                yield await sse_event(
-                    EventType.AGENT_UPDATE, agent_update_payload.model_dump()
+        header = parse_place_files_header(prompt)
+        if header is not None:
+            agent_result_payload = await _place_files_direct(header, context)
+            if not agent_result_payload.result:
+                final_payload = DonePayload(
+                    status=DoneStatus.FAILED, message="PlaceFiles Failed"
                 )
-            elif event.type == "run_item_stream_event":
-                if event.item.type == "tool_call_item":
-                    logger.debug("Event: tool_call_item")
-                elif event.item.type == "tool_call_output_item":
-                    logger.debug(f"Event: tool_call_output_item : {event.item.output}")
-                    output = event.item.output
-                    if isinstance(output, AgentResult):
-                        place_files_result = output.result
-                        place_files_error_detail = output.error_detail
-                        logger.debug(
-                            f"place_files_result: {place_files_result}, place_files_error_detail: {place_files_error_detail}"
-                        )
-                        if place_files_result:
-                            agent_result_payload = AgentResultPayload(
-                                result=True, error_detail=""
-                            )
-                            yield await sse_event(
-                                EventType.AGENT_RESULT,
-                                agent_result_payload.model_dump(),
-                            )
-                        else:
-                            agent_result_payload = AgentResultPayload(
-                                result=False, error_detail=place_files_error_detail
-                            )
-                            yield await sse_event(
-                                EventType.AGENT_RESULT,
-                                agent_result_payload.model_dump(),
-                            )
-                            final_payload = DonePayload(
-                                status=DoneStatus.FAILED, message="PlaceFiles Failed"
-                            )
-
-                elif event.item.type == "message_output_item":
-                    logger.debug("Event: message_output_item")
-                    logger.debug(
-                        f"Message Output:\n {ItemHelpers.text_message_output(event.item)}"
+            yield await sse_event(
+                EventType.AGENT_RESULT, agent_result_payload.model_dump()
+            )
+        else:
+            logger.info(f"[{category}]: No PlaceFiles header, use PlaceFilesAgent")
+            async for ev in _place_files_agent(prompt, context):
+                if ev.event == EventType.AGENT_RESULT and not ev.payload["result"]:
+                    final_payload = DonePayload(
+                        status=DoneStatus.FAILED, message="PlaceFiles Failed"
                     )
+                yield await sse_event(ev.event, ev.payload)
 
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
@@ -96,5 +154,9 @@ async def handle_place_files(
             status=DoneStatus.FAILED, message="place files error occurred"
         )
 
+    metrics = step_metrics(context, "place_files")
+    if metrics is not None:
+        yield await sse_event(EventType.METRICS, metrics.model_dump())
+
     logger.info(f"[{category}]: PlaceFiles Handler Completed")
     yield await sse_event(EventType.DONE, final_payload.model_dump())
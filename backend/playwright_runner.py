@@ -1,15 +1,61 @@
-import subprocess
+import asyncio
+import json
+import os
 from pathlib import Path
 from typing import List, Union
 
 from agents import RunContextWrapper
+from pydantic import ValidationError
 
-from base import RunPlaywrightFunctionResult, ScreenshotInfo
-from common import archive
+from base import (
+    EventType,
+    RunPlaywrightFunctionResult,
+    ScreenshotInfo,
+    SSEPayload,
+    TestRunPayload,
+)
+from common import archive, find_free_port
+from config import get_settings
 from logger import logger
 
+# Line prefix written by output/playwright.progress-reporter.mjs
+PROGRESS_PREFIX = "@@progress "
+STDOUT_LINE_LIMIT = 1024 * 1024
+TERMINATE_TIMEOUT_SEC = 5.0
 
-def run_playwright(
+
+async def _emit_progress(ctx: RunContextWrapper, data: str) -> None:
+    """
+    Parse a progress line and forward it as a TEST_RUN event.
+    """
+    try:
+        payload = TestRunPayload(**json.loads(data))
+    except (json.JSONDecodeError, TypeError, ValidationError) as e:
+        logger.warning(f"Invalid progress line: {data.strip()}, {e}")
+        return
+    logger.debug(f"test_run: {payload}")
+    queue: asyncio.Queue | None = ctx.context.event_queue
+    if queue is None:
+        return
+    await queue.put(SSEPayload(event=EventType.TEST_RUN, payload=payload.model_dump()))
+
+
+async def _terminate(process: asyncio.subprocess.Process) -> None:
+    """
+    Stop a running playwright process (terminate, then kill on timeout).
+    """
+    if process.returncode is not None:
+        return
+    logger.debug(f"terminate playwright process: pid={process.pid}")
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=TERMINATE_TIMEOUT_SEC)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run_playwright(
     ctx: RunContextWrapper,
     test_dir: str,
     test_file: str,
@@ -64,6 +110,8 @@ def run_playwright(
             screenshot_updated = True
         logger.debug(f"command: {command}")
         relative_url = f"/artifacts/results/screenshot/{screenshot_file}"
+        if get_settings().workspace_isolation:
+            relative_url += f"?step_id={ctx.context.step_id}"
         logger.debug(f"relative_url: {relative_url}")
         ctx.context.screenshots.append(
             ScreenshotInfo(
@@ -71,32 +119,53 @@ def run_playwright(
             )
         )
 
+    # Per-session workspaces run concurrently: each Playwright run starts
+    # its web server on its own port (see output/playwright.config.ts)
+    env = None
+    if get_settings().workspace_isolation:
+        port = find_free_port()
+        logger.debug(f"PLAYWRIGHT_PORT: {port}")
+        env = {**os.environ, "PLAYWRIGHT_PORT": str(port)}
+
     # Execute npx playwright command
     flg_404 = False
     try:
-        process = subprocess.Popen(
-            command,
+        process = await asyncio.create_subprocess_exec(
+            *command,
             cwd=output_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            limit=STDOUT_LINE_LIMIT,
         )
         error_detected = None
         if process.stdout is None:
             raise RuntimeError("Failed to capture Playwright stdout")
-        for line in process.stdout:
-            logger.debug(f"process.stdout line: {line}")
-            if '"status":404' in line:
-                error_detected = "Detected 404 in test output"
-                flg_404 = True
-                break
-            if "Error:" in line and "already used" in line:
-                error_detected = "Playwright server port already in use"
-                break
-            if "error:" in line:
-                error_detected = "playwright command execution failed"
-                break
+        try:
+            while True:
+                raw = await process.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", errors="replace")
+                logger.debug(f"process.stdout line: {line}")
+                if line.startswith(PROGRESS_PREFIX):
+                    await _emit_progress(ctx, line[len(PROGRESS_PREFIX) :])
+                    continue
+                if '"status":404' in line:
+                    error_detected = "Detected 404 in test output"
+                    flg_404 = True
+                    break
+                if "Error:" in line and "already used" in line:
+                    error_detected = "Playwright server port already in use"
+                    break
+                if "error:" in line:
+                    error_detected = "playwright command execution failed"
+                    break
+        finally:
+            # Stop early on detected errors (or cancellation) without
+            # waiting for the whole test run
+            if not process.stdout.at_eof():
+                await _terminate(process)
         if error_detected:
             logger.debug(f"error detectd : {error_detected}")
             func_result = RunPlaywrightFunctionResult(
@@ -109,8 +178,7 @@ def run_playwright(
         func_result = RunPlaywrightFunctionResult(result=False, detail=err_msg)
         return func_result
 
-    process.wait()
-    return_code = process.returncode
+    return_code = await process.wait()
     err_msg = f"Playwright exited with return code: {return_code}"
     logger.debug(err_msg)
 
@@ -1,10 +1,17 @@
+import json
 import re
 from pathlib import Path
 from typing import Optional
 
 import yaml
 
-from base import LocalContext
+from base import (
+    LocalContext,
+    PlaceFilesHeader,
+    PromptHeaderKey,
+    RunTestsHeader,
+    SessionPriority,
+)
 from config import get_settings
 from logger import logger
 
@@ -87,6 +94,101 @@ def parse_build_check(value: Optional[str]) -> bool:
     return False
 
 
+def parse_priority(value: Optional[str]) -> SessionPriority:
+    """
+    Convert Priority header value to SessionPriority.
+    Returns:
+        BATCH       : "batch"
+        INTERACTIVE : "interactive", not specified or unknown
+    """
+    if value is None:
+        return SessionPriority.INTERACTIVE
+
+    v = value.strip().lower()
+    if v == SessionPriority.BATCH:
+        return SessionPriority.BATCH
+    return SessionPriority.INTERACTIVE
+
+
+def parse_list_value(value: str) -> list[str]:
+    """
+    Convert a header value to a list of strings.
+    - JSON list : ["a.png", "b.png"]
+    - Comma separated : a.png, b.png
+    """
+    v = value.strip()
+    if v.startswith("["):
+        try:
+            items = json.loads(v)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid list value: {value}") from e
+        if not isinstance(items, list):
+            raise ValueError(f"Invalid list value: {value}")
+        return [str(item).strip() for item in items if str(item).strip()]
+    return [item.strip().strip("'\"") for item in v.split(",") if item.strip()]
+
+
+def parse_run_tests_header(prompt: str) -> Optional[RunTestsHeader]:
+    """
+    Parse the RunTests fields of the header section.
+      - TestDir: tests
+      - TestFile: home.spec.ts
+      - Project: chromium-main
+      - ScreenshotFiles: ["home.png"]
+    Returns:
+        RunTestsHeader : all fields specified
+        None           : no field specified (fallback to RunTestsAgent)
+    Raises:
+        ValueError     : some fields are missing
+    """
+    fields = parse_header_fields(extract_header_section(prompt))
+    keys = [
+        PromptHeaderKey.TEST_DIR,
+        PromptHeaderKey.TEST_FILE,
+        PromptHeaderKey.PROJECT,
+        PromptHeaderKey.SCREENSHOT_FILES,
+    ]
+    values = {key: fields.get(key) for key in keys}
+    if all(v is None for v in values.values()):
+        return None
+    missing = [key.value for key, v in values.items() if not v]
+    if missing:
+        raise ValueError(f"RunTests header field(s) missing: {', '.join(missing)}")
+    return RunTestsHeader(
+        test_dir=values[PromptHeaderKey.TEST_DIR],
+        test_file=values[PromptHeaderKey.TEST_FILE],
+        project=values[PromptHeaderKey.PROJECT],
+        screenshot_files=parse_list_value(values[PromptHeaderKey.SCREENSHOT_FILES]),
+    )
+
+
+def parse_place_files_header(prompt: str) -> Optional[PlaceFilesHeader]:
+    """
+    Parse the PlaceFiles fields of the header section.
+      - FromDir: output/prepare
+      - ToDir: output/public
+      - Files: ["hotel.png", "icons/*.svg"]
+    Returns:
+        PlaceFilesHeader : all fields specified
+        None             : no field specified (fallback to PlaceFilesAgent)
+    Raises:
+        ValueError       : some fields are missing
+    """
+    fields = parse_header_fields(extract_header_section(prompt))
+    keys = [PromptHeaderKey.FROM_DIR, PromptHeaderKey.TO_DIR, PromptHeaderKey.FILES]
+    values = {key: fields.get(key) for key in keys}
+    if all(v is None for v in values.values()):
+        return None
+    missing = [key.value for key, v in values.items() if not v]
+    if missing:
+        raise ValueError(f"PlaceFiles header field(s) missing: {', '.join(missing)}")
+    return PlaceFilesHeader(
+        from_dir=values[PromptHeaderKey.FROM_DIR],
+        to_dir=values[PromptHeaderKey.TO_DIR],
+        files=parse_list_value(values[PromptHeaderKey.FILES]),
+    )
+
+
 def load_agents_prompt() -> dict:
     logger.debug("load_agents_prompt called")
     settings = get_settings()
@@ -0,0 +1,187 @@
+"""
+On-disk result cache
+
+Entries are directories under cache_dir (<key[:2]>/<key>/) holding one or
+more files. Entries are evicted in LRU order when the total size exceeds
+max_bytes, and expire ttl_sec seconds after they were stored (if set).
+Hit/miss counters are kept in memory.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from base import CacheStats
+from logger import logger
+
+TMP_DIR = ".tmp"
+
+
+class DiskCache:
+    def __init__(
+        self,
+        name: str,
+        cache_dir: Path,
+        max_bytes: int,
+        ttl_sec: float | None = None,
+    ):
+        self.name = name
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        # key -> (size, last access time, stored time)
+        self._index: dict[str, tuple[int, float, float]] | None = None
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+    @staticmethod
+    def _stored_time(path: Path) -> float:
+        # Files in an entry are not touched after put (get touches the dir)
+        mtimes = [p.stat().st_mtime for p in path.iterdir() if p.is_file()]
+        return min(mtimes) if mtimes else path.stat().st_mtime
+
+    def _load_index(self) -> dict[str, tuple[int, float, float]]:
+        if self._index is not None:
+            return self._index
+        index: dict[str, tuple[int, float, float]] = {}
+        if self.cache_dir.is_dir():
+            for prefix_dir in self.cache_dir.iterdir():
+                if not prefix_dir.is_dir() or prefix_dir.name == TMP_DIR:
+                    continue
+                for entry in prefix_dir.iterdir():
+                    if entry.is_dir():
+                        index[entry.name] = (
+                            self._dir_size(entry),
+                            entry.stat().st_mtime,
+                            self._stored_time(entry),
+                        )
+        logger.debug(f"[{self.name}] cache index loaded: entries={len(index)}")
+        self._index = index
+        return index
+
+    def get(self, key: str) -> Path | None:
+        """
+        Returns the entry directory for key, or None on miss.
+        The entry may be evicted once the lock is released, use read() to
+        get its contents.
+        """
+        with self._lock:
+            return self._get(key)
+
+    def read(self, key: str) -> dict[str, bytes] | None:
+        """
+        Returns the files (filename -> content) of the entry for key, read
+        under the lock, or None on miss.
+        """
+        with self._lock:
+            entry_dir = self._get(key)
+            if entry_dir is None:
+                return None
+            try:
+                return {p.name: p.read_bytes() for p in entry_dir.iterdir()}
+            except OSError as e:
+                self._load_index().pop(key, None)
+                self._hits -= 1
+                self._misses += 1
+                logger.warning(f"[{self.name}] cache entry unreadable: {key}, {e}")
+                return None
+
+    def _get(self, key: str) -> Path | None:
+        index = self._load_index()
+        entry_dir = self._entry_dir(key)
+        if key not in index or not entry_dir.is_dir():
+            index.pop(key, None)
+            self._misses += 1
+            logger.debug(f"[{self.name}] cache miss: {key}")
+            return None
+        now = time.time()
+        size, _, stored = index[key]
+        if self.ttl_sec is not None and now - stored > self.ttl_sec:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            del index[key]
+            self._expirations += 1
+            self._misses += 1
+            logger.debug(f"[{self.name}] cache expired: {key}")
+            return None
+        os.utime(entry_dir, (now, now))
+        index[key] = (size, now, stored)
+        self._hits += 1
+        logger.debug(f"[{self.name}] cache hit: {key}")
+        return entry_dir
+
+    def put(self, key: str, files: dict[str, bytes]) -> Path:
+        """
+        Stores files (filename -> content) as the entry for key.
+        """
+        with self._lock:
+            index = self._load_index()
+            tmp_dir = self.cache_dir / TMP_DIR / uuid.uuid4().hex
+            tmp_dir.mkdir(parents=True)
+            size = 0
+            for filename, content in files.items():
+                (tmp_dir / filename).write_bytes(content)
+                size += len(content)
+
+            entry_dir = self._entry_dir(key)
+            entry_dir.parent.mkdir(parents=True, exist_ok=True)
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+            now = time.time()
+            index[key] = (size, now, now)
+            self._stores += 1
+            logger.debug(f"[{self.name}] cache store: {key}, size={size}")
+
+            self._evict(index)
+            return entry_dir
+
+    def _evict(self, index: dict[str, tuple[int, float, float]]) -> None:
+        if self.ttl_sec is not None:
+            now = time.time()
+            for key, (_, _, stored) in list(index.items()):
+                if now - stored > self.ttl_sec:
+                    shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                    del index[key]
+                    self._expirations += 1
+                    logger.debug(f"[{self.name}] cache expired: {key}")
+        total = sum(size for size, _, _ in index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _, _) in sorted(index.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del index[key]
+            total -= size
+            self._evictions += 1
+            logger.debug(f"[{self.name}] cache evict: {key}")
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            index = self._load_index()
+            lookups = self._hits + self._misses
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=self._hits / lookups if lookups else 0.0,
+                stores=self._stores,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                entries=len(index),
+                size_bytes=sum(size for size, _, _ in index.values()),
+                max_bytes=self.max_bytes,
+            )
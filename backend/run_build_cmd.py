@@ -1,9 +1,12 @@
+import asyncio
 import json
+import re
 from pathlib import Path
 from subprocess import CompletedProcess
 from typing import List
 
 from base import FunctionResult, LocalContext
+from build_cache import BUILD_RESULT_FILE, build_tree_hash, get_build_cache
 from common import archive
 from config import Settings
 from logger import logger
@@ -11,6 +14,8 @@ from run_command import run_cmd
 
 BUILD_LOGFILE = "build.log"
 BUILD_DIR = Path("build")
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+LINE_COL_RE = re.compile(r":\d+:\d+")
 
 
 def load_json(path: Path) -> dict:
@@ -22,6 +27,81 @@ def extract_stderr_messages(records: List[dict]) -> List[str]:
     return [r.get("message", "") for r in records if r.get("stream") == "stderr"]
 
 
+def normalize_stderr_messages(messages: List[str]) -> frozenset[str]:
+    """
+    Set of stderr messages without colors, line/column numbers and
+    redundant whitespace (line numbers shift when a file is fixed).
+    """
+    normalized = set()
+    for message in messages:
+        message = ANSI_RE.sub("", message)
+        message = LINE_COL_RE.sub(":<line>:<col>", message)
+        message = " ".join(message.split())
+        if message:
+            normalized.add(message)
+    return frozenset(normalized)
+
+
+def build_error_set(result: FunctionResult) -> frozenset[str]:
+    """
+    Normalized stderr messages of a failed run_build result.
+    """
+    if result.messages is not None:
+        return normalize_stderr_messages(result.messages)
+    return normalize_stderr_messages((result.detail or "").splitlines())
+
+
+def load_build_report_file(context: LocalContext, settings: Settings) -> str:
+    """
+    Returns build_report_file defined in build.customconfig.json
+    """
+    customconfig_dir = context.output_dir
+    customconfig_file = settings.build_customconfig_file
+    customconfig_path = customconfig_dir / customconfig_file
+    logger.debug(f"customconfig_path: {customconfig_path}")
+
+    try:
+        with open(customconfig_path, "r", encoding="utf-8") as f:
+            customconfig = json.load(f)
+    except Exception as e:
+        raise ValueError(f"Failed to build-customconfig file: {e}") from e
+    build_report_file = customconfig.get("build_report_file")
+    if not build_report_file:
+        raise ValueError("Failed to get build_report_file")
+    return build_report_file
+
+
+def _restore_from_cache(
+    context: LocalContext, build_dir: Path, build_report_file: str, tree_hash: str
+) -> FunctionResult | None:
+    """
+    Restore build.log / build report from the build cache.
+    Returns the cached FunctionResult, or None on cache miss.
+    """
+    files = get_build_cache().read(tree_hash)
+    filenames = (BUILD_RESULT_FILE, BUILD_LOGFILE, build_report_file)
+    if files is None or any(filename not in files for filename in filenames):
+        return None
+    logger.info(f"Build cache hit: tree_hash={tree_hash}")
+    for filename in (BUILD_LOGFILE, build_report_file):
+        (build_dir / filename).write_bytes(files[filename])
+        archive(build_dir, filename, context.stepid_dir, BUILD_DIR)
+    return FunctionResult.model_validate_json(files[BUILD_RESULT_FILE])
+
+
+def _store_to_cache(
+    build_dir: Path, build_report_file: str, tree_hash: str, result: FunctionResult
+) -> None:
+    get_build_cache().put(
+        tree_hash,
+        {
+            BUILD_RESULT_FILE: result.model_dump_json().encode("utf-8"),
+            BUILD_LOGFILE: (build_dir / BUILD_LOGFILE).read_bytes(),
+            build_report_file: (build_dir / build_report_file).read_bytes(),
+        },
+    )
+
+
 async def run_build(context: LocalContext, settings: Settings) -> FunctionResult:
     """
     Case-1: result=False, abort_flg=False  # retryable
@@ -39,12 +119,32 @@ async def run_build(context: LocalContext, settings: Settings) -> FunctionResult
     output_path = build_dir / BUILD_LOGFILE
     logger.debug(f"output_path: {output_path}")
 
+    try:
+        build_report_file = load_build_report_file(context, settings)
+    except ValueError as e:
+        # Case-2: result=False, abort_flg=True   # abort
+        detail = str(e)
+        logger.error(detail)
+        return FunctionResult(result=False, abort_flg=True, detail=detail)
+    logger.debug(f"build_report_file: {build_report_file}")
+
+    # Build cache (same build inputs -> same result)
+    tree_hash: str | None = None
+    if settings.build_cache:
+        tree_hash = await asyncio.to_thread(build_tree_hash, context.output_dir)
+        logger.debug(f"tree_hash: {tree_hash}")
+        cached_result = await asyncio.to_thread(
+            _restore_from_cache, context, build_dir, build_report_file, tree_hash
+        )
+        if cached_result is not None:
+            return cached_result
+
     option = f"--logs-dir={str(build_dir)}"
     command = ["npm", "run", "build:agent", "--", option]
     logger.debug(f"stepid_dir: {context.stepid_dir}")
 
     try:
-        cmd_result: CompletedProcess = run_cmd(
+        cmd_result: CompletedProcess = await run_cmd(
             stepid_dir=context.stepid_dir,
             command=command,
             output_path=output_path,
@@ -57,27 +157,6 @@ async def run_build(context: LocalContext, settings: Settings) -> FunctionResult
         # Case-2: result=False, abort_flg=True   # abort
         return FunctionResult(result=False, abort_flg=True, detail=detail)
 
-    customconfig_dir = context.output_dir
-    customconfig_file = settings.build_customconfig_file
-    customconfig_path = customconfig_dir / customconfig_file
-    logger.debug(f"customconfig_path: {customconfig_path}")
-
-    try:
-        with open(customconfig_path, "r", encoding="utf-8") as f:
-            customconfig = json.load(f)
-        build_report_file = customconfig.get("build_report_file")
-        if not build_report_file:
-            # Case-2: result=False, abort_flg=True   # abort
-            detail = "Failed to get build_report_file"
-            logger.error(detail)
-            return FunctionResult(result=False, abort_flg=True, detail=detail)
-    except Exception as e:
-        # Case-2: result=False, abort_flg=True   # abort
-        detail = f"Failed to build-customconfig file: {e}"
-        logger.error(detail)
-        return FunctionResult(result=False, abort_flg=True, detail=detail)
-
-    logger.debug(f"build_report_file: {build_report_file}")
     build_report_path = build_dir / build_report_file
     logger.debug(f"build_report_path: {build_report_path}")
     if not build_report_path.exists():
@@ -90,17 +169,23 @@ async def run_build(context: LocalContext, settings: Settings) -> FunctionResult
     error_count = int(result_data.get("summary", {}).get("errorCount", 0))
     if error_count == 0:
         # Case-3: result=True, abort_flg=False   # success
-        archive(build_dir, BUILD_LOGFILE, context.stepid_dir, BUILD_DIR)
-        archive(build_dir, build_report_file, context.stepid_dir, BUILD_DIR)
+        result = FunctionResult(result=True, abort_flg=False, detail="")
         logger.debug(f"No errors : error_count={error_count}")
-        return FunctionResult(result=True, abort_flg=False, detail="")
-
-    # Case-1: result=False, abort_flg=False  # retryable
-    records = result_data.get("records", [])
-    messages = extract_stderr_messages(records)
+    else:
+        # Case-1: result=False, abort_flg=False  # retryable
+        records = result_data.get("records", [])
+        messages = extract_stderr_messages(records)
+
+        result_detail = "".join(m + "\n" for m in messages)
+        result = FunctionResult(
+            result=False, abort_flg=False, detail=result_detail, messages=messages
+        )
+        logger.debug(f"Build Errors - result_detail: {result_detail}")
 
-    result_detail = "".join(m + "\n" for m in messages)
     archive(build_dir, BUILD_LOGFILE, context.stepid_dir, BUILD_DIR)
     archive(build_dir, build_report_file, context.stepid_dir, BUILD_DIR)
-    logger.debug(f"Build Errors - result_detail: {result_detail}")
-    return FunctionResult(result=False, abort_flg=False, detail=result_detail)
+    if tree_hash is not None:
+        await asyncio.to_thread(
+            _store_to_cache, build_dir, build_report_file, tree_hash, result
+        )
+    return result
@@ -1,4 +1,4 @@
-import subprocess
+import asyncio
 from pathlib import Path
 from subprocess import CompletedProcess
 
@@ -6,9 +6,15 @@ from common import archive
 from logger import logger
 
 
-def run_cmd(
+async def run_cmd(
     stepid_dir: Path, command: list[str], output_path: Path, cwd: str
 ) -> CompletedProcess:
+    """
+    Run a command without blocking the event loop.
+
+    stdout is written to output_path, stderr is captured and returned
+    in CompletedProcess.stderr (str). output_path is archived afterwards.
+    """
     logger.debug("run_cmd called")
 
     # Check output directory
@@ -21,11 +27,26 @@ def run_cmd(
     logger.debug(f"output_path: {output_path}")
     logger.debug(f"Run! : command={command}, cwd={cwd}")
     with output_path.open("w", encoding="utf-8") as f:
-        result = subprocess.run(
-            command, cwd=cwd, stdout=f, stderr=subprocess.PIPE, text=True
+        process = await asyncio.create_subprocess_exec(
+            *command, cwd=cwd, stdout=f, stderr=asyncio.subprocess.PIPE
         )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            logger.warning(f"run_cmd cancelled, killing process: {command}")
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
     logger.debug("Run finished")
 
+    result = CompletedProcess(
+        args=command,
+        returncode=process.returncode if process.returncode is not None else -1,
+        stdout=None,
+        stderr=stderr.decode("utf-8", errors="replace") if stderr else "",
+    )
+
     # Archive
     filename = output_path.name
     logger.debug(f"filename: {filename}")
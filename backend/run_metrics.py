@@ -0,0 +1,73 @@
+"""
+Agent run metrics aggregation
+
+AgentRun appends an AgentRunMetrics to context.agent_runs for every agent
+run. step_metrics() returns the METRICS event payload of the runs since
+the previous call (one per pipeline step), session_totals() the totals
+of the whole session (DONE payload).
+"""
+
+from base import (
+    AgentName,
+    AgentRunMetrics,
+    LocalContext,
+    MetricsPayload,
+    MetricsTotals,
+)
+
+
+def aggregate(runs: list[AgentRunMetrics]) -> MetricsTotals:
+    totals = MetricsTotals()
+    for run in runs:
+        totals.runs += 1
+        totals.requests += run.requests
+        totals.input_tokens += run.input_tokens
+        totals.output_tokens += run.output_tokens
+        totals.cached_tokens += run.cached_tokens
+        totals.total_tokens += run.total_tokens
+        totals.latency_sec += run.latency_sec
+        totals.queue_wait_sec += run.queue_wait_sec
+        totals.llm_sec += run.llm_sec
+        totals.tool_calls += run.tool_calls
+        totals.tool_sec += sum(run.tool_sec.values())
+    for name in ("latency_sec", "queue_wait_sec", "llm_sec", "tool_sec"):
+        setattr(totals, name, round(getattr(totals, name), 3))
+    return totals
+
+
+def session_totals(context: LocalContext) -> MetricsTotals:
+    return aggregate(context.agent_runs)
+
+
+def step_metrics(context: LocalContext, step: str) -> MetricsPayload | None:
+    """
+    None if no agent has run since the previous call.
+    """
+    runs = context.agent_runs[context.agent_runs_reported :]
+    if not runs:
+        return None
+    context.agent_runs_reported = len(context.agent_runs)
+    return MetricsPayload(
+        step=step,
+        runs=runs,
+        step_totals=aggregate(runs),
+        session_totals=session_totals(context),
+    )
+
+
+def code_gen_tokens(context: LocalContext) -> tuple[int, int]:
+    """
+    (tokens, runs) of every CodeGenAgent run of the session, including
+    cancelled speculative candidates.
+    """
+    runs = [r for r in context.agent_runs if r.agent_name == AgentName.CODE_GEN]
+    return sum(r.total_tokens for r in runs), len(runs)
+
+
+def code_gen_budget_remaining(context: LocalContext, budget: int) -> int | None:
+    """
+    Tokens left of the code generation budget (None: unlimited).
+    """
+    if budget <= 0:
+        return None
+    return budget - code_gen_tokens(context)[0]
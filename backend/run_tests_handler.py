@@ -3,9 +3,10 @@ import time
 from pathlib import Path
 from typing import Awaitable, Callable
 
-from agents import Runner
+from agents import RunContextWrapper
 
 from agent_logger import AgentLogger
+from agent_runner import AgentRun
 from base import (
     AgentUpdatePayload,
     DonePayload,
@@ -13,6 +14,8 @@ from base import (
     EventType,
     LocalContext,
     RunPlaywrightFunctionResult,
+    RunTestsHeader,
+    SSEPayload,
     SystemError,
     TestScreenshotPayload,
 )
@@ -21,6 +24,9 @@ from config import Settings
 from custom_agents import get_run_tests_agent
 from eval_tests import eval_test_results
 from logger import logger
+from playwright_runner import run_playwright
+from prompt_parser import parse_run_tests_header
+from run_metrics import step_metrics
 
 SSEEventCallable = Callable[[str, dict], Awaitable[str]]
 
@@ -53,6 +59,66 @@ async def wait_for_screenshot_update(
         await asyncio.sleep(interval_sec)
 
 
+async def _run_tests_agent(
+    prompt: str,
+    context: LocalContext,
+    queue: asyncio.Queue,
+) -> RunPlaywrightFunctionResult:
+    """
+    Run RunTestsAgent and forward its AGENT_UPDATE events to the queue.
+    """
+    run_tests_agent = get_run_tests_agent()
+    result = AgentRun(
+        agent=run_tests_agent,
+        input=prompt,
+        context=context,
+        hooks=AgentLogger(),
+    )
+    async for event in result.stream_events():
+        if event.type == "agent_updated_stream_event":
+            logger.debug(f"Agent updated: {event.new_agent.name}")
+            agent_name = event.new_agent.name
+            agent_update_payload = AgentUpdatePayload(agent_name=agent_name)
+            await queue.put(
+                SSEPayload(
+                    event=EventType.AGENT_UPDATE,
+                    payload=agent_update_payload.model_dump(),
+                )
+            )
+        elif event.type == "llm_queue_event":
+            await queue.put(
+                SSEPayload(
+                    event=EventType.LLM_QUEUE, payload=event.payload.model_dump()
+                )
+            )
+        elif event.type == "run_item_stream_event":
+            if event.item.type == "tool_call_item":
+                logger.debug(f"Event: tool_call_item result={result}")
+            elif event.item.type == "tool_call_output_item":
+                logger.debug(f"Event: tool_call_output_item result={result}")
+            elif event.item.type == "message_output_item":
+                logger.debug(f"Event: message_output_item result={result}")
+
+    return result.final_output
+
+
+async def _run_tests_direct(
+    header: RunTestsHeader,
+    context: LocalContext,
+) -> RunPlaywrightFunctionResult:
+    """
+    Run Playwright with the values of the RunTests header (no agent).
+    """
+    logger.debug(f"run tests direct: {header}")
+    return await run_playwright(
+        ctx=RunContextWrapper(context=context),
+        test_dir=header.test_dir,
+        test_file=header.test_file,
+        project=header.project,
+        screenshot_files=header.screenshot_files,
+    )
+
+
 async def handler_run_tests(
     prompt: str,
     context: LocalContext,
@@ -67,31 +133,31 @@ async def handler_run_tests(
     )
 
     try:
-        run_tests_agent = get_run_tests_agent()
-        result = Runner.run_streamed(
-            starting_agent=run_tests_agent,
-            input=prompt,
-            context=context,
-            max_turns=context.max_turns,
-            hooks=AgentLogger(),
-        )
-        async for event in result.stream_events():
-            if event.type == "agent_updated_stream_event":
-                logger.debug(f"Agent updated: {event.new_agent.name}")
-                agent_name = event.new_agent.name
-                agent_update_payload = AgentUpdatePayload(agent_name=agent_name)
-                yield await sse_event(
-                    EventType.AGENT_UPDATE, agent_update_payload.model_dump()
-                )
-            elif event.type == "run_item_stream_event":
-                if event.item.type == "tool_call_item":
-                    logger.debug(f"Event: tool_call_item result={result}")
-                elif event.item.type == "tool_call_output_item":
-                    logger.debug(f"Event: tool_call_output_item result={result}")
-                elif event.item.type == "message_output_item":
-                    logger.debug(f"Event: message_output_item result={result}")
-
-        final: RunPlaywrightFunctionResult = result.final_output
+        header = parse_run_tests_header(prompt)
+        # The tests run in a separate task so that TEST_RUN progress events
+        # put on context.event_queue by run_playwright are streamed
+        # while the tests are still running.
+        queue: asyncio.Queue[SSEPayload | None] = asyncio.Queue()
+        context.event_queue = queue
+        if header is not None:
+            run_tests = _run_tests_direct(header, context)
+        else:
+            logger.info(f"[{category}] : No RunTests header, use RunTestsAgent")
+            run_tests = _run_tests_agent(prompt, context, queue)
+        run_task = asyncio.create_task(run_tests)
+        run_task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (ev := await queue.get()) is not None:
+                yield await sse_event(ev.event, ev.payload)
+            final: RunPlaywrightFunctionResult = run_task.result()
+        finally:
+            if not run_task.done():
+                run_task.cancel()
+            context.event_queue = None
+        metrics = step_metrics(context, "run_tests")
+        if metrics is not None:
+            yield await sse_event(EventType.METRICS, metrics.model_dump())
+
         logger.trace(f"final: {final}")
         if final.abort_flg:
             final_payload = DonePayload(
@@ -102,6 +168,9 @@ async def handler_run_tests(
             # Evaluate
             test_results = eval_test_results(context=context)
             logger.trace(f"test_results: {test_results}")
+            context.tests_total = test_results.total
+            context.tests_ok = test_results.ok
+            context.tests_ng = test_results.ng
             yield await sse_event(EventType.TEST_RESULT, test_results.model_dump())
             if not final.result:
                 final_payload = DonePayload(
@@ -0,0 +1,159 @@
+"""
+Patch-oriented source editing (for FixerAgent tools)
+
+- read_line_range: numbered lines of a range of a file
+- apply_unified_diff: apply a unified diff (hunk headers are used as hints,
+  context is located exactly or fuzzily)
+- apply_search_replace: replace search blocks (exact, then fuzzy)
+
+Fuzzy matching compares whitespace-normalized lines with
+difflib.SequenceMatcher and accepts the best unique window whose ratio is
+at least fuzzy_threshold.
+"""
+
+import difflib
+import re
+
+from base import SearchReplace
+
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    pass
+
+
+def read_line_range(text: str, start_line: int, end_line: int) -> str:
+    """
+    Lines start_line..end_line (1-based, inclusive) as "<n>| <line>".
+    end_line <= 0 means the last line.
+    """
+    lines = text.splitlines()
+    total = len(lines)
+    if end_line <= 0 or end_line > total:
+        end_line = total
+    start_line = max(start_line, 1)
+    if start_line > end_line:
+        raise PatchError(f"Invalid line range: {start_line}-{end_line} (total {total})")
+    width = len(str(end_line))
+    body = "\n".join(
+        f"{n:>{width}}| {lines[n - 1]}" for n in range(start_line, end_line + 1)
+    )
+    return f"[lines {start_line}-{end_line} of {total}]\n{body}"
+
+
+def _norm(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _find_block(
+    lines: list[str],
+    block: list[str],
+    fuzzy_threshold: float,
+    hint: int | None = None,
+) -> int:
+    """
+    Start index of block in lines. Exact match first (nearest to hint),
+    then whitespace-insensitive, then fuzzy.
+    """
+    n = len(block)
+    if n == 0:
+        if hint is None:
+            raise PatchError("Empty search block")
+        return min(max(hint, 0), len(lines))
+    candidates = range(len(lines) - n + 1)
+
+    def nearest(starts: list[int]) -> int:
+        if len(starts) > 1 and hint is None:
+            raise PatchError(
+                f"Ambiguous match ({len(starts)} locations): {block[0].strip()!r}"
+            )
+        if hint is None:
+            return starts[0]
+        return min(starts, key=lambda i: abs(i - hint))
+
+    exact = [i for i in candidates if lines[i : i + n] == block]
+    if exact:
+        return nearest(exact)
+
+    norm_lines = [_norm(line) for line in lines]
+    norm_block = [_norm(line) for line in block]
+    loose = [i for i in candidates if norm_lines[i : i + n] == norm_block]
+    if loose:
+        return nearest(loose)
+
+    target = "\n".join(norm_block)
+    best_ratio = 0.0
+    best: list[int] = []
+    for i in candidates:
+        ratio = difflib.SequenceMatcher(
+            None, "\n".join(norm_lines[i : i + n]), target
+        ).ratio()
+        if ratio > best_ratio + 1e-9:
+            best_ratio, best = ratio, [i]
+        elif abs(ratio - best_ratio) <= 1e-9:
+            best.append(i)
+    if not best or best_ratio < fuzzy_threshold:
+        raise PatchError(
+            f"Context not found (best similarity {best_ratio:.2f}): "
+            f"{block[0].strip()!r}"
+        )
+    return nearest(best)
+
+
+def _split(text: str) -> tuple[list[str], bool]:
+    return text.splitlines(), text.endswith("\n")
+
+
+def _join(lines: list[str], trailing_newline: bool) -> str:
+    text = "\n".join(lines)
+    return text + "\n" if trailing_newline and lines else text
+
+
+def apply_unified_diff(text: str, diff: str, fuzzy_threshold: float) -> str:
+    lines, trailing_newline = _split(text)
+    hunks: list[tuple[int, list[str], list[str]]] = []
+    current: tuple[int, list[str], list[str]] | None = None
+    for raw in diff.splitlines():
+        m = HUNK_HEADER_RE.match(raw)
+        if m:
+            # Pure insertion (old count 0): the new lines go after line <start>
+            start = int(m.group(1))
+            old_count = m.group(2)
+            current = (start if old_count == "0" else start - 1, [], [])
+            hunks.append(current)
+            continue
+        # File headers (---/+++) only come before the first hunk
+        if current is None or raw.startswith("\\"):
+            continue
+        _, old, new = current
+        tag, body = (raw[:1], raw[1:]) if raw else (" ", "")
+        if tag == " ":
+            old.append(body)
+            new.append(body)
+        elif tag == "-":
+            old.append(body)
+        elif tag == "+":
+            new.append(body)
+        else:
+            raise PatchError(f"Invalid diff line: {raw!r}")
+    if not hunks:
+        raise PatchError("No hunks found in diff")
+
+    offset = 0
+    for start, old, new in hunks:
+        pos = _find_block(lines, old, fuzzy_threshold, hint=start + offset)
+        lines[pos : pos + len(old)] = new
+        offset += len(new) - len(old)
+    return _join(lines, trailing_newline)
+
+
+def apply_search_replace(
+    text: str, edits: list[SearchReplace], fuzzy_threshold: float
+) -> str:
+    lines, trailing_newline = _split(text)
+    for edit in edits:
+        block = edit.search.splitlines()
+        pos = _find_block(lines, block, fuzzy_threshold)
+        lines[pos : pos + len(block)] = edit.replace.splitlines()
+    return _join(lines, trailing_newline)
@@ -0,0 +1,337 @@
+"""
+Step history index (settings.step_index)
+
+An embedded SQLite database (settings.step_index_path, default
+<archive_dir>/steps.db) with one row per step and one per archived file
+version, so past sessions can be listed and filtered without walking the
+StepID directories and bundles of the archive.
+
+- steps: written at session start (category, prompt hash, priority), at
+  each archived file (counts, bytes) and at session end (DONE status,
+  duration, code generation attempts, ESLint/build/test outcomes and the
+  session metrics totals).
+- artifacts: one row per file version stored by archive_store.
+
+The rows outlive the archive retention (history of removed bundles).
+Writes are serialized by a lock on one connection (WAL), index errors are
+logged and never fail the session or the archive.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from base import (
+    LocalContext,
+    StepIndexArtifact,
+    StepIndexDetail,
+    StepIndexEntry,
+    StepIndexPage,
+)
+from config import get_settings
+from logger import logger
+from run_metrics import session_totals
+
+STEP_INDEX_FILENAME = "steps.db"
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS steps (
+    step_id TEXT PRIMARY KEY,
+    category TEXT,
+    prompt_hash TEXT,
+    priority TEXT,
+    status TEXT,
+    message TEXT,
+    started_at TEXT,
+    ended_at TEXT,
+    duration_sec REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    eslint_runs INTEGER NOT NULL DEFAULT 0,
+    eslint_errors INTEGER NOT NULL DEFAULT 0,
+    eslint_errors_last INTEGER,
+    build_runs INTEGER NOT NULL DEFAULT 0,
+    build_passed INTEGER,
+    tests_total INTEGER,
+    tests_ok INTEGER,
+    tests_ng INTEGER,
+    agent_runs INTEGER NOT NULL DEFAULT 0,
+    requests INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    llm_sec REAL NOT NULL DEFAULT 0,
+    tool_sec REAL NOT NULL DEFAULT 0,
+    archived_files INTEGER NOT NULL DEFAULT 0,
+    archived_bytes INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS steps_category ON steps (category, started_at);
+CREATE INDEX IF NOT EXISTS steps_status ON steps (status, started_at);
+CREATE INDEX IF NOT EXISTS steps_prompt_hash ON steps (prompt_hash);
+CREATE INDEX IF NOT EXISTS steps_started_at ON steps (started_at);
+CREATE TABLE IF NOT EXISTS artifacts (
+    step_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    PRIMARY KEY (step_id, path, version)
+);
+CREATE INDEX IF NOT EXISTS artifacts_hash ON artifacts (hash);
+"""
+
+# Filter -> SQL condition (query())
+_FILTERS = {
+    "category": "category = ?",
+    "status": "status = ?",
+    "prompt_hash": "prompt_hash = ?",
+    "build_passed": "build_passed = ?",
+    "since": "started_at >= ?",
+    "until": "started_at < ?",
+    "min_eslint_errors": "eslint_errors >= ?",
+    "min_tests_ng": "tests_ng >= ?",
+}
+SORT_KEYS = {
+    "started_at",
+    "duration_sec",
+    "total_tokens",
+    "attempts",
+    "eslint_errors",
+    "tests_ng",
+}
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="milliseconds")
+
+
+class StepIndex:
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _upsert(self, step_id: str, values: dict[str, Any]) -> None:
+        values = {**values, "updated_at": _now()}
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in values)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO steps (step_id, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT (step_id) DO UPDATE SET {updates}",
+                (step_id, *values.values()),
+            )
+
+    def record_start(
+        self, step_id: str, category: str, prompt: str, priority: str
+    ) -> None:
+        self._upsert(
+            step_id,
+            {
+                "category": category,
+                "prompt_hash": prompt_hash(prompt),
+                "priority": priority,
+                "started_at": _now(),
+            },
+        )
+
+    def record_archive(
+        self, step_id: str, path: str, version: int, digest: str, size: int, time: str
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+                (step_id, path, version, digest, size, time),
+            )
+            self._conn.execute(
+                "INSERT INTO steps (step_id, archived_files, archived_bytes, "
+                "updated_at) VALUES (?, 1, ?, ?) ON CONFLICT (step_id) DO UPDATE "
+                "SET archived_files = archived_files + 1, "
+                "archived_bytes = archived_bytes + excluded.archived_bytes, "
+                "updated_at = excluded.updated_at",
+                (step_id, size, _now()),
+            )
+
+    def record_end(
+        self, context: LocalContext, status: str | None, message: str | None
+    ) -> None:
+        """
+        status None: the session ended without DONE (e.g. client gone).
+        """
+        ended_at = datetime.now()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT started_at FROM steps WHERE step_id = ?", (context.step_id,)
+            ).fetchone()
+        duration = None
+        if row is not None and row["started_at"]:
+            started_at = datetime.fromisoformat(row["started_at"])
+            duration = round((ended_at - started_at).total_seconds(), 3)
+        totals = session_totals(context)
+        self._upsert(
+            context.step_id,
+            {
+                "status": status,
+                "message": message,
+                "ended_at": ended_at.isoformat(timespec="milliseconds"),
+                "duration_sec": duration,
+                "attempts": context.code_gen_runs,
+                "eslint_runs": context.eslint_runs,
+                "eslint_errors": context.eslint_errors,
+                "eslint_errors_last": context.eslint_errors_last,
+                "build_runs": context.build_runs,
+                "build_passed": context.build_passed,
+                "tests_total": context.tests_total,
+                "tests_ok": context.tests_ok,
+                "tests_ng": context.tests_ng,
+                "agent_runs": totals.runs,
+                "requests": totals.requests,
+                "input_tokens": totals.input_tokens,
+                "output_tokens": totals.output_tokens,
+                "cached_tokens": totals.cached_tokens,
+                "total_tokens": totals.total_tokens,
+                "llm_sec": totals.llm_sec,
+                "tool_sec": totals.tool_sec,
+            },
+        )
+
+    def query(
+        self,
+        filters: dict[str, Any],
+        sort: str = "started_at",
+        descending: bool = True,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> StepIndexPage:
+        """
+        filters: keys of _FILTERS, None values are ignored.
+        Raises ValueError on an unknown filter or sort key.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Invalid sort key: {sort}")
+        conditions, params = [], []
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key not in _FILTERS:
+                raise ValueError(f"Invalid filter: {key}")
+            conditions.append(_FILTERS[key])
+            params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        order = "DESC" if descending else "ASC"
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM steps {where}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM steps {where} "
+                f"ORDER BY {sort} {order} NULLS LAST, step_id {order} "
+                "LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return StepIndexPage(
+            total=total,
+            limit=limit,
+            offset=offset,
+            items=[StepIndexEntry(**dict(row)) for row in rows],
+        )
+
+    def get(self, step_id: str) -> StepIndexDetail | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM steps WHERE step_id = ?", (step_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            artifacts = self._conn.execute(
+                "SELECT path, version, hash, size, time FROM artifacts "
+                "WHERE step_id = ? ORDER BY time, path, version",
+                (step_id,),
+            ).fetchall()
+        return StepIndexDetail(
+            **dict(row),
+            artifacts=[StepIndexArtifact(**dict(a)) for a in artifacts],
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_step_index: StepIndex | None = None
+_step_index_lock = threading.Lock()
+
+
+def get_step_index() -> StepIndex | None:
+    """
+    None if settings.step_index is off.
+    """
+    global _step_index
+    settings = get_settings()
+    if not settings.step_index:
+        return None
+    with _step_index_lock:
+        if _step_index is None:
+            path = settings.step_index_path or (
+                settings.archive_dir / STEP_INDEX_FILENAME
+            )
+            _step_index = StepIndex(path.resolve())
+    return _step_index
+
+
+def index_archive(
+    stepid_dir: Path, path: str, version: int, digest: str, size: int, time: str
+) -> None:
+    """
+    Called by archive_store for every stored file version.
+    """
+    try:
+        index = get_step_index()
+        if index is not None:
+            index.record_archive(stepid_dir.name, path, version, digest, size, time)
+    except Exception as e:
+        logger.error(f"[step_index] archive not indexed: {stepid_dir}/{path}, {e}")
+
+
+def index_session_start(context: LocalContext, prompt: str) -> None:
+    try:
+        index = get_step_index()
+        if index is not None:
+            index.record_start(
+                context.step_id, context.category, prompt, context.priority
+            )
+    except Exception as e:
+        logger.error(f"[step_index] session start not indexed: {context.step_id}, {e}")
+
+
+def index_session_end(
+    context: LocalContext, status: str | None = None, message: str | None = None
+) -> None:
+    try:
+        index = get_step_index()
+        if index is not None:
+            index.record_end(context, status, message)
+    except Exception as e:
+        logger.error(f"[step_index] session end not indexed: {context.step_id}, {e}")
@@ -17,6 +17,8 @@ async def run_build_step(
     sse_events: list[SSEPayload] = []
 
     build_result = await run_build(context, settings)
+    context.build_runs += 1
+    context.build_passed = build_result.result
 
     sse_events.append(
         SSEPayload(
@@ -13,66 +13,107 @@ from build_error_analysis import analyze_build_error
 from code_fixer import fix_code
 from config import Settings
 from logger import logger
-from run_build_cmd import run_build
+from run_build_cmd import build_error_set, run_build
+from run_metrics import step_metrics
+
+
+async def _rebuild_round(
+    context: LocalContext,
+    settings: Settings,
+    build_result: FunctionResult,
+) -> AsyncIterator[SSEPayload]:
+    """
+    Analyze -> Fix -> Re-run build (result in context.rebuild_result)
+    """
+    # ------------------------------
+    # SubStep-1: Analyze build error
+    # ------------------------------
+    logger.debug("SubStep-1: Analyze build error")
+    analyzer_result: BuildErrorAnalyzerResult | None = None
+    async for line in analyze_build_error(context=context, build_result=build_result):
+        # Events: AGENT_UPDATE, ANALYZER_RESULT
+        data = json.loads(line)
+        payload = SSEPayload(
+            event=EventType(data["event"]),
+            payload=data.get("payload", {}),
+        )
+        # Send Immediately
+        yield payload
+
+        if data["event"] == EventType.ANALYZER_RESULT:
+            analyzer_result = BuildErrorAnalyzerResult(**data["payload"])
+
+    if analyzer_result is None:
+        raise ValueError("analyzer_result is None")
+    logger.debug(f"analyzer_result: {analyzer_result}")
+
+    # -------------------
+    # SubStep-2: Fix code
+    # -------------------
+    logger.debug("SubStep-2: Fix code")
+    async for line in fix_code(context=context, analyzer_result=analyzer_result):
+        # Events: AGENT_RESULT
+        data = json.loads(line)
+        yield SSEPayload(
+            event=EventType(data["event"]),
+            payload=data.get("payload", {}),
+        )
+
+    # -----------------------
+    # SubStep-3: Re-run build
+    # -----------------------
+    logger.debug("SubStep-3: Re-run build")
+    context.rebuild_result = await run_build(context, settings)
+    context.build_runs += 1
+    context.build_passed = context.rebuild_result.result
 
 
 async def run_rebuild_step(
     context: LocalContext, settings: Settings, build_result: FunctionResult
 ) -> AsyncIterator[SSEPayload]:
+    """
+    Repeat rebuild rounds (up to settings.rebuild_max_rounds) until the
+    build succeeds, aborts, or the error set stops shrinking.
+    """
     logger.debug("run_rebuild_step called")
 
     try:
-        # ------------------------------
-        # SubStep-1: Analyze build error
-        # ------------------------------
-        logger.debug("SubStep-1: Analyze build error")
-        analyzer_result: BuildErrorAnalyzerResult | None = None
-        async for line in analyze_build_error(
-            context=context, build_result=build_result
-        ):
-            # Events: AGENT_UPDATE, ANALYZER_RESULT
-            data = json.loads(line)
-            payload = SSEPayload(
-                event=EventType(data["event"]),
-                payload=data.get("payload", {}),
-            )
-            # Send Immediately
-            yield payload
-
-            if data["event"] == EventType.ANALYZER_RESULT:
-                analyzer_result = BuildErrorAnalyzerResult(**data["payload"])
+        max_rounds = max(1, settings.rebuild_max_rounds)
+        errors = build_error_set(build_result)
+        for round_no in range(1, max_rounds + 1):
+            logger.info(f"Rebuild round {round_no}/{max_rounds}: errors={len(errors)}")
+            async for ev in _rebuild_round(context, settings, build_result):
+                yield ev
+            metrics = step_metrics(context, f"rebuild {round_no}/{max_rounds}")
+            if metrics is not None:
+                yield SSEPayload(event=EventType.METRICS, payload=metrics.model_dump())
 
-        if analyzer_result is None:
-            raise ValueError("analyzer_result is None")
-        logger.debug(f"analyzer_result: {analyzer_result}")
-
-        # -------------------
-        # SubStep-2: Fix code
-        # -------------------
-        logger.debug("SubStep-2: Fix code")
-        async for line in fix_code(context=context, analyzer_result=analyzer_result):
-            # Events: AGENT_RESULT
-            data = json.loads(line)
+            rebuild_result = context.rebuild_result
             yield SSEPayload(
-                event=EventType(data["event"]),
-                payload=data.get("payload", {}),
+                event=EventType.CHECK_RESULT,
+                payload={
+                    "checker": "Build",
+                    "result": rebuild_result.result,
+                    "rule_id": f"npm run build (rebuild {round_no}/{max_rounds})",
+                    "detail": rebuild_result.detail,
+                },
             )
+            if rebuild_result.result or rebuild_result.abort_flg:
+                break
 
-        # -----------------------
-        # SubStep-3: Re-run build
-        # -----------------------
-        logger.debug("SubStep-3: Re-run build")
-        rebuild_result = await run_build(context, settings)
-        context.rebuild_result = rebuild_result
-        yield SSEPayload(
-            event=EventType.CHECK_RESULT,
-            payload={
-                "checker": "Build",
-                "result": rebuild_result.result,
-                "rule_id": "npm run build (rebuild)",
-                "detail": rebuild_result.detail,
-            },
-        )
+            # Convergence check: continue only while the round fixed errors
+            # without introducing new ones (strict subset)
+            new_errors = build_error_set(rebuild_result)
+            logger.debug(f"errors: {len(errors)} -> {len(new_errors)}")
+            if not new_errors < errors:
+                logger.info(
+                    f"Rebuild stopped: error set did not shrink "
+                    f"({len(errors)} -> {len(new_errors)}, "
+                    f"new={len(new_errors - errors)})"
+                )
+                break
+            errors = new_errors
+            build_result = rebuild_result
 
     except Exception as e:
         logger.error(f"Exception: {e}")
@@ -0,0 +1,236 @@
+"""
+Speculative code generation step
+
+K CodeGenAgent runs are started concurrently. Each candidate saves its code
+to a scratch file (e.g. app/page.candidate1.tsx) and is linted as soon as
+it is saved. The first candidate with a clean ESLint result is promoted to
+the real path and the others are cancelled. If no candidate is clean, the
+first linted candidate is promoted with its ESLint errors (the retry loop
+of handle_gen_code continues as in serial mode).
+
+context.loop_action after the step:
+- NORMAL   : code generated and checked (see context.is_code_check_error)
+- CONTINUE : no candidate produced code, retry
+- BREAK    : code generation failed, abort
+
+Notes:
+- CODE_DELTA events of the candidates are not streamed.
+- settings.code_gen_token_budget limits the tokens used by code generation
+  in the session (every CodeGenAgent run, cancelled candidates included).
+  K is reduced to the number of candidates the remaining budget can pay
+  for, estimated from the previous runs (1 before the first run).
+  handle_gen_code stops once the budget is exhausted.
+"""
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator
+
+from agents import RunContextWrapper
+from agents.exceptions import ModelBehaviorError
+
+from base import (
+    AgentUpdatePayload,
+    CodeCheckResult,
+    EventType,
+    LocalContext,
+    LoopAction,
+    PromptRequest,
+    SSEPayload,
+    SystemError,
+)
+from check_code import check_result_lines
+from common import archive
+from config import Settings
+from create_code import gen_code
+from eslint_checker import ESLINT_OUTPUT_FILENAME, RESULTS_DIR, run_eslint
+from logger import logger
+from run_metrics import code_gen_budget_remaining, code_gen_tokens
+
+SCRATCH_SUFFIX = ".candidate"
+
+
+@dataclass
+class Candidate:
+    index: int
+    context: LocalContext
+    check_result: CodeCheckResult | None = None
+    error: Exception | None = None
+
+    @property
+    def clean(self) -> bool:
+        return bool(
+            self.check_result
+            and self.check_result.result
+            and self.check_result.eslint_result
+        )
+
+
+def _eslint_output_filename(ctx: LocalContext) -> str:
+    stem, ext = os.path.splitext(ESLINT_OUTPUT_FILENAME)
+    return f"{stem}{ctx.scratch_suffix}{ext}"
+
+
+def _candidate_context(context: LocalContext, index: int) -> LocalContext:
+    # Shallow copy: agent_runs stays shared, so the metrics of every
+    # candidate are counted in the session
+    return context.model_copy(
+        update={
+            "response": None,
+            "gen_code_filepath": "",
+            "add_prompts": list(context.add_prompts),
+            "event_queue": None,
+            "scratch_suffix": f"{SCRATCH_SUFFIX}{index}",
+            "tokens_used": 0,
+            "code_gen_runs": 0,
+            "eslint_runs": 0,
+            "eslint_errors": 0,
+        }
+    )
+
+
+async def _run_candidate(prompt: str, candidate: Candidate) -> Candidate:
+    ctx = candidate.context
+    try:
+        async for line in gen_code(request=PromptRequest(prompt=prompt), context=ctx):
+            event = json.loads(line).get("event")
+            logger.trace(f"[candidate {candidate.index}] event: {event}")
+        if ctx.response is None or not ctx.gen_code_filepath:
+            return candidate
+        candidate.check_result = await run_eslint(
+            ctx=RunContextWrapper(context=ctx),
+            filename=ctx.gen_code_filepath,
+            output_filename=_eslint_output_filename(ctx),
+        )
+        logger.info(
+            f"[candidate {candidate.index}] linted: clean={candidate.clean}, "
+            f"tokens={ctx.tokens_used}"
+        )
+    except Exception as e:
+        # A failed candidate (model, API, scratch file I/O ...) does not stop
+        # the others, the step fails only when every candidate failed
+        logger.warning(f"[candidate {candidate.index}] {e.__class__.__name__}: {e}")
+        candidate.error = e
+    return candidate
+
+
+def _promote(context: LocalContext, candidate: Candidate) -> None:
+    """
+    Move the candidate's scratch file to the real path.
+    """
+    ctx = candidate.context
+    scratch_path = Path(ctx.gen_code_filepath)
+    suffix = ctx.scratch_suffix or ""
+    real_name = scratch_path.name.replace(suffix, "", 1)
+    real_path = scratch_path.with_name(real_name)
+    os.replace(scratch_path, real_path)
+    archive(
+        src_dir=real_path.parent,
+        src_file=real_name,
+        stepid_dir=context.stepid_dir,
+        dir=real_path.parent.relative_to(context.output_dir),
+    )
+    logger.info(f"Promoted candidate {candidate.index}: {scratch_path} -> {real_path}")
+    context.response = ctx.response
+    context.gen_code_filepath = str(real_path)
+
+
+def _speculation_width(context: LocalContext, settings: Settings) -> int:
+    k = max(1, settings.code_gen_speculative)
+    remaining = code_gen_budget_remaining(context, settings.code_gen_token_budget)
+    if remaining is None:
+        return k
+    # Estimated cost of one candidate: average of the previous runs
+    tokens, runs = code_gen_tokens(context)
+    if not tokens or not runs:
+        return 1
+    return min(k, max(1, int(remaining // (tokens / runs))))
+
+
+async def speculative_gen_code_step(
+    final_prompt: str,
+    context: LocalContext,
+    settings: Settings,
+) -> AsyncIterator[SSEPayload]:
+    logger.debug("speculative_gen_code_step called")
+    k = _speculation_width(context, settings)
+    logger.info(
+        f"Speculative code generation: K={k}, tokens={code_gen_tokens(context)[0]}"
+    )
+    yield SSEPayload(
+        event=EventType.AGENT_UPDATE,
+        payload=AgentUpdatePayload(agent_name=f"CodeGenAgent x{k}").model_dump(),
+    )
+
+    candidates = [
+        Candidate(i + 1, _candidate_context(context, i + 1)) for i in range(k)
+    ]
+    tasks = [asyncio.create_task(_run_candidate(final_prompt, c)) for c in candidates]
+    winner: Candidate | None = None
+    fallback: Candidate | None = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            candidate = await next_done
+            if candidate.clean:
+                winner = candidate
+                break
+            if fallback is None and candidate.check_result is not None:
+                fallback = candidate
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        context.tokens_used += sum(c.context.tokens_used for c in candidates)
+        context.code_gen_runs += sum(c.context.code_gen_runs for c in candidates)
+        context.eslint_runs += sum(c.context.eslint_runs for c in candidates)
+        context.eslint_errors += sum(c.context.eslint_errors for c in candidates)
+
+    selected = winner or fallback
+    try:
+        if selected is not None:
+            _promote(context, selected)
+            context.eslint_errors_last = selected.context.eslint_errors_last
+    finally:
+        # Keep the winner's ESLint result, remove the other scratch files
+        results_dir = context.output_dir / RESULTS_DIR
+        for c in candidates:
+            eslint_output = results_dir / _eslint_output_filename(c.context)
+            if c is selected and eslint_output.exists():
+                os.replace(eslint_output, results_dir / ESLINT_OUTPUT_FILENAME)
+                continue
+            eslint_output.unlink(missing_ok=True)
+            path = c.context.gen_code_filepath
+            if c is not selected and path and os.path.exists(path):
+                os.remove(path)
+
+    if selected is None:
+        errors = [c.error for c in candidates if c.error is not None]
+        detail = str(errors[-1]) if errors else "No code generated"
+        logger.warning(f"[speculative] no candidate: {detail}")
+        abort = any(not isinstance(e, ModelBehaviorError) for e in errors)
+        yield SSEPayload(
+            event=EventType.SYSTEM_ERROR,
+            payload=SystemError(
+                error=errors[-1].__class__.__name__ if errors else "NoCode",
+                detail=detail,
+            ).model_dump(),
+        )
+        context.loop_action = LoopAction.BREAK if abort else LoopAction.CONTINUE
+        return
+
+    yield SSEPayload(
+        event=EventType.CODE,
+        payload={
+            "language": "tsx",
+            "code": context.response.code if context.response else "",
+            "file_path": context.gen_code_filepath,
+        },
+    )
+    for line in check_result_lines(selected.check_result, context):
+        data = json.loads(line)
+        yield SSEPayload(event=EventType(data["event"]), payload=data["payload"])
+    context.loop_action = LoopAction.NORMAL
@@ -0,0 +1,309 @@
+"""
+Offline stub model (settings.model_provider = "stub")
+
+Replays canned outputs per agent instead of calling the OpenAI API, so the
+pipeline can be benchmarked deterministically on an isolated machine. The
+stub models are still wrapped in llm_scheduler.LimitedModel, so rate
+limits, retries and metrics behave as with the real provider.
+
+Script of an agent: <settings.stub_dir>/<AgentName>.json (built-in default
+when the file does not exist):
+
+    {"turns": [
+        {"tool_call": {"name": "save_code",
+                       "arguments": {"code": "...", "directory": "app",
+                                     "filename": "page.tsx"}}},
+        {"output": "saved"}
+    ]}
+
+- Turn n is replayed after n tool calls of the run (the last turn repeats).
+- "output" is a string or a JSON object (structured output_type).
+- "{input}" in a string is replaced with the first user input.
+- Responses start after settings.stub_latency_sec and are streamed at
+  settings.stub_tokens_per_sec (0: at once). Tokens are len(text) / 4.
+"""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator
+from uuid import uuid4
+
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionCallArgumentsDeltaEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputItemAddedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+
+from base import AgentName
+from config import get_settings
+from logger import logger
+
+CHARS_PER_TOKEN = 4
+STUB_CODE = """export default function Page() {
+  return (
+    <main className="p-8">
+      <h1 className="text-2xl font-bold">Stub</h1>
+    </main>
+  );
+}
+"""
+
+DEFAULT_SCRIPTS: dict[str, list[dict[str, Any]]] = {
+    AgentName.CODE_GEN: [
+        {
+            "tool_call": {
+                "name": "save_code",
+                "arguments": {
+                    "code": STUB_CODE,
+                    "directory": "app/stub",
+                    "filename": "page.tsx",
+                },
+            }
+        },
+        {"output": "saved"},
+    ],
+    AgentName.CODE_CHECK: [
+        {"tool_call": {"name": "check_code", "arguments": {"filename": "{input}"}}},
+        {"output": {"result": True, "eslint_result": True}},
+    ],
+    AgentName.PLACE_FILES: [
+        {"output": {"result": True, "error_detail": ""}},
+    ],
+    AgentName.RUN_TESTS: [
+        {"output": {"result": True, "abort_flg": False, "detail": "stub"}},
+    ],
+    AgentName.ANALYZER: [
+        {
+            "output": {
+                "summary": "stub analysis",
+                "root_cause": "stub",
+                "files_to_fix": [],
+                "fix_policy": ["no change"],
+                "confidence": "unclear",
+            }
+        },
+    ],
+    AgentName.FIXER: [
+        {"output": {"result": True, "error_detail": ""}},
+    ],
+}
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _first_input(input: str | list) -> str:
+    if isinstance(input, str):
+        return input
+    for item in input:
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def _count_tool_calls(input: str | list) -> int:
+    if isinstance(input, str):
+        return 0
+    return sum(
+        1
+        for item in input
+        if isinstance(item, dict) and item.get("type") == "function_call"
+    )
+
+
+def _substitute(value: Any, user_input: str) -> Any:
+    if isinstance(value, str):
+        return value.replace("{input}", user_input)
+    if isinstance(value, dict):
+        return {k: _substitute(v, user_input) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, user_input) for v in value]
+    return value
+
+
+def load_stub_script(agent_name: str) -> list[dict[str, Any]]:
+    path = Path(get_settings().stub_dir) / f"{agent_name}.json"
+    if path.is_file():
+        return json.loads(path.read_text(encoding="utf-8"))["turns"]
+    if agent_name not in DEFAULT_SCRIPTS:
+        raise ValueError(f"No stub script for {agent_name}: {path}")
+    return DEFAULT_SCRIPTS[agent_name]
+
+
+def _item_text(item: Any) -> str:
+    """
+    Streamed text of an output item (tool call arguments or message text).
+    """
+    if item.type == "function_call":
+        return item.arguments
+    if item.type == "message":
+        return "".join(getattr(content, "text", "") or "" for content in item.content)
+    return ""
+
+
+def _response_delay(output_tokens: int) -> float:
+    settings = get_settings()
+    delay = settings.stub_latency_sec
+    if settings.stub_tokens_per_sec > 0:
+        delay += output_tokens / settings.stub_tokens_per_sec
+    return delay
+
+
+async def canned_response(
+    items: list[Any], input_tokens: int, output_tokens: int
+) -> ModelResponse:
+    """
+    ModelResponse of canned output items after the configured latency.
+    """
+    await asyncio.sleep(_response_delay(output_tokens))
+    return ModelResponse(
+        output=items,
+        usage=Usage(
+            requests=1,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            total_tokens=input_tokens + output_tokens,
+        ),
+        response_id=None,
+    )
+
+
+async def stream_canned_response(
+    items: list[Any],
+    input_tokens: int,
+    output_tokens: int,
+    model: str,
+) -> AsyncIterator[Any]:
+    """
+    Response stream events of canned output items: latency, then the
+    items with their text as deltas at the configured token rate.
+    """
+    settings = get_settings()
+    await asyncio.sleep(settings.stub_latency_sec)
+    rate = settings.stub_tokens_per_sec
+    # Deltas of about one second of tokens (at once if not throttled)
+    seq = 0
+    for index, item in enumerate(items):
+        yield ResponseOutputItemAddedEvent.model_construct(
+            type="response.output_item.added",
+            item=item,
+            output_index=index,
+            sequence_number=seq,
+        )
+        text = _item_text(item)
+        chunk_chars = max(int(rate * CHARS_PER_TOKEN) if rate > 0 else len(text), 1)
+        for start in range(0, len(text), chunk_chars):
+            chunk = text[start : start + chunk_chars]
+            seq += 1
+            if item.type == "function_call":
+                yield ResponseFunctionCallArgumentsDeltaEvent.model_construct(
+                    type="response.function_call_arguments.delta",
+                    delta=chunk,
+                    item_id=item.id,
+                    output_index=index,
+                    sequence_number=seq,
+                )
+            else:
+                yield ResponseTextDeltaEvent.model_construct(
+                    type="response.output_text.delta",
+                    delta=chunk,
+                    item_id=item.id,
+                    output_index=index,
+                    content_index=0,
+                    logprobs=[],
+                    sequence_number=seq,
+                )
+            if rate > 0:
+                await asyncio.sleep(_tokens(chunk) / rate)
+        seq += 1
+
+    usage = ResponseUsage.model_construct(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        total_tokens=input_tokens + output_tokens,
+        input_tokens_details={"cached_tokens": 0},
+        output_tokens_details={"reasoning_tokens": 0},
+    )
+    response = Response.model_construct(
+        id=f"resp_{uuid4().hex[:12]}",
+        object="response",
+        created_at=0,
+        model=model,
+        output=items,
+        usage=usage,
+        status="completed",
+        parallel_tool_calls=False,
+        tool_choice="auto",
+        tools=[],
+    )
+    yield ResponseCompletedEvent.model_construct(
+        type="response.completed", response=response, sequence_number=seq
+    )
+
+
+class StubModel(Model):
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+
+    def _turn(self, input: str | list) -> Any:
+        """
+        The output item of this turn.
+        """
+        turns = load_stub_script(self.agent_name)
+        index = min(_count_tool_calls(input), len(turns) - 1)
+        turn = _substitute(turns[index], _first_input(input))
+        logger.debug(f"[stub] {self.agent_name} turn {index}: {list(turn)}")
+        item_id = f"stub_{uuid4().hex[:12]}"
+        if "tool_call" in turn:
+            call = turn["tool_call"]
+            return ResponseFunctionToolCall(
+                type="function_call",
+                id=item_id,
+                call_id=f"call_{item_id}",
+                name=call["name"],
+                arguments=json.dumps(call.get("arguments", {}), ensure_ascii=False),
+                status="completed",
+            )
+        output = turn.get("output", "")
+        if not isinstance(output, str):
+            output = json.dumps(output, ensure_ascii=False)
+        return ResponseOutputMessage(
+            type="message",
+            id=item_id,
+            role="assistant",
+            status="completed",
+            content=[
+                ResponseOutputText(type="output_text", text=output, annotations=[])
+            ],
+        )
+
+    def _usage(self, system_instructions: str | None, input: Any, item: Any):
+        input_tokens = _tokens((system_instructions or "") + str(input))
+        return input_tokens, _tokens(_item_text(item))
+
+    async def get_response(self, system_instructions, input, *args, **kwargs):
+        item = self._turn(input)
+        input_tokens, output_tokens = self._usage(system_instructions, input, item)
+        return await canned_response([item], input_tokens, output_tokens)
+
+    async def stream_response(
+        self, system_instructions, input, *args, **kwargs
+    ) -> AsyncIterator[Any]:
+        item = self._turn(input)
+        input_tokens, output_tokens = self._usage(system_instructions, input, item)
+        async for event in stream_canned_response(
+            [item], input_tokens, output_tokens, model=f"stub-{self.agent_name}"
+        ):
+            yield event
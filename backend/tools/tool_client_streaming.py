@@ -5,16 +5,35 @@ tool_client_streaming.py - Command-line client for backend API streaming via SSE
 
 Usage:
     $ python tool_client_streaming.py -f <prompt-file>
+    $ python tool_client_streaming.py -l <prompt-file-or-dir> [...] \
+          [-n SESSIONS] [-c CONCURRENCY] [--ramp-up SEC] [--json OUT]
+
+-f: send one prompt and print the raw SSE stream.
+-l: load test. Prompt files (*.md / *.txt, directories are searched
+    recursively, e.g. prompt/ or prompts/user/<AutoRun-ID>) are sent
+    round-robin by CONCURRENCY concurrent clients until SESSIONS sessions
+    are done. Client k starts at k * SEC / CONCURRENCY (ramp-up).
+    Time to `started`, first `code`, `done`, the largest gap between SSE
+    frames (heartbeat gap) and the done status of each session are
+    reported as p50/p95/p99. --json writes the report and every session
+    for comparing runs.
 """
 
 import argparse
+import asyncio
 import json
+import ssl
 import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Optional
-from urllib import error, request
+from typing import AsyncIterator, Optional
+from urllib import error, parse, request
 
 API_BASE = "http://localhost:8000"
+PROMPT_SUFFIXES = (".md", ".txt")
+PERCENTILES = (50, 95, 99)
 
 
 def read_prompt(path: str) -> str:
@@ -82,11 +101,365 @@ def stream_events(session_id: str) -> None:
         sys.exit(1)
 
 
+# Load test
+@dataclass
+class SSEFrame:
+    event: str = "message"
+    data: str = ""
+    comment: bool = False  # ": keep-alive" etc.
+
+
+class SSEParser:
+    """
+    Incremental text/event-stream parser: feed() lines, get complete frames.
+    """
+
+    def __init__(self):
+        self._event = ""
+        self._data: list[str] = []
+        self._comment = False
+
+    def feed(self, line: str) -> Optional[SSEFrame]:
+        line = line.rstrip("\r\n")
+        if line == "":
+            if not self._data and not self._event and not self._comment:
+                return None
+            frame = SSEFrame(
+                event=self._event or "message",
+                data="\n".join(self._data),
+                comment=self._comment and not self._data and not self._event,
+            )
+            self._event, self._data, self._comment = "", [], False
+            return frame
+        if line.startswith(":"):
+            self._comment = True
+            return None
+        name, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if name == "event":
+            self._event = value
+        elif name == "data":
+            self._data.append(value)
+        return None
+
+
+class HTTPError(Exception):
+    pass
+
+
+async def _http_request(
+    url: str, method: str, body: bytes = b"", headers: Optional[dict] = None
+) -> tuple[int, dict, asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    Minimal HTTP/1.1 request. Returns status, lower-case headers and the
+    connection (the body is read with _iter_body).
+    """
+    u = parse.urlsplit(url)
+    https = u.scheme == "https"
+    port = u.port or (443 if https else 80)
+    reader, writer = await asyncio.open_connection(
+        u.hostname, port, ssl=ssl.create_default_context() if https else None
+    )
+    path = u.path + (f"?{u.query}" if u.query else "")
+    lines = [
+        f"{method} {path or '/'} HTTP/1.1",
+        f"Host: {u.netloc}",
+        "Connection: close",
+        f"Content-Length: {len(body)}",
+    ]
+    lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + body)
+    await writer.drain()
+
+    status_line = (await reader.readline()).decode("latin-1")
+    parts = status_line.split(" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        writer.close()
+        raise HTTPError(f"{method} {url}: invalid status line {status_line!r}")
+    response_headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), response_headers, reader, writer
+
+
+async def _iter_body(
+    reader: asyncio.StreamReader, headers: dict
+) -> AsyncIterator[bytes]:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                return
+            yield await reader.readexactly(size)
+            await reader.readline()  # CRLF after the chunk
+    elif "content-length" in headers:
+        yield await reader.readexactly(int(headers["content-length"]))
+    else:
+        while chunk := await reader.read(65536):
+            yield chunk
+
+
+async def _iter_lines(
+    reader: asyncio.StreamReader, headers: dict
+) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in _iter_body(reader, headers):
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+@dataclass
+class SessionResult:
+    prompt_file: str
+    client: int
+    start: float  # sec since the load test started
+    session_id: str = ""
+    started_sec: Optional[float] = None  # POST /main -> `started`
+    first_code_delta_sec: Optional[float] = None
+    first_code_sec: Optional[float] = None
+    done_sec: Optional[float] = None
+    max_gap_sec: float = 0.0  # largest gap between SSE frames
+    frames: int = 0
+    heartbeats: int = 0
+    events: dict[str, int] = field(default_factory=dict)
+    status: str = ""  # done status, "no_done" or "error"
+    error: str = ""
+
+
+async def run_session(base_url: str, prompt: str, result: SessionResult) -> None:
+    """
+    Run one session and record its timings in result (kept up to date while
+    streaming, so a cancelled session keeps its partial timings).
+    """
+    begin = time.perf_counter()
+    events = result.events
+    try:
+        body = json.dumps({"prompt": prompt}).encode("utf-8")
+        status, headers, reader, writer = await _http_request(
+            f"{base_url}/main",
+            "POST",
+            body,
+            {"Content-Type": "application/json"},
+        )
+        try:
+            raw = b"".join([c async for c in _iter_body(reader, headers)])
+        finally:
+            writer.close()
+        if status != 200:
+            raise HTTPError(f"POST /main: {status} {raw[:200]!r}")
+        result.session_id = json.loads(raw)["session_id"]
+
+        status, headers, reader, writer = await _http_request(
+            f"{base_url}/main/stream/{result.session_id}",
+            "GET",
+            headers={"Accept": "text/event-stream", "Cache-Control": "no-cache"},
+        )
+        try:
+            if status != 200:
+                raise HTTPError(f"GET /main/stream: {status}")
+            parser = SSEParser()
+            last = time.perf_counter()
+            async for line in _iter_lines(reader, headers):
+                frame = parser.feed(line)
+                if frame is None:
+                    continue
+                now = time.perf_counter()
+                result.max_gap_sec = max(result.max_gap_sec, now - last)
+                last = now
+                elapsed = now - begin
+                result.frames += 1
+                if frame.comment:
+                    result.heartbeats += 1
+                    continue
+                events[frame.event] = events.get(frame.event, 0) + 1
+                if frame.event == "started":
+                    result.started_sec = result.started_sec or elapsed
+                elif frame.event == "code_delta":
+                    result.first_code_delta_sec = result.first_code_delta_sec or elapsed
+                elif frame.event == "code":
+                    result.first_code_sec = result.first_code_sec or elapsed
+                elif frame.event == "done":
+                    result.done_sec = elapsed
+                    try:
+                        result.status = json.loads(frame.data).get("status", "")
+                    except json.JSONDecodeError:
+                        result.status = "invalid_done"
+        finally:
+            writer.close()
+        if result.done_sec is None:
+            result.status = "no_done"
+    except Exception as e:
+        result.status = "error"
+        result.error = f"{e.__class__.__name__}: {e}"
+
+
+def percentile(values: list[float], p: float) -> float:
+    """
+    Linear interpolation between the closest ranks.
+    """
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values: list[Optional[float]]) -> dict:
+    present = [v for v in values if v is not None]
+    if not present:
+        return {"count": 0}
+    summary = {
+        "count": len(present),
+        "min": round(min(present), 3),
+        "mean": round(sum(present) / len(present), 3),
+        "max": round(max(present), 3),
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(percentile(present, p), 3)
+    return summary
+
+
+def build_report(results: list[SessionResult], wall_sec: float, args) -> dict:
+    return {
+        "base_url": args.base_url,
+        "sessions": len(results),
+        "concurrency": args.concurrency,
+        "ramp_up_sec": args.ramp_up,
+        "wall_sec": round(wall_sec, 3),
+        "sessions_per_sec": round(len(results) / wall_sec, 3) if wall_sec else 0.0,
+        "status": dict(Counter(r.status for r in results)),
+        "started_sec": summarize([r.started_sec for r in results]),
+        "first_code_delta_sec": summarize([r.first_code_delta_sec for r in results]),
+        "first_code_sec": summarize([r.first_code_sec for r in results]),
+        "done_sec": summarize([r.done_sec for r in results]),
+        "max_gap_sec": summarize([r.max_gap_sec for r in results if r.frames]),
+        "errors": dict(Counter(r.error for r in results if r.error)),
+    }
+
+
+def print_report(report: dict) -> None:
+    out = sys.stdout
+    out.write(
+        f"sessions: {report['sessions']} (concurrency {report['concurrency']}, "
+        f"ramp-up {report['ramp_up_sec']}s), wall: {report['wall_sec']}s, "
+        f"{report['sessions_per_sec']} sessions/s\n"
+    )
+    out.write(f"status: {report['status']}\n")
+    header = ["count", "min", "mean"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+    out.write(f"{'metric':>22}" + "".join(f"{h:>9}" for h in header) + "\n")
+    for key in (
+        "started_sec",
+        "first_code_delta_sec",
+        "first_code_sec",
+        "done_sec",
+        "max_gap_sec",
+    ):
+        summary = report[key]
+        cells = [summary.get(h, "-") for h in header]
+        out.write(f"{key:>22}" + "".join(f"{c:>9}" for c in cells) + "\n")
+    for detail, count in report["errors"].items():
+        out.write(f"error x{count}: {detail}\n")
+
+
+def collect_prompt_files(paths: list[str]) -> list[Path]:
+    files: list[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(
+                p
+                for p in path.rglob("*")
+                if p.is_file() and p.suffix in PROMPT_SUFFIXES
+            )
+        elif path.is_file():
+            files.append(path)
+        else:
+            sys.stderr.write(f"Error: {path} does not exist.\n")
+            sys.exit(1)
+    return files
+
+
+async def run_load(args) -> int:
+    files = collect_prompt_files(args.load)
+    if not files:
+        sys.stderr.write("Error: no prompt files found.\n")
+        return 1
+    prompts = [(f, f.read_text(encoding="utf-8")) for f in files]
+    total = args.sessions or len(prompts)
+    concurrency = max(1, min(args.concurrency, total))
+    next_index = iter(range(total))
+    results: list[SessionResult] = []
+    t0 = time.perf_counter()
+
+    async def client(k: int) -> None:
+        await asyncio.sleep(k * args.ramp_up / concurrency)
+        for i in next_index:
+            prompt_file, prompt = prompts[i % len(prompts)]
+            result = SessionResult(
+                prompt_file=str(prompt_file), client=k, start=time.perf_counter() - t0
+            )
+            try:
+                await asyncio.wait_for(
+                    run_session(args.base_url, prompt, result),
+                    timeout=args.timeout or None,
+                )
+            except TimeoutError:
+                result.status = "timeout"
+                result.error = f"Timeout after {args.timeout}s"
+            results.append(result)
+            if args.verbose:
+                sys.stderr.write(
+                    f"[{len(results)}/{total}] client {k} {prompt_file.name}: "
+                    f"{result.status} done={result.done_sec}\n"
+                )
+
+    await asyncio.gather(*(client(k) for k in range(concurrency)))
+    report = build_report(results, time.perf_counter() - t0, args)
+    print_report(report)
+    if args.json:
+        report["results"] = [asdict(r) for r in results]
+        Path(args.json).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+    return 0 if all(r.status != "error" for r in results) else 1
+
+
 def main(argv: Optional[list] = None) -> int:
+    global API_BASE
     parser = argparse.ArgumentParser(description="Frontal API client")
-    parser.add_argument("-f", "--file", required=True, help="Path to the prompt file")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("-f", "--file", help="Path to the prompt file")
+    mode.add_argument(
+        "-l", "--load", nargs="+", help="Load test with prompt files / directories"
+    )
+    parser.add_argument("--base-url", default=API_BASE, help="Backend API base URL")
+    parser.add_argument(
+        "-n", "--sessions", type=int, default=0, help="Sessions (default: prompts)"
+    )
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--ramp-up", type=float, default=0.0, help="Seconds to start all clients"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=600.0, help="Per session (0: none)"
+    )
+    parser.add_argument("--json", help="Write the report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true")
     args = parser.parse_args(argv)
+    args.base_url = args.base_url.rstrip("/")
+
+    if args.load:
+        return asyncio.run(run_load(args))
 
+    API_BASE = args.base_url
     prompt = read_prompt(args.file)
     session_id = post_prompt(prompt)
     stream_events(session_id)
@@ -0,0 +1,389 @@
+"""
+Per-session workspaces
+
+Each session gets its own copy of the Next.js project (settings.output_dir)
+so that concurrent sessions do not overwrite each other's files.
+
+Notes:
+- node_modules is hardlinked, app/, tests/, public/ and the other project
+  files are copied as reflinks (copy-on-write) where supported.
+- .next is not copied (each workspace builds into its own .next), except
+  .next/cache which is copied to start with a warm build cache.
+- With workspace_pool_size > 0, N workspaces are prepared in the background
+  at startup and handed out by acquire(). Released workspaces are reset
+  (app/, tests/, public/, results/ and project files re-copied, .next
+  removed except .next/cache) and returned to the pool. A failed reset is
+  retried (with backoff) in the background; while no pooled workspace is
+  available within settings.workspace_acquire_timeout_sec, acquire()
+  creates one on demand.
+- When the session ends, files created or modified during the session in
+  app/, tests/, public/ and results/ are synced back to settings.output_dir
+  (last writer wins) so that later sessions see them, and the workspace
+  is removed.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from pathlib import Path
+
+from base import WorkspacePoolStats
+from common import clone_file, link_file
+from config import Settings, get_settings
+from logger import logger
+
+NODE_MODULES_DIR = "node_modules"
+DOT_NEXT_DIR = ".next"
+NEXT_CACHE_DIR = "cache"
+SKIP_ENTRIES = {DOT_NEXT_DIR, ".git"}
+POOL_DIR_PREFIX = "pool-"
+SYNC_BACK_DIRS = ["app", "tests", "public", "results"]
+PREPARE_RETRY_SEC = 1.0
+PREPARE_RETRY_MAX_SEC = 60.0
+
+
+def _copy_entry(src: Path, dst: Path) -> None:
+    if src.is_dir():
+        shutil.copytree(src, dst, symlinks=True, copy_function=clone_file)
+    elif src.is_file():
+        clone_file(str(src), str(dst))
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _link_node_modules(src: Path, dst: Path) -> None:
+    try:
+        shutil.copytree(src, dst, symlinks=True, copy_function=link_file)
+    except (OSError, shutil.Error) as e:
+        logger.warning(f"Failed to hardlink {src}, use symlink instead: {e}")
+        shutil.rmtree(dst, ignore_errors=True)
+        dst.symlink_to(src, target_is_directory=True)
+
+
+def _snapshot(workspace_dir: Path) -> dict[str, tuple[int, int]]:
+    """
+    (size, mtime_ns) of files in SYNC_BACK_DIRS, keyed by relative path.
+    """
+    stats: dict[str, tuple[int, int]] = {}
+    for name in SYNC_BACK_DIRS:
+        for root, _, files in os.walk(workspace_dir / name):
+            for filename in files:
+                path = Path(root) / filename
+                st = path.stat()
+                stats[str(path.relative_to(workspace_dir))] = (
+                    st.st_size,
+                    st.st_mtime_ns,
+                )
+    return stats
+
+
+def _sync_back(
+    workspace_dir: Path, template_dir: Path, baseline: dict[str, tuple[int, int]]
+) -> int:
+    """
+    Copy files created or modified during the session back to template_dir.
+    Returns number of files copied.
+    """
+    copied = 0
+    for rel, stat in _snapshot(workspace_dir).items():
+        if baseline.get(rel) == stat:
+            continue
+        dst_file = template_dir / rel
+        dst_file.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(workspace_dir / rel, dst_file)
+        logger.debug(f"sync back: {rel}")
+        copied += 1
+    return copied
+
+
+def map_to_workspace(path: str, template_dir: Path, workspace_dir: Path) -> str:
+    """
+    Rebase a path under template_dir (settings.output_dir) onto workspace_dir.
+    Other paths are returned unchanged.
+    """
+    abs_path = Path(os.path.abspath(path))
+    abs_template = Path(os.path.abspath(template_dir))
+    abs_workspace = Path(os.path.abspath(workspace_dir))
+    if abs_path == abs_workspace or abs_workspace in abs_path.parents:
+        return str(abs_path)
+    try:
+        rel = abs_path.relative_to(abs_template)
+    except ValueError:
+        return path
+    return str(abs_workspace / rel)
+
+
+class WorkspaceManager:
+    def __init__(
+        self,
+        template_dir: Path,
+        workspaces_dir: Path,
+        sync_back: bool,
+        acquire_timeout: float = 0,
+    ):
+        self.template_dir = template_dir
+        self.workspaces_dir = workspaces_dir
+        self.sync_back = sync_back
+        self.acquire_timeout = acquire_timeout
+        self._active: dict[str, Path] = {}
+        self._baselines: dict[str, dict[str, tuple[int, int]]] = {}
+        # Pool
+        self._pool: asyncio.Queue[Path] | None = None
+        self._pool_size = 0
+        self._tasks: set[asyncio.Task] = set()
+        # Metrics
+        self._acquire_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+        self._reset_count = 0
+        self._reset_total = 0.0
+        self._reset_max = 0.0
+        self._reset_last = 0.0
+        self._reset_errors = 0
+        self._prepare_errors = 0
+        self._acquire_timeouts = 0
+        self._acquire_errors = 0
+        self._sync_back_errors = 0
+
+    def lookup(self, step_id: str) -> Path | None:
+        return self._active.get(step_id)
+
+    def _template_entries(self) -> list[Path]:
+        entries = []
+        for entry in sorted(self.template_dir.iterdir()):
+            if entry.name in SKIP_ENTRIES:
+                continue
+            if entry.resolve() == self.workspaces_dir.resolve():
+                continue
+            entries.append(entry)
+        return entries
+
+    def _copy_next_cache(self, workspace_dir: Path) -> None:
+        next_cache = self.template_dir / DOT_NEXT_DIR / NEXT_CACHE_DIR
+        dst = workspace_dir / DOT_NEXT_DIR / NEXT_CACHE_DIR
+        if next_cache.is_dir() and not dst.exists():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copytree(next_cache, dst, symlinks=True, copy_function=clone_file)
+
+    def _create(self, workspace_dir: Path) -> None:
+        logger.debug(f"create workspace: {workspace_dir}")
+        if workspace_dir.exists():
+            shutil.rmtree(workspace_dir)
+        workspace_dir.mkdir(parents=True)
+        for entry in self._template_entries():
+            dst = workspace_dir / entry.name
+            if entry.name == NODE_MODULES_DIR:
+                _link_node_modules(entry, dst)
+            else:
+                _copy_entry(entry, dst)
+        self._copy_next_cache(workspace_dir)
+
+    def _reset(self, workspace_dir: Path) -> None:
+        """
+        Reset a used workspace to the current state of the template, like
+        tools/tool_clean_env.py does for output/ (node_modules and
+        .next/cache are kept).
+        """
+        logger.debug(f"reset workspace: {workspace_dir}")
+        for current in workspace_dir.iterdir():
+            if current.name == NODE_MODULES_DIR:
+                continue
+            if current.name == DOT_NEXT_DIR:
+                for child in current.iterdir():
+                    if child.name != NEXT_CACHE_DIR:
+                        _remove(child)
+                continue
+            _remove(current)
+        for entry in self._template_entries():
+            dst = workspace_dir / entry.name
+            if entry.name == NODE_MODULES_DIR:
+                if not dst.exists():
+                    _link_node_modules(entry, dst)
+                continue
+            _copy_entry(entry, dst)
+        self._copy_next_cache(workspace_dir)
+
+    def _prepare(self, workspace_dir: Path) -> None:
+        if workspace_dir.is_dir():
+            try:
+                self._reset(workspace_dir)
+                return
+            except (OSError, shutil.Error) as e:
+                logger.warning(f"Workspace reset failed, recreate: {e}")
+                self._reset_errors += 1
+        self._create(workspace_dir)
+
+    # ----
+    # Pool
+    # ----
+    def start_pool(self, size: int) -> None:
+        """
+        Prepare `size` workspaces in the background.
+        """
+        if self._pool is not None or size <= 0:
+            return
+        logger.info(f"Workspace pool starting: size={size}")
+        self._pool = asyncio.Queue()
+        self._pool_size = size
+        for i in range(size):
+            workspace_dir = self.workspaces_dir / f"{POOL_DIR_PREFIX}{i + 1:02d}"
+            self._spawn(self._replenish(workspace_dir))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _replenish(self, workspace_dir: Path) -> None:
+        retry_sec = PREPARE_RETRY_SEC
+        while True:
+            start = time.monotonic()
+            try:
+                await asyncio.to_thread(self._prepare, workspace_dir)
+                break
+            except Exception as e:
+                self._prepare_errors += 1
+                logger.error(
+                    f"Workspace prepare failed: {workspace_dir}, {e} "
+                    f"(retry in {retry_sec:g}s)"
+                )
+                await asyncio.sleep(retry_sec)
+                retry_sec = min(retry_sec * 2, PREPARE_RETRY_MAX_SEC)
+        duration = time.monotonic() - start
+        self._reset_count += 1
+        self._reset_total += duration
+        self._reset_max = max(self._reset_max, duration)
+        self._reset_last = duration
+        logger.debug(f"workspace ready: {workspace_dir}, {duration:.3f}s")
+        if self._pool is not None:
+            self._pool.put_nowait(workspace_dir)
+
+    async def stop_pool(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        self._pool = None
+
+    # -------------
+    # Acquire/Release
+    # -------------
+    async def _get_pooled(self) -> Path | None:
+        """
+        None if the pool has no workspace ready within acquire_timeout.
+        """
+        if self._pool is None:
+            return None
+        try:
+            return await asyncio.wait_for(
+                self._pool.get(), timeout=self.acquire_timeout or None
+            )
+        except asyncio.TimeoutError:
+            self._acquire_timeouts += 1
+            logger.warning(
+                f"No pooled workspace within {self.acquire_timeout}s, "
+                "create one on demand"
+            )
+            return None
+
+    async def _recycle(self, workspace_dir: Path) -> None:
+        if self._pool is not None and workspace_dir.name.startswith(POOL_DIR_PREFIX):
+            # Reset in the background and return to the pool
+            self._spawn(self._replenish(workspace_dir))
+        else:
+            await asyncio.to_thread(shutil.rmtree, workspace_dir, True)
+
+    async def acquire(self, step_id: str) -> Path:
+        start = time.monotonic()
+        workspace_dir = await self._get_pooled()
+        if workspace_dir is None:
+            workspace_dir = self.workspaces_dir / step_id
+            try:
+                await asyncio.to_thread(self._create, workspace_dir)
+            except Exception:
+                self._acquire_errors += 1
+                await asyncio.to_thread(shutil.rmtree, workspace_dir, True)
+                raise
+        wait = time.monotonic() - start
+        self._acquire_count += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        self._wait_last = wait
+
+        try:
+            baseline = await asyncio.to_thread(_snapshot, workspace_dir)
+        except Exception:
+            self._acquire_errors += 1
+            await self._recycle(workspace_dir)
+            raise
+        self._baselines[step_id] = baseline
+        self._active[step_id] = workspace_dir
+        logger.info(
+            f"Workspace acquired: {step_id} -> {workspace_dir} (wait={wait:.3f}s)"
+        )
+        return workspace_dir
+
+    async def release(self, step_id: str) -> None:
+        workspace_dir = self._active.pop(step_id, None)
+        baseline = self._baselines.pop(step_id, {})
+        if workspace_dir is None:
+            return
+        try:
+            if self.sync_back:
+                copied = await asyncio.to_thread(
+                    _sync_back, workspace_dir, self.template_dir, baseline
+                )
+                logger.debug(f"sync back: {step_id}, files={copied}")
+        except Exception as e:
+            self._sync_back_errors += 1
+            logger.error(f"Workspace sync back failed: {step_id}, {e}")
+        finally:
+            await self._recycle(workspace_dir)
+        logger.info(f"Workspace released: {step_id}")
+
+    def stats(self) -> WorkspacePoolStats:
+        return WorkspacePoolStats(
+            pool_size=self._pool_size,
+            available=self._pool.qsize() if self._pool is not None else 0,
+            in_use=len(self._active),
+            acquire_count=self._acquire_count,
+            wait_avg_sec=(
+                self._wait_total / self._acquire_count if self._acquire_count else 0.0
+            ),
+            wait_max_sec=self._wait_max,
+            wait_last_sec=self._wait_last,
+            reset_count=self._reset_count,
+            reset_avg_sec=(
+                self._reset_total / self._reset_count if self._reset_count else 0.0
+            ),
+            reset_max_sec=self._reset_max,
+            reset_last_sec=self._reset_last,
+            reset_errors=self._reset_errors,
+            prepare_errors=self._prepare_errors,
+            acquire_timeouts=self._acquire_timeouts,
+            acquire_errors=self._acquire_errors,
+            sync_back_errors=self._sync_back_errors,
+        )
+
+
+_workspace_manager: WorkspaceManager | None = None
+
+
+def get_workspace_manager(settings: Settings | None = None) -> WorkspaceManager:
+    global _workspace_manager
+    if _workspace_manager is None:
+        settings = settings or get_settings()
+        workspaces_dir = settings.workspaces_dir.resolve()
+        workspaces_dir.mkdir(parents=True, exist_ok=True)
+        _workspace_manager = WorkspaceManager(
+            template_dir=settings.output_dir.resolve(),
+            workspaces_dir=workspaces_dir,
+            sync_back=settings.workspace_sync_back,
+            acquire_timeout=settings.workspace_acquire_timeout_sec,
+        )
+    return _workspace_manager
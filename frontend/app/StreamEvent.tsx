@@ -76,6 +76,16 @@ function isAnalyzerResultEvent(
 > {
   return event.event === EventTypes.ANALYZER_RESULT;
 }
+function isLLMQueueEvent(
+  event: StreamResponse,
+): event is Extract<StreamResponse, { event: typeof EventTypes.LLM_QUEUE }> {
+  return event.event === EventTypes.LLM_QUEUE;
+}
+function isMetricsEvent(
+  event: StreamResponse,
+): event is Extract<StreamResponse, { event: typeof EventTypes.METRICS }> {
+  return event.event === EventTypes.METRICS;
+}
 
 // StreamEvent Function
 const StreamEvent = ({ status, responseInfo }: StreamEventProps) => {
@@ -261,6 +271,42 @@ const StreamEvent = ({ status, responseInfo }: StreamEventProps) => {
               );
             }
 
+            // ----- llm_queue event -----
+            if (isLLMQueueEvent(sr)) {
+              const { reason, wait_sec, attempt } = sr.payload;
+              return (
+                <div key={`llm-queue-${idx}`}>
+                  <div className="grid grid-cols-6 items-center">
+                    <div></div>
+                    <div className="col-span-5 text-app-detail ml-9 text-muted-foreground">
+                      <pre>
+                        LLM {reason}: {wait_sec}s
+                        {attempt > 0 ? ` (attempt ${attempt})` : ""}
+                      </pre>
+                    </div>
+                  </div>
+                </div>
+              );
+            }
+
+            // ----- metrics event -----
+            if (isMetricsEvent(sr)) {
+              const { step, step_totals } = sr.payload;
+              return (
+                <div key={`metrics-${idx}`}>
+                  <div className="grid grid-cols-6 items-center">
+                    <div></div>
+                    <div className="col-span-5 text-app-detail ml-9 text-muted-foreground">
+                      <pre>
+                        {step}: {step_totals.total_tokens} tokens,{" "}
+                        {step_totals.latency_sec}s
+                      </pre>
+                    </div>
+                  </div>
+                </div>
+              );
+            }
+
             // ----- done event -----
             if (isDoneEvent(sr)) {
               let emoji = Emoji.BLUE_CIRCLE;
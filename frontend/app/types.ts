@@ -50,6 +50,16 @@ export type TestScreenshotPayload = {
   updated: boolean;
 };
 
+export type TestRunPayload = {
+  status: "begin" | "started" | "passed" | "failed" | "skipped" | "end";
+  title: string | null;
+  project: string | null;
+  file: string | null;
+  duration: number | null;
+  total: number | null;
+  detail: string | null;
+};
+
 export type BuildErrorAnalyzerPayload = {
   summary: string;
   root_cause: string;
@@ -58,6 +68,64 @@ export type BuildErrorAnalyzerPayload = {
   confidence: "probable" | "likely" | "possible" | "unclear";
 };
 
+export type PlacedFile = {
+  file: string;
+  method: "reflink" | "hardlink" | "copy";
+  duration_ms: number;
+};
+
+export type CodeDeltaPayload = {
+  language: string;
+  offset: number;
+  delta: string;
+};
+
+export type LLMQueuePayload = {
+  agent_name: string;
+  priority: "interactive" | "batch";
+  reason: "queued" | "retry";
+  wait_sec: number;
+  attempt: number;
+  detail: string;
+};
+
+export type AgentRunMetrics = {
+  agent_name: string;
+  model: string;
+  requests: number;
+  input_tokens: number;
+  output_tokens: number;
+  cached_tokens: number;
+  total_tokens: number;
+  ttft_sec: number | null;
+  latency_sec: number;
+  queue_wait_sec: number;
+  llm_sec: number;
+  tool_calls: number;
+  tool_sec: Record<string, number>;
+};
+
+export type MetricsTotals = {
+  runs: number;
+  requests: number;
+  input_tokens: number;
+  output_tokens: number;
+  cached_tokens: number;
+  total_tokens: number;
+  latency_sec: number;
+  queue_wait_sec: number;
+  llm_sec: number;
+  tool_calls: number;
+  tool_sec: number;
+};
+
+export type MetricsPayload = {
+  step: string;
+  runs: AgentRunMetrics[];
+  step_totals: MetricsTotals;
+  session_totals: MetricsTotals;
+};
+
 export type StreamResponse =
   | {
       event: "started";
@@ -67,20 +135,36 @@ export type StreamResponse =
       event: "code";
       payload: { language: string; code: string; file_path: string };
     }
+  | { event: "code_delta"; payload: CodeDeltaPayload }
   | { event: "agent_update"; payload: { agent_name: string } }
-  | { event: "done"; payload: { status: string; message: string } }
+  | {
+      event: "done";
+      payload: {
+        status: string;
+        message: string;
+        metrics?: MetricsTotals | null;
+      };
+    }
   | { event: "check_result"; payload: CheckResultPayload }
   | { event: "system_error"; payload: { error: string; detail: string } }
   | {
       event: "agent_result";
-      payload: { result: boolean; error_detail: string };
+      payload: {
+        result: boolean;
+        error_detail: string;
+        files?: PlacedFile[] | null;
+        duration_ms?: number | null;
+      };
     }
+  | { event: "test_run"; payload: TestRunPayload }
   | { event: "test_result"; payload: TestResultPayload }
   | { event: "test_screenshot"; payload: TestScreenshotPayload }
   | {
       event: "analyzer_result";
       payload: BuildErrorAnalyzerPayload;
-    };
+    }
+  | { event: "llm_queue"; payload: LLMQueuePayload }
+  | { event: "metrics"; payload: MetricsPayload };
 
 export type ResponseEvent = {
   s_res: StreamResponse;
@@ -94,6 +178,7 @@ export type ResponseInfo = {
 export const EventTypes = {
   STARTED: "started",
   CODE: "code",
+  CODE_DELTA: "code_delta",
   AGENT_UPDATE: "agent_update",
   DONE: "done",
   CHECK_RESULT: "check_result",
@@ -103,6 +188,8 @@ export const EventTypes = {
   TEST_RESULT: "test_result",
   TEST_SCREENSHOT: "test_screenshot",
   ANALYZER_RESULT: "analyzer_result",
+  LLM_QUEUE: "llm_queue",
+  METRICS: "metrics",
 } as const;
 
 export type CheckResultEvent = {
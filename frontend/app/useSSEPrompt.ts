@@ -2,6 +2,7 @@
 import { useRef, useCallback } from "react";
 import {
   Action,
+  CodeDeltaPayload,
   FileInfo,
   PromptRequest,
   ResponseInfo,
@@ -39,6 +40,39 @@ export const useSSEPrompt = ({
     [setResponseInfo],
   );
 
+  // mergeCodeDelta (deltas of the same code are merged into one event)
+  const mergeCodeDelta = useCallback(
+    (data: CodeDeltaPayload, index: number) => {
+      setResponseInfo((prev) => {
+        const updated = [...prev];
+        const prevEvents = updated[index]?.r_event ?? [];
+        const last = prevEvents[prevEvents.length - 1]?.s_res;
+        if (last?.event === EventTypes.CODE_DELTA && data.offset > 0) {
+          const merged: StreamResponse = {
+            event: EventTypes.CODE_DELTA,
+            payload: { ...data, delta: last.payload.delta + data.delta },
+          };
+          updated[index] = {
+            r_event: [
+              ...prevEvents.slice(0, -1),
+              { s_res: merged, r_time: new Date() },
+            ],
+          };
+        } else {
+          const sres: StreamResponse = {
+            event: EventTypes.CODE_DELTA,
+            payload: data,
+          };
+          updated[index] = {
+            r_event: [...prevEvents, { s_res: sres, r_time: new Date() }],
+          };
+        }
+        return updated;
+      });
+    },
+    [setResponseInfo],
+  );
+
   // handleGenericEvent
   const handleGenericEvent = useCallback(
     (
@@ -154,9 +188,22 @@ export const useSSEPrompt = ({
             }
           });
 
+          // Listen "code_delta" (special handling)
+          es.addEventListener(EventTypes.CODE_DELTA, (e) => {
+            try {
+              const data = JSON.parse((e as MessageEvent).data);
+              mergeCodeDelta(data, index);
+            } catch (err) {
+              safeReject(err instanceof Error ? err : new Error(String(err)));
+            }
+          });
+
           // Other events (common handling)
           const commonEventTypes = Object.values(EventTypes).filter(
-            (type) => type !== EventTypes.STARTED && type !== EventTypes.DONE,
+            (type) =>
+              type !== EventTypes.STARTED &&
+              type !== EventTypes.DONE &&
+              type !== EventTypes.CODE_DELTA,
           );
           commonEventTypes.forEach((type) => {
             es.addEventListener(type, (e) => {
@@ -184,7 +231,14 @@ export const useSSEPrompt = ({
         return Promise.reject(new Error(message));
       }
     },
-    [API_BASE, dispatch, handleGenericEvent, setEvent, setResponseInfo],
+    [
+      API_BASE,
+      dispatch,
+      handleGenericEvent,
+      mergeCodeDelta,
+      setEvent,
+      setResponseInfo,
+    ],
   );
 
   return { sendPrompt };